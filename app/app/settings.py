@@ -57,6 +57,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -90,13 +92,30 @@ WSGI_APPLICATION = "app.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Connections of the default database are pooled per worker process, see
+# core.db.backends.postgresql_pool. Set DB_POOL=0 to connect per request.
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": (
+            "core.db.backends.postgresql_pool"
+            if bool(int(os.environ.get("DB_POOL", 1)))
+            else "django.db.backends.postgresql"
+        ),
         "HOST": os.environ.get("DB_HOST"),
         "NAME": os.environ.get("DB_NAME"),
         "USER": os.environ.get("DB_USER"),
         "PASSWORD": os.environ.get("DB_PASS"),
+        "POOL": {
+            "MIN_SIZE": int(os.environ.get("DB_POOL_MIN_SIZE", 0)),
+            "MAX_SIZE": int(os.environ.get("DB_POOL_MAX_SIZE", 4)),
+            "TIMEOUT": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+            "MAX_LIFETIME": float(
+                os.environ.get("DB_POOL_MAX_LIFETIME", 3600)
+            ),
+            "MAX_IDLE": float(os.environ.get("DB_POOL_MAX_IDLE", 300)),
+            "CHECK_AFTER": float(os.environ.get("DB_POOL_CHECK_AFTER", 5)),
+        },
     },
     "sqlite": {
         "ENGINE": "django.db.backends.sqlite3",
@@ -105,6 +124,73 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Must point to a cache shared by all workers in production.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    },
+}
+# Whether every worker sees the same cache. Invalidations made in a per
+# process cache never reach the other workers, so responses and token
+# lookups are only cached in a shared one.
+CACHE_SHARED = (
+    CACHES["default"]["BACKEND"]
+    != "django.core.cache.backends.locmem.LocMemCache"
+)
+
+RECIPE_CACHE_ALIAS = "default"
+RECIPE_CACHE_TIMEOUT = int(os.environ.get("RECIPE_CACHE_TIMEOUT", 300))
+
+AUTH_TOKEN_CACHE_ALIAS = "default"
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.environ.get("AUTH_TOKEN_CACHE_TIMEOUT", 300))
+AUTH_TOKEN_LOCAL_CACHE_SIZE = int(
+    os.environ.get("AUTH_TOKEN_LOCAL_CACHE_SIZE", 1024)
+)
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = int(
+    os.environ.get("AUTH_TOKEN_LOCAL_CACHE_TIMEOUT", 10)
+)
+
+
+# Share of requests answered with a Server-Timing header and logged with
+# their query count and timings, see core.middleware. 0 disables it.
+SERVER_TIMING_SAMPLE_RATE = float(
+    os.environ.get("SERVER_TIMING_SAMPLE_RATE", 0)
+)
+
+# Prometheus metrics of all requests, served on /metrics/ to scrapers
+# sending "Authorization: Bearer <METRICS_TOKEN>", see core.metrics.
+METRICS_ENABLED = bool(int(os.environ.get("METRICS_ENABLED", 1)))
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "timing": {"format": "timing %(message)s"},
+    },
+    "handlers": {
+        "timing": {
+            "class": "logging.StreamHandler",
+            "formatter": "timing",
+        },
+    },
+    "loggers": {
+        "core.middleware": {
+            "handlers": ["timing"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -147,6 +233,53 @@ MEDIA_URL = "/static/media/"
 MEDIA_ROOT = "/vol/web/media/"
 STATIC_ROOT = "/vol/web/static/"
 
+# "uuid" stores every recipe image upload under a random name, "content"
+# stores each distinct image once, named by its hash, see core.storage.
+RECIPE_IMAGE_STORAGE = os.environ.get("RECIPE_IMAGE_STORAGE", "uuid")
+
+# Uploaded recipe images are downscaled to fit this many pixels per side by
+# the process_images worker, which runs RECIPE_IMAGE_WORKERS processes.
+RECIPE_IMAGE_MAX_SIZE = int(os.environ.get("RECIPE_IMAGE_MAX_SIZE", 2048))
+RECIPE_IMAGE_WORKERS = int(
+    os.environ.get("RECIPE_IMAGE_WORKERS", os.cpu_count() or 1)
+)
+# Images claimed longer ago than this many seconds are taken to belong to
+# a stopped worker and queued again.
+RECIPE_IMAGE_CLAIM_TIMEOUT = int(
+    os.environ.get("RECIPE_IMAGE_CLAIM_TIMEOUT", 600)
+)
+
+# Uploaded recipe images are streamed to disk and rejected past the size
+# limit, then checked from their header before anything decodes them.
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = int(
+    os.environ.get("RECIPE_IMAGE_MAX_UPLOAD_SIZE", 10 * 2**20)
+)
+RECIPE_IMAGE_MAX_DIMENSION = int(
+    os.environ.get("RECIPE_IMAGE_MAX_DIMENSION", 10000)
+)
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.environ.get("RECIPE_IMAGE_MAX_PIXELS", 40_000_000)
+)
+# Recipe archives may be larger, they are imported as they are read.
+RECIPE_IMPORT_MAX_UPLOAD_SIZE = int(
+    os.environ.get("RECIPE_IMPORT_MAX_UPLOAD_SIZE", 2**30)
+)
+# Accepted formats and the extension they are stored under.
+RECIPE_IMAGE_FORMATS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "WEBP": ".webp",
+    "GIF": ".gif",
+}
+
+# Sizes recipe images are served in, generated on first request. Cropped
+# renditions fill the size exactly, the others fit into it.
+RECIPE_IMAGE_RENDITIONS = {
+    "thumbnail": {"size": (200, 200), "crop": True},
+    "card": {"size": (640, 400), "crop": True},
+    "full": {"size": (1600, 1600), "crop": False},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -158,6 +291,23 @@ REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
+# Render and parse JSON with orjson, byte for byte as DRF does, see
+# core.renderers. Views may also pick the renderer and parser themselves.
+if bool(int(os.environ.get("FAST_JSON", 1))):
+    REST_FRAMEWORK.update(
+        {
+            "DEFAULT_RENDERER_CLASSES": [
+                "core.renderers.ORJSONRenderer",
+                "rest_framework.renderers.BrowsableAPIRenderer",
+            ],
+            "DEFAULT_PARSER_CLASSES": [
+                "core.parsers.ORJSONParser",
+                "rest_framework.parsers.FormParser",
+                "rest_framework.parsers.MultiPartParser",
+            ],
+        }
+    )
+
 SPECTACULAR_SETTINGS = {
     "COMPONENT_SPLIT_REQUEST": True,
 }
@@ -23,6 +23,10 @@ from drf_spectacular.views import (
     SpectacularSwaggerView,
 )
 
+from core.views import metrics
+from recipe.renditions import RENDITIONS_DIR
+from recipe.views import image_rendition
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/schema/", SpectacularAPIView.as_view(), name="api-schema"),
@@ -33,6 +37,13 @@ urlpatterns = [
     ),
     path("api/user/", include("user.urls")),
     path("api/recipe/", include("recipe.urls")),
+    path("metrics/", metrics, name="metrics"),
+    path(
+        f"{settings.MEDIA_URL.lstrip('/')}{RENDITIONS_DIR}/"
+        "<slug:rendition>/<path:name>",
+        image_rendition,
+        name="image-rendition",
+    ),
 ]
 
 if settings.DEBUG:
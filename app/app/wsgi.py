@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
 
 application = get_wsgi_application()
+
+try:
+    import uwsgi
+except ImportError:
+    pass
+else:
+    from core.metrics import worker_exit
+
+    # Run by every uWSGI worker as it exits.
+    uwsgi.atexit = worker_exit
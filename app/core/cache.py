@@ -0,0 +1,52 @@
+"""
+Generation counters kept in the shared cache.
+
+A generation is a number that only ever grows. Cached data is tagged with
+the generation it was computed under and is thrown away once the counter
+has moved on, which invalidates any amount of data with one increment.
+"""
+import time
+
+from django.core.cache import caches
+from django.db import connection, transaction
+
+
+def get_generation(key, alias="default"):
+    """Return the current value of the generation counter `key`."""
+
+    cache = caches[alias]
+    generation = cache.get(key)
+    if generation is None:
+        # Seed from the clock so a counter lost to eviction restarts above
+        # every generation handed out before.
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+
+    return generation
+
+
+def _bump(key, alias):
+    cache = caches[alias]
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_generation(key, alias="default"):
+    """Move the generation counter `key` forward.
+
+    Inside a transaction the counter is bumped right away and once more on
+    commit, so that data computed from not yet committed rows can never be
+    stored under the final generation.
+    """
+
+    _bump(key, alias)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump(key, alias))
+
+
+def reset_generation(key, alias="default"):
+    """Drop the counter `key`, the next read starts a fresh generation."""
+
+    caches[alias].delete(key)
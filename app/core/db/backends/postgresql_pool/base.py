@@ -0,0 +1,125 @@
+"""
+PostgreSQL backend taking its connections from a per process pool.
+
+Closing a connection, as Django does at the end of every request, gives it
+back to the pool instead of closing it. The pool is configured with the
+"POOL" dictionary of the database settings:
+
+    MIN_SIZE      idle connections never closed for being idle
+    MAX_SIZE      connections open at most
+    TIMEOUT       seconds to wait for a connection when all are in use
+    MAX_LIFETIME  seconds after which a connection is replaced
+    MAX_IDLE      seconds after which an idle connection is closed
+    CHECK_AFTER   seconds of idleness after which a connection is checked
+                  with a query before it is handed out
+"""
+import functools
+
+import psycopg2.extensions
+import psycopg2.extras
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import (
+    DatabaseCreation as BaseDatabaseCreation,
+)
+
+from core.db.pool import ConnectionPool, PoolTimeout, close_pools, get_pool
+
+Database = base.Database
+
+POOL_OPTIONS = {
+    "MIN_SIZE": "min_size",
+    "MAX_SIZE": "max_size",
+    "TIMEOUT": "timeout",
+    "MAX_LIFETIME": "max_lifetime",
+    "MAX_IDLE": "max_idle",
+    "CHECK_AFTER": "check_after",
+}
+
+
+def _connect(conn_params, isolation_level):
+    """Open a connection set up like Django's own backend does."""
+
+    connection = Database.connect(**conn_params)
+    if (
+        isolation_level is not None
+        and isolation_level != connection.isolation_level
+    ):
+        connection.set_session(isolation_level=isolation_level)
+    psycopg2.extras.register_default_jsonb(
+        conn_or_curs=connection, loads=lambda x: x
+    )
+    return connection
+
+
+def _check(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def _reset(connection):
+    """Roll back whatever the last user of the connection left open."""
+
+    status = connection.get_transaction_status()
+    if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+        raise Database.InterfaceError("The connection is broken.")
+    if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+
+def _pool_name(alias, database):
+    return f"{alias}:{database}"
+
+
+class DatabaseCreation(BaseDatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # The database cannot be dropped while pooled sessions are open.
+        close_pools(_pool_name(self.connection.alias, test_database_name))
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    _pool = None
+
+    def get_pool(self, conn_params):
+        """Return the pool for `conn_params`, shared by all threads."""
+
+        options = self.settings_dict.get("POOL", {})
+        isolation_level = self.settings_dict["OPTIONS"].get("isolation_level")
+        key = (self.alias, repr(sorted(conn_params.items())))
+
+        def create_pool():
+            return ConnectionPool(
+                connect=functools.partial(
+                    _connect, conn_params, isolation_level
+                ),
+                check=_check,
+                reset=_reset,
+                name=_pool_name(self.alias, conn_params.get("database")),
+                **{
+                    POOL_OPTIONS[option]: value
+                    for option, value in options.items()
+                },
+            )
+
+        return get_pool(key, create_pool)
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        try:
+            connection = pool.getconn()
+        except PoolTimeout as exc:
+            raise Database.OperationalError(str(exc)) from exc
+
+        self._pool = pool
+        self.isolation_level = self.settings_dict["OPTIONS"].get(
+            "isolation_level", connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self._pool.putconn(self.connection)
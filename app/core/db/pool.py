@@ -0,0 +1,341 @@
+"""
+A small thread safe pool of database connections.
+
+Connections are opened lazily up to `max_size`, checked before they are
+handed out again and closed once they are older than `max_lifetime` or have
+been idle for longer than `max_idle`. Every pool counts how often and how
+long callers had to wait for a connection, see `ConnectionPool.stats()`.
+"""
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the pool timeout."""
+
+
+class _Entry:
+    __slots__ = ("connection", "created_at", "used_at")
+
+    def __init__(self, connection, now):
+        self.connection = connection
+        self.created_at = now
+        self.used_at = now
+
+
+class ConnectionPool:
+    """Hand out and take back connections made by `connect`.
+
+    `check(connection)` is run on connections that were idle for at least
+    `check_after` seconds before they are handed out and should raise or
+    return False if the connection is unusable. `reset(connection)` is run
+    when a connection is given back and should raise if it cannot be reused.
+    """
+
+    def __init__(
+        self,
+        connect,
+        check=None,
+        reset=None,
+        name="default",
+        min_size=0,
+        max_size=4,
+        timeout=10.0,
+        max_lifetime=3600.0,
+        max_idle=300.0,
+        check_after=5.0,
+        clock=time.monotonic,
+    ):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError("Expected 0 <= min_size <= max_size > 0.")
+
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self._connect = connect
+        self._check = check
+        self._reset = reset
+        self._clock = clock
+        self._init_state()
+        _all_pools.add(self)
+
+    def _init_state(self):
+        self._cond = threading.Condition(threading.Lock())
+        # Idle connections, the most recently used one last.
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._counters = {
+            "checkouts": 0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "health_check_failures": 0,
+            "timeouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "max_wait": 0.0,
+        }
+
+    def _after_fork(self):
+        # Connections of the parent must neither be used nor closed in the
+        # child, closing them would terminate the parent's sessions. Keep
+        # them referenced so that they are never garbage collected either.
+        self._inherited = [
+            entry.connection
+            for entry in [*self._idle, *self._in_use.values()]
+        ]
+        self._init_state()
+
+    def getconn(self):
+        """Return a healthy connection, waiting up to `timeout` for one."""
+
+        deadline = self._clock() + self.timeout
+        while True:
+            entry = self._acquire(deadline)
+            if entry is None:
+                entry = self._create()
+            elif not self._usable(entry):
+                self._discard(entry)
+                continue
+
+            with self._cond:
+                self._in_use[id(entry.connection)] = entry
+                self._counters["checkouts"] += 1
+            return entry.connection
+
+    def putconn(self, connection, discard=False):
+        """Give a connection back, closing it if it cannot be reused."""
+
+        with self._cond:
+            entry = self._in_use.pop(id(connection), None)
+        if entry is None:
+            # Not handed out by this pool, e.g. inherited across a fork.
+            return
+
+        now = self._clock()
+        if not (discard or self._closed or self._expired(entry, now)):
+            try:
+                if self._reset is not None:
+                    self._reset(connection)
+                discard = _is_closed(connection)
+            except Exception:
+                logger.debug("Discarding unusable connection", exc_info=True)
+                discard = True
+        else:
+            discard = True
+
+        if discard:
+            self._discard(entry)
+            return
+
+        entry.used_at = now
+        with self._cond:
+            self._idle.append(entry)
+            stale = self._reap(now)
+            self._cond.notify()
+        self._close_entries(stale)
+
+    def close(self):
+        """Close the pool, connections in use are closed once given back."""
+
+        with self._cond:
+            self._closed = True
+            stale = list(self._idle)
+            self._idle.clear()
+            self._size -= len(stale)
+            self._counters["connections_closed"] += len(stale)
+            self._cond.notify_all()
+        self._close_entries(stale)
+
+    def stats(self):
+        """Return the current size of the pool and its wait counters."""
+
+        with self._cond:
+            return {
+                "name": self.name,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "waiting": self._waiting,
+                **self._counters,
+            }
+
+    def _acquire(self, deadline):
+        """Pop an idle entry, or reserve a slot for a new one (None)."""
+
+        with self._cond:
+            stale = self._reap(self._clock())
+        self._close_entries(stale)
+
+        with self._cond:
+            blocked_at = None
+            try:
+                while True:
+                    if self._idle:
+                        return self._idle.pop()
+                    if self._size < self.max_size:
+                        self._size += 1
+                        return None
+
+                    now = self._clock()
+                    if blocked_at is None:
+                        blocked_at = now
+                        self._counters["waits"] += 1
+                    if now >= deadline:
+                        self._counters["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"No connection available in pool {self.name} "
+                            f"after {self.timeout:g}s "
+                            f"({self._size} of {self.max_size} in use)."
+                        )
+
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(deadline - now)
+                    finally:
+                        self._waiting -= 1
+            finally:
+                if blocked_at is not None:
+                    waited = self._clock() - blocked_at
+                    self._counters["wait_time"] += waited
+                    self._counters["max_wait"] = max(
+                        self._counters["max_wait"], waited
+                    )
+
+    def _create(self):
+        try:
+            connection = self._connect()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._counters["connections_created"] += 1
+        return _Entry(connection, self._clock())
+
+    def _usable(self, entry):
+        now = self._clock()
+        if self._expired(entry, now) or _is_closed(entry.connection):
+            return False
+        if self._check is None or now - entry.used_at < self.check_after:
+            return True
+
+        try:
+            healthy = self._check(entry.connection) is not False
+        except Exception:
+            logger.debug("Connection failed its health check", exc_info=True)
+            healthy = False
+        if not healthy:
+            with self._cond:
+                self._counters["health_check_failures"] += 1
+        return healthy
+
+    def _expired(self, entry, now):
+        return (
+            self.max_lifetime is not None
+            and now - entry.created_at >= self.max_lifetime
+        )
+
+    def _reap(self, now):
+        """Take expired and long idle entries out, the lock must be held."""
+
+        stale = [entry for entry in self._idle if self._expired(entry, now)]
+        for entry in stale:
+            self._idle.remove(entry)
+
+        if self.max_idle is not None:
+            # The least recently used entries are at the left.
+            while (
+                self._idle
+                and self._size - len(stale) > self.min_size
+                and now - self._idle[0].used_at >= self.max_idle
+            ):
+                stale.append(self._idle.popleft())
+
+        self._size -= len(stale)
+        self._counters["connections_closed"] += len(stale)
+        if stale:
+            self._cond.notify(len(stale))
+        return stale
+
+    def _discard(self, entry):
+        self._close_entries([entry])
+        with self._cond:
+            self._size -= 1
+            self._counters["connections_closed"] += 1
+            self._cond.notify()
+
+    def _close_entries(self, entries):
+        for entry in entries:
+            try:
+                entry.connection.close()
+            except Exception:
+                logger.debug("Failed to close connection", exc_info=True)
+
+
+def _is_closed(connection):
+    return bool(getattr(connection, "closed", False))
+
+
+_all_pools = weakref.WeakSet()
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _after_fork():
+    global _pools_lock
+
+    _pools_lock = threading.Lock()
+    for pool in list(_all_pools):
+        pool._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def get_pool(key, factory):
+    """Return the pool registered under `key`, creating it if needed."""
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = factory()
+        return pool
+
+
+def close_pools(name=None):
+    """Close and forget every pool, or the ones called `name`."""
+
+    with _pools_lock:
+        keys = [
+            key
+            for key, pool in _pools.items()
+            if name is None or pool.name == name
+        ]
+        pools = [_pools.pop(key) for key in keys]
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """Return the stats of every pool of this process."""
+
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
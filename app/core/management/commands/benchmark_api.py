@@ -0,0 +1,394 @@
+"""
+Django command load testing the API in-process on a seeded dataset.
+"""
+import io
+import json
+import math
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import reverse
+
+from PIL import Image
+
+from core.middleware import QueryCounter
+from core.models import Recipe, Tag
+from core.seeding import Dataset, seed, seeded_users
+
+SCENARIOS = ("list", "filter", "detail", "create", "update", "upload-image")
+PERCENTILES = (50, 95, 99)
+NO_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+}
+
+
+def _percentile(values, percent):
+    """Return the nearest-rank percentile of sorted `values`."""
+
+    return values[max(math.ceil(len(values) * percent / 100) - 1, 0)]
+
+
+def _image():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (200, 120, 40)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class Scenarios:
+    """Requests of each scenario, made as one of the seeded users."""
+
+    def __init__(self, users):
+        self.users = users
+        self.recipes = {}
+        self.tags = {}
+        for user in users:
+            self.recipes[user.id] = list(
+                Recipe.objects.filter(user=user).values_list("id", flat=True)
+            )
+            self.tags[user.id] = list(
+                Tag.objects.filter(user=user).values_list("id", flat=True)
+            )
+        self.image = _image()
+
+    def request(self, name, client, rng, user):
+        method = getattr(self, name.replace("-", "_"))
+        return method(
+            client, rng, user, HTTP_AUTHORIZATION=f"Token {user.token}"
+        )
+
+    def _payload(self, rng):
+        return {
+            "title": f"Benchmark recipe {rng.randrange(10 ** 6)}",
+            "time_minutes": rng.randint(5, 240),
+            "price": f"{rng.randint(50, 99999) / 100:.2f}",
+            "tags": [{"name": f"Bench tag {rng.randrange(20)}"}],
+            "ingredients": [
+                {"name": f"Bench ingredient {rng.randrange(50)}"}
+                for _ in range(5)
+            ],
+        }
+
+    def list(self, client, rng, user, **headers):
+        return client.get(reverse("recipe:recipe-list"), **headers)
+
+    def filter(self, client, rng, user, **headers):
+        tags = rng.sample(self.tags[user.id], min(2, len(self.tags[user.id])))
+        return client.get(
+            reverse("recipe:recipe-list"),
+            {"tags": ",".join(map(str, tags))},
+            **headers,
+        )
+
+    def detail(self, client, rng, user, **headers):
+        pk = rng.choice(self.recipes[user.id])
+        url = reverse("recipe:recipe-detail", args=[pk])
+        return client.get(url, **headers)
+
+    def create(self, client, rng, user, **headers):
+        return client.post(
+            reverse("recipe:recipe-list"),
+            json.dumps(self._payload(rng)),
+            content_type="application/json",
+            **headers,
+        )
+
+    def update(self, client, rng, user, **headers):
+        pk = rng.choice(self.recipes[user.id])
+        return client.patch(
+            reverse("recipe:recipe-detail", args=[pk]),
+            json.dumps(self._payload(rng)),
+            content_type="application/json",
+            **headers,
+        )
+
+    def upload_image(self, client, rng, user, **headers):
+        pk = rng.choice(self.recipes[user.id])
+        image = SimpleUploadedFile("image.jpg", self.image, "image/jpeg")
+        return client.post(
+            reverse("recipe:recipe-upload-image", args=[pk]),
+            {"image": image},
+            **headers,
+        )
+
+
+class Command(BaseCommand):
+    """Benchmark the recipe API endpoints."""
+
+    help = (
+        "Seed a synthetic dataset into a temporary test database and time "
+        "requests to the API at the given concurrency, printing latency "
+        "percentiles, throughput and queries per request as JSON."
+    )
+
+    def add_arguments(self, parser):
+        dataset = parser.add_argument_group("dataset")
+        for name, default, help_text in [
+            ("users", 10, "Users seeded."),
+            ("recipes", 100, "Recipes per user."),
+            ("tags", 20, "Tags per user."),
+            ("ingredients", 50, "Ingredients per user."),
+            ("tags-per-recipe", 3, "Tags linked to each recipe."),
+            ("ingredients-per-recipe", 8, "Ingredients of each recipe."),
+            ("seed", 0, "Seed of the dataset and the requests."),
+        ]:
+            dataset.add_argument(
+                f"--{name}", type=int, default=default, help=help_text
+            )
+
+        parser.add_argument(
+            "--scenarios",
+            nargs="+",
+            choices=SCENARIOS,
+            default=list(SCENARIOS),
+            help="Endpoints to benchmark, all by default.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Requests measured per scenario.",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=10,
+            help="Requests made before measuring each scenario.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Threads making requests at the same time.",
+        )
+        parser.add_argument(
+            "--cache",
+            action="store_true",
+            help="Keep the response cache, disabled by default so that "
+            "every request reaches the views.",
+        )
+        parser.add_argument(
+            "--output",
+            metavar="FILE",
+            help="Also write the results to this file.",
+        )
+        parser.add_argument(
+            "--baseline",
+            metavar="FILE",
+            help="Compare with the results of an earlier run and fail if a "
+            "scenario got slower than the tolerance allows.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Allowed relative p95 latency increase over the baseline.",
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError(
+                "--requests and --concurrency must be positive."
+            )
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        dataset = Dataset(
+            users=options["users"],
+            recipes=options["recipes"],
+            tags=options["tags"],
+            ingredients=options["ingredients"],
+            tags_per_recipe=options["tags_per_recipe"],
+            ingredients_per_recipe=options["ingredients_per_recipe"],
+            seed=options["seed"],
+        )
+        if options["users"] < 1 or options["recipes"] < 1:
+            raise CommandError("--users and --recipes must be positive.")
+
+        results = self._run(dataset, options)
+        if baseline is not None:
+            results["comparison"] = self._compare(
+                baseline, results, options["tolerance"]
+            )
+
+        output = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output_file:
+                output_file.write(output + "\n")
+        self.stdout.write(output)
+
+        regressions = [
+            name
+            for name, comparison in results.get("comparison", {}).items()
+            if comparison["regression"]
+        ]
+        if regressions:
+            raise CommandError(f"Slower than the baseline: {regressions}.")
+
+    def _run(self, dataset, options):
+        """Seed a test database, run the scenarios and tear it down."""
+
+        verbosity = options["verbosity"]
+        media_root = tempfile.mkdtemp()
+        setup_test_environment()
+        databases = setup_databases(verbosity, interactive=False)
+        if connection.vendor == "sqlite" and options["concurrency"] > 1:
+            self.stderr.write(
+                self.style.WARNING(
+                    "SQLite locks tables for concurrent writes, expect "
+                    "errors in the write scenarios."
+                )
+            )
+        try:
+            overrides = {"MEDIA_ROOT": media_root}
+            if not options["cache"]:
+                overrides["CACHES"] = NO_CACHE
+            with override_settings(**overrides):
+                started = time.perf_counter()
+                seed(dataset)
+                users = seeded_users(dataset)
+                seeded = time.perf_counter() - started
+                if verbosity >= 1:
+                    self.stderr.write(
+                        f"Seeded {dataset.as_dict()} in {seeded:.1f}s."
+                    )
+
+                scenarios = Scenarios(users)
+                results = {
+                    name: self._scenario(scenarios, name, options)
+                    for name in options["scenarios"]
+                }
+        finally:
+            teardown_databases(databases, verbosity)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        return {
+            "dataset": dataset.as_dict(),
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "cache": options["cache"],
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "scenarios": results,
+        }
+
+    def _scenario(self, scenarios, name, options):
+        """Measure one scenario, split evenly over the threads."""
+
+        concurrency = options["concurrency"]
+        shares = [
+            options["requests"] // concurrency
+            + (i < options["requests"] % concurrency)
+            for i in range(concurrency)
+        ]
+        samples = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(concurrency + 1)
+
+        def worker(index, count):
+            rng = random.Random(f"{options['seed']}-{name}-{index}")
+            # Failing requests are counted as 500 responses.
+            client = Client(raise_request_exception=False)
+            users = scenarios.users
+            try:
+                for i in range(options["warmup"] // concurrency):
+                    user = users[(index + i * concurrency) % len(users)]
+                    scenarios.request(name, client, rng, user)
+                barrier.wait()
+
+                measured = []
+                for i in range(count):
+                    user = users[(index + i * concurrency) % len(users)]
+                    counter = QueryCounter()
+                    started = time.perf_counter()
+                    with connection.execute_wrapper(counter):
+                        response = scenarios.request(name, client, rng, user)
+                    measured.append(
+                        (
+                            time.perf_counter() - started,
+                            counter.queries,
+                            response.status_code,
+                        )
+                    )
+                with lock:
+                    samples.extend(measured)
+            except BaseException:
+                barrier.abort()
+                raise
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=worker, args=(index, count))
+            for index, count in enumerate(shares)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            for thread in threads:
+                thread.join()
+            raise CommandError(f"A thread of the {name} scenario failed.")
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if len(samples) != options["requests"]:
+            raise CommandError(f"A thread of the {name} scenario failed.")
+
+        latencies = sorted(latency for latency, _, _ in samples)
+        result = {
+            "requests": len(samples),
+            "errors": sum(status >= 400 for _, _, status in samples),
+            "throughput": round(len(samples) / elapsed, 1),
+            "latency_ms": {
+                f"p{percent}": round(_percentile(latencies, percent) * 1e3, 3)
+                for percent in PERCENTILES
+            },
+            "queries_per_request": round(
+                statistics.mean(queries for _, queries, _ in samples), 2
+            ),
+        }
+        result["latency_ms"]["mean"] = round(
+            statistics.mean(latencies) * 1e3, 3
+        )
+        if options["verbosity"] >= 2:
+            self.stderr.write(f"{name}: {result}")
+        return result
+
+    def _compare(self, baseline, results, tolerance):
+        """Compare the p95 latency of every scenario with the baseline."""
+
+        comparison = {}
+        for name, result in results["scenarios"].items():
+            before = baseline.get("scenarios", {}).get(name)
+            if before is None:
+                continue
+            ratio = result["latency_ms"]["p95"] / before["latency_ms"]["p95"]
+            comparison[name] = {
+                "p95_ratio": round(ratio, 3),
+                "throughput_ratio": round(
+                    result["throughput"] / before["throughput"], 3
+                ),
+                "regression": ratio > 1 + tolerance,
+            }
+        return comparison
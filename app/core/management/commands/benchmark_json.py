@@ -0,0 +1,139 @@
+"""
+Django command comparing the JSON renderers and parsers of the API.
+"""
+import io
+import random
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnList
+
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer
+
+WORDS = (
+    "roast chicken garlic lemon crème brûlée pasta tomato basil "
+    "jalapeño curry coconut rice soup bread pie tofu ramen 🍜 gyoza"
+).split()
+
+
+def _words(rng, count):
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def recipe_payload(count, seed=0):
+    """Return `count` recipes shaped as the recipe list renders them.
+
+    Every recipe also carries a Decimal, a datetime and a UUID, the values
+    the encoder of DRF converts itself.
+    """
+
+    rng = random.Random(seed)
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def related(size):
+        return [
+            OrderedDict(id=rng.randrange(1, 10000), name=_words(rng, 2))
+            for _ in range(size)
+        ]
+
+    return ReturnList(
+        [
+            OrderedDict(
+                id=pk,
+                title=_words(rng, 4).title(),
+                time_minutes=rng.randrange(5, 240),
+                price=f"{rng.randrange(100, 99999) / 100:.2f}",
+                link=f"https://example.com/recipes/{pk}",
+                tags=related(rng.randrange(0, 6)),
+                ingredients=related(rng.randrange(2, 15)),
+                cost=Decimal(rng.randrange(100, 99999)) / 100,
+                created=created + timedelta(seconds=rng.randrange(10 ** 8)),
+                uuid=uuid.UUID(int=rng.getrandbits(128)),
+            )
+            for pk in range(1, count + 1)
+        ],
+        serializer=None,
+    )
+
+
+def _timeit(func, repeat):
+    """Return the best time of `repeat` calls of `func`, in seconds."""
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+class Command(BaseCommand):
+    """Benchmark ORJSONRenderer and ORJSONParser against DRF's own."""
+
+    help = (
+        "Time rendering and parsing of recipe lists with the stock DRF "
+        "JSON renderer and parser and with the orjson based ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[1, 25, 100, 1000],
+            help="Numbers of recipes per payload.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=50,
+            help="Runs per measurement, the best one counts.",
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be positive.")
+
+        for size in options["sizes"]:
+            self._benchmark(size, options["repeat"])
+
+    def _benchmark(self, size, repeat):
+        data = recipe_payload(size)
+        stock, fast = JSONRenderer(), ORJSONRenderer()
+        body = stock.render(data)
+        if fast.render(data) != body:
+            raise CommandError(f"Rendered output differs for {size} recipes.")
+
+        def parse(parser):
+            return parser.parse(io.BytesIO(body))
+
+        if parse(ORJSONParser()) != parse(JSONParser()):
+            raise CommandError(f"Parsed data differs for {size} recipes.")
+
+        self.stdout.write(f"{size} recipes, {len(body)} bytes:")
+        self._compare(
+            "render",
+            _timeit(lambda: stock.render(data), repeat),
+            _timeit(lambda: fast.render(data), repeat),
+        )
+        self._compare(
+            "parse",
+            _timeit(lambda: parse(JSONParser()), repeat),
+            _timeit(lambda: parse(ORJSONParser()), repeat),
+        )
+
+    def _compare(self, label, stock, fast):
+        self.stdout.write(
+            f"  {label:<6} drf {stock * 1e3:9.3f} ms  "
+            f"orjson {fast * 1e3:9.3f} ms  "
+            + self.style.SUCCESS(f"{stock / max(fast, 1e-9):5.1f}x")
+        )
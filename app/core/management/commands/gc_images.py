@@ -0,0 +1,179 @@
+"""
+Django command deleting recipe images no recipe refers to anymore.
+"""
+import os
+import shutil
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Recipe
+from recipe.images import image_storage
+from recipe.renditions import RENDITIONS_DIR
+
+IMAGES_DIR = "uploads/recipe"
+
+
+def _scan(path):
+    """Yield the DirEntry of every file below `path`, lazily."""
+
+    try:
+        entries = os.scandir(path)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scan(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    """Collect orphaned recipe images and their renditions."""
+
+    help = (
+        "Delete, or move to a quarantine directory, recipe images and "
+        "renditions of images no recipe refers to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would be collected.",
+        )
+        parser.add_argument(
+            "--quarantine",
+            metavar="DIRECTORY",
+            help="Move orphans into this directory instead of deleting.",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=float,
+            default=24 * 60 * 60,
+            help="Seconds since a file was last written before it may be "
+            "collected, protects uploads in flight. Defaults to a day.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Files checked against the database at once.",
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.verbosity = options["verbosity"]
+        self.dry_run = options["dry_run"]
+        self.quarantine = options["quarantine"]
+        self.min_age = options["min_age"]
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        self.root = image_storage().location
+        self.stats = dict.fromkeys(
+            ["scanned", "referenced", "young", "orphaned", "bytes"], 0
+        )
+        self.started = time.monotonic()
+
+        batch = []
+        for entry, name in self._files():
+            batch.append((entry, name))
+            if len(batch) == batch_size:
+                self._collect(batch)
+                batch = []
+        if batch:
+            self._collect(batch)
+
+        self._report(self.style.SUCCESS)
+
+    def _files(self):
+        """Yield (entry, referencing image name) of the files to check."""
+
+        for entry in _scan(os.path.join(self.root, IMAGES_DIR)):
+            yield entry, self._name(entry.path)
+
+        # A rendition is an orphan when the image it was made from is.
+        renditions = os.path.join(self.root, RENDITIONS_DIR)
+        for entry in _scan(renditions):
+            rendition_name = os.path.relpath(entry.path, renditions)
+            image_name = rendition_name.split(os.sep, 1)[-1]
+            yield entry, image_name.replace(os.sep, "/")
+
+    def _name(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def _collect(self, batch):
+        """Collect the orphans among a batch of files."""
+
+        now = time.time()
+        candidates = []
+        for entry, name in batch:
+            self.stats["scanned"] += 1
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime < self.min_age:
+                self.stats["young"] += 1
+            else:
+                candidates.append((entry, name, stat.st_size))
+
+        referenced = set(
+            Recipe.objects.filter(
+                image__in={name for _, name, _ in candidates}
+            ).values_list("image", flat=True)
+        )
+
+        for entry, name, size in candidates:
+            if name in referenced:
+                self.stats["referenced"] += 1
+                continue
+
+            if self.verbosity >= 2:
+                self.stdout.write(f"Orphan: {self._name(entry.path)}")
+            if not self.dry_run and not self._remove(entry.path):
+                continue
+            self.stats["orphaned"] += 1
+            self.stats["bytes"] += size
+
+        if self.verbosity >= 2:
+            self._report()
+
+    def _remove(self, path):
+        """Delete or quarantine an orphan, unless it was just written."""
+
+        try:
+            # Stat again, the file may have been reused since the scan.
+            if time.time() - os.stat(path).st_mtime < self.min_age:
+                self.stats["young"] += 1
+                return False
+            if self.quarantine:
+                target = os.path.join(self.quarantine, self._name(path))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+            else:
+                os.unlink(path)
+        except FileNotFoundError:
+            return False
+
+        return True
+
+    def _report(self, style=None):
+        elapsed = time.monotonic() - self.started
+        stats = self.stats
+        if self.dry_run:
+            action = "would be collected"
+        elif self.quarantine:
+            action = "quarantined"
+        else:
+            action = "deleted"
+        message = (
+            f"Scanned {stats['scanned']} files in {elapsed:.1f}s "
+            f"({stats['scanned'] / max(elapsed, 1e-6):.0f}/s): "
+            f"{stats['referenced']} referenced, {stats['young']} too young, "
+            f"{stats['orphaned']} orphans ({stats['bytes']} bytes) {action}."
+        )
+        self.stdout.write(style(message) if style else message)
@@ -0,0 +1,89 @@
+"""
+Django command importing a recipe archive into a user's library.
+"""
+import gzip
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.imports import FileCheckpoint, RecipeImporter
+
+
+class Command(BaseCommand):
+    """Import recipes from an NDJSON archive."""
+
+    help = (
+        "Import recipes from an NDJSON archive, one recipe per line as the "
+        "export writes them, in batches of one transaction each. Archives "
+        "ending in .gz are decompressed on the fly. With --checkpoint, an "
+        "interrupted import run again carries on after the last batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "archive", help="Path of the archive, - for standard input."
+        )
+        parser.add_argument(
+            "--user",
+            required=True,
+            metavar="EMAIL",
+            help="Email address of the user importing the recipes.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Recipes written per transaction.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            metavar="FILE",
+            help="File the position in the archive is saved to after "
+            "every batch, and resumed from when it exists.",
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive.")
+        try:
+            user = get_user_model().objects.get(email=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['user']}.")
+
+        checkpoint = None
+        if options["checkpoint"]:
+            checkpoint = FileCheckpoint(options["checkpoint"])
+        importer = RecipeImporter(
+            user, batch_size=options["batch_size"], checkpoint=checkpoint
+        )
+
+        path = options["archive"]
+        if path == "-":
+            result = importer.run(sys.stdin.buffer)
+        else:
+            opener = gzip.open if path.endswith(".gz") else open
+            try:
+                with opener(path, "rb") as archive:
+                    result = importer.run(archive)
+            except FileNotFoundError:
+                raise CommandError(f"No such archive: {path}.")
+
+        for error in result["errors"]:
+            self.stderr.write(
+                f"Line {error['line']}: {json.dumps(error['errors'])}"
+            )
+        if result["failed"] > len(result["errors"]):
+            self.stderr.write(
+                f"{result['failed'] - len(result['errors'])} more lines "
+                "failed."
+            )
+
+        message = (
+            f"Imported {result['imported']} recipes from "
+            f"{result['line']} lines, {result['failed']} failed."
+        )
+        style = self.style.WARNING if result["failed"] else self.style.SUCCESS
+        self.stdout.write(style(message))
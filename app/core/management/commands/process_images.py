@@ -0,0 +1,164 @@
+"""
+Django command optimising uploaded recipe images in the background.
+"""
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from recipe import images
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Process queued recipe images in a pool of worker processes."""
+
+    help = "Optimise queued recipe images, one process per CPU by default."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.RECIPE_IMAGE_WORKERS,
+            help="Number of worker processes, 0 processes images inline.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Images claimed at once, 4 per worker by default.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before polling an empty queue again.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        workers = options["workers"]
+        batch_size = options["batch_size"] or max(workers, 1) * 4
+
+        self._requeue()
+
+        self.executor = None
+        self.workers = workers
+        self.processed = self.failed = 0
+        started = time.monotonic()
+        try:
+            while True:
+                claimed = images.claim_pending(batch_size)
+                if claimed:
+                    self._process(claimed)
+                elif self._requeue():
+                    continue
+                elif options["once"]:
+                    break
+                else:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {self.processed} images, {self.failed} failed, "
+                f"in {elapsed:.1f}s."
+            )
+        )
+
+    def _requeue(self):
+        # Claims of workers stopped since are only given up once they time
+        # out, checked again whenever the queue runs empty.
+        requeued = images.requeue_interrupted()
+        if requeued:
+            self.stdout.write(f"Queued {requeued} interrupted images again.")
+        return requeued
+
+    def _new_executor(self, workers):
+        # Forked workers must not inherit open database sessions.
+        connections.close_all()
+        return ProcessPoolExecutor(workers)
+
+    def _get_executor(self):
+        if self.executor is None:
+            self.executor = self._new_executor(self.workers)
+        return self.executor
+
+    def _process(self, claimed):
+        if not self.workers:
+            for item in claimed:
+                try:
+                    optimised = images.optimise_image(item[2])
+                except Exception:
+                    self._fail(item)
+                else:
+                    self._complete(item, optimised)
+            return
+
+        executor = self._get_executor()
+        futures = {
+            executor.submit(images.optimise_image, item[2]): item
+            for item in claimed
+        }
+        broken = []
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                optimised = future.result()
+            except BrokenProcessPool:
+                # A worker died, e.g. killed for its memory use, and every
+                # image not done yet went down with the pool.
+                broken.append(item)
+            except Exception:
+                self._fail(item)
+            else:
+                self._complete(item, optimised)
+
+        if broken:
+            executor.shutdown(wait=False)
+            self.executor = None
+            self._process_alone(broken)
+
+    def _process_alone(self, claimed):
+        """Process each image in a pool of its own.
+
+        Only the images that break the pool again are flagged as failed.
+        """
+
+        for item in claimed:
+            with self._new_executor(1) as executor:
+                future = executor.submit(images.optimise_image, item[2])
+                try:
+                    optimised = future.result()
+                except Exception:
+                    self._fail(item)
+                else:
+                    self._complete(item, optimised)
+
+    def _complete(self, item, optimised):
+        recipe_id, user_id, name = item
+        images.complete(recipe_id, user_id, name, optimised)
+        self.processed += 1
+
+    def _fail(self, item):
+        recipe_id, user_id, name = item
+        logger.exception(
+            "Failed to process image %s of recipe %s.", name, recipe_id
+        )
+        images.fail(recipe_id, user_id, name)
+        self.failed += 1
@@ -0,0 +1,170 @@
+"""
+Django command seeding a database with a large synthetic dataset.
+"""
+import argparse
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections
+
+from core.seeding import BulkWriter, Dataset, Range, seed, writer_for
+
+
+def _range(text):
+    try:
+        return Range.parse(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"{text!r} is not a number or a range such as 5-240."
+        )
+
+
+def _price(text):
+    try:
+        low, high = Range.parse(text, type=Decimal)
+    except (ArithmeticError, ValueError):
+        raise argparse.ArgumentTypeError(
+            f"{text!r} is not a price or a range such as 0.50-999.99."
+        )
+    return Range(int(low * 100), int(high * 100))
+
+
+class Command(BaseCommand):
+    """Seed synthetic users, recipes, tags and ingredients."""
+
+    help = (
+        "Generate users with their tags, ingredients and recipes from a "
+        "random seed and write them in chunks, with COPY on PostgreSQL and "
+        "bulk inserts elsewhere. Counts are a number or a range drawn from "
+        "uniformly, e.g. --recipes 0-500."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", type=int, default=10, help="Users seeded."
+        )
+        for name, default, help_text in [
+            ("recipes", "100", "Recipes per user."),
+            ("tags", "20", "Tags per user."),
+            ("ingredients", "50", "Ingredients per user."),
+            ("tags-per-recipe", "3", "Tags linked to each recipe."),
+            ("ingredients-per-recipe", "8", "Ingredients of each recipe."),
+            ("time-minutes", "5-240", "Preparation time of recipes."),
+        ]:
+            parser.add_argument(
+                f"--{name}", type=_range, default=default, help=help_text
+            )
+        parser.add_argument(
+            "--price",
+            type=_price,
+            default="0.50-999.99",
+            help="Price of recipes.",
+        )
+        parser.add_argument(
+            "--link-ratio",
+            type=float,
+            default=0.5,
+            help="Share of recipes with a link.",
+        )
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=0.0,
+            help="Zipf exponent of the popularity of the tags and "
+            "ingredients of a user, 0 for all equally popular.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the dataset, the same seed gives the same rows.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10000,
+            help="Rows generated before they are written.",
+        )
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Use bulk inserts on PostgreSQL too.",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database to seed, defaults to the default database.",
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options["users"] < 0:
+            raise CommandError("--users must not be negative.")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive.")
+        if not 0 <= options["link_ratio"] <= 1:
+            raise CommandError("--link-ratio must be between 0 and 1.")
+        if options["skew"] < 0:
+            raise CommandError("--skew must not be negative.")
+
+        dataset = Dataset(
+            users=options["users"],
+            recipes=options["recipes"],
+            tags=options["tags"],
+            ingredients=options["ingredients"],
+            tags_per_recipe=options["tags_per_recipe"],
+            ingredients_per_recipe=options["ingredients_per_recipe"],
+            time_minutes=options["time_minutes"],
+            price=options["price"],
+            link_ratio=options["link_ratio"],
+            skew=options["skew"],
+            seed=options["seed"],
+        )
+        using = options["database"]
+        writer_class = BulkWriter if options["no_copy"] else writer_for
+        writer = writer_class(using, options["chunk_size"])
+
+        self.verbosity = options["verbosity"]
+        self.started = time.monotonic()
+        try:
+            written = seed(
+                dataset,
+                writer,
+                options["chunk_size"],
+                progress=self._progress,
+            )
+        except IntegrityError as error:
+            raise CommandError(
+                f"Could not seed, was seed {dataset.seed} seeded before? "
+                f"{error}"
+            )
+
+        connection = connections[using]
+        if connection.vendor == "postgresql":
+            # Let the planner know about the new volumes right away.
+            with connection.cursor() as cursor:
+                for model in written:
+                    table = connection.ops.quote_name(model._meta.db_table)
+                    cursor.execute(f"ANALYZE {table}")
+
+        if self.verbosity >= 1:
+            elapsed = time.monotonic() - self.started
+            rows = sum(written.values())
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Seeded {rows} rows in {elapsed:.1f}s "
+                    f"({rows / max(elapsed, 1e-9):.0f} rows/s): "
+                    + ", ".join(
+                        f"{count} {model._meta.label}"
+                        for model, count in written.items()
+                    )
+                )
+            )
+
+    def _progress(self, written):
+        if self.verbosity >= 2:
+            elapsed = time.monotonic() - self.started
+            self.stdout.write(
+                f"{sum(written.values())} rows written in {elapsed:.1f}s."
+            )
@@ -0,0 +1,233 @@
+"""
+Prometheus metrics of the API.
+
+uWSGI serves requests from several worker processes. With the
+PROMETHEUS_MULTIPROC_DIR environment variable set, as scripts/run.sh does,
+every process writes its values to files in that directory and the metrics
+view adds them up across processes. The directory must be emptied whenever
+the server starts. The stats of the database pools, see core.db.pool, are
+copied to metrics after every request.
+
+Gauges such as the requests in progress only add up the processes alive:
+a worker exiting drops its values with `worker_exit`, which app.wsgi hooks
+into uWSGI, and the values of workers that died without it, e.g. killed
+mid-request, are dropped on the next scrape.
+"""
+import os
+import re
+from collections import defaultdict
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+
+from core.db.pool import pool_stats
+
+REQUESTS = Counter(
+    "http_requests_total",
+    "Requests answered, by view, method and status.",
+    ["view", "method", "status"],
+)
+LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time taken to answer requests.",
+    ["view", "method"],
+    buckets=(
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1,
+        2.5,
+        5,
+        10,
+    ),
+)
+IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requests being answered.",
+    ["view", "method"],
+    multiprocess_mode="livesum",
+)
+QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries run per request.",
+    ["view", "method"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Size of response bodies.",
+    ["view", "method"],
+    buckets=tuple(2 ** power for power in range(8, 25, 2)),
+)
+
+POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Open connections of the database pools, by state.",
+    ["pool", "state"],
+    multiprocess_mode="livesum",
+)
+POOL_MAX_CONNECTIONS = Gauge(
+    "db_pool_max_connections",
+    "Connections the database pools may open.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_WAITS = Counter(
+    "db_pool_waits",
+    "Checkouts that waited for a connection.",
+    ["pool"],
+)
+POOL_WAIT_TIME = Counter(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a connection.",
+    ["pool"],
+)
+POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts",
+    "Checkouts that gave up waiting for a connection.",
+    ["pool"],
+)
+POOL_MAX_WAIT = Gauge(
+    "db_pool_max_wait_seconds",
+    "Longest wait for a connection.",
+    ["pool"],
+    multiprocess_mode="max",
+)
+
+# Requests not routed to any view, kept in one series.
+UNMATCHED = "unmatched"
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+def method_label(request):
+    """Return the request method, or "other" for unusual ones."""
+
+    return request.method if request.method in METHODS else "other"
+
+
+def view_label(request, view_func):
+    """Return e.g. recipe-list or user-token for the view of a request.
+
+    Viewset views are named by their basename and the action the method
+    maps to, other views by their URL namespace and name.
+    """
+
+    actions = getattr(view_func, "actions", None)
+    basename = getattr(view_func, "initkwargs", {}).get("basename")
+    if actions and basename:
+        action = actions.get(request.method.lower())
+        if action:
+            return f"{basename}-{action.replace('_', '-')}"
+
+    match = request.resolver_match
+    if match is None or not match.url_name:
+        return UNMATCHED
+    return "-".join([*match.namespaces, match.url_name])
+
+
+# Pool counters by pool name and stat, as last added to the metrics.
+_pool_counters = {}
+
+
+def record_pools():
+    """Copy the stats of the database pools of this process to metrics.
+
+    The pools count waits themselves, the counters are moved forward by
+    what was added since the last call.
+    """
+
+    totals = defaultdict(lambda: defaultdict(float))
+    for stats in pool_stats():
+        pool = totals[stats["name"]]
+        for key in [
+            "in_use",
+            "idle",
+            "max_size",
+            "waits",
+            "wait_time",
+            "timeouts",
+        ]:
+            pool[key] += stats[key]
+        pool["max_wait"] = max(pool["max_wait"], stats["max_wait"])
+
+    for name, pool in totals.items():
+        POOL_CONNECTIONS.labels(name, "in_use").set(pool["in_use"])
+        POOL_CONNECTIONS.labels(name, "idle").set(pool["idle"])
+        POOL_MAX_CONNECTIONS.labels(name).set(pool["max_size"])
+        POOL_MAX_WAIT.labels(name).set(pool["max_wait"])
+        for counter, key in [
+            (POOL_WAITS, "waits"),
+            (POOL_WAIT_TIME, "wait_time"),
+            (POOL_TIMEOUTS, "timeouts"),
+        ]:
+            last = _pool_counters.get((name, key), 0)
+            # A pool created anew, e.g. after a fork, counts from zero.
+            added = pool[key] - last if pool[key] >= last else pool[key]
+            if added:
+                counter.labels(name).inc(added)
+            _pool_counters[name, key] = pool[key]
+
+
+# Files of the gauges of live processes, by process id.
+LIVE_GAUGE_FILE = re.compile(r"gauge_live\w+_(\d+)\.db")
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def mark_dead_processes(path):
+    """Drop the live gauges of processes that are gone."""
+
+    pids = {
+        int(match.group(1))
+        for match in map(LIVE_GAUGE_FILE.fullmatch, os.listdir(path))
+        if match
+    }
+    for pid in pids:
+        if not _is_alive(pid):
+            multiprocess.mark_process_dead(pid, path)
+
+
+def worker_exit():
+    """Drop the live gauges of this process, when it exits."""
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def registry():
+    """Return the registry holding the metrics of all processes."""
+
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path is None:
+        return REGISTRY
+
+    mark_dead_processes(path)
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    return collected
+
+
+def exposition():
+    """Return the metrics in the Prometheus text format."""
+
+    record_pools()
+    return generate_latest(registry())
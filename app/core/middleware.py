@@ -0,0 +1,269 @@
+"""
+Middleware timing requests and recording metrics, and a view mixin timing
+serializers for it.
+"""
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimings:
+    """Times of one request, fed by database execute wrappers."""
+
+    __slots__ = (
+        "started",
+        "view_started",
+        "render_started",
+        "render_ended",
+        "view",
+        "queries",
+        "db",
+        "serialize",
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.render_started = None
+        self.render_ended = None
+        self.view = None
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - started
+
+    def durations(self, ended):
+        """Return the db, ser, view, render and total durations in seconds."""
+
+        view_ended = self.render_started or ended
+        view = view_ended - self.view_started if self.view_started else 0.0
+        render = 0.0
+        if self.render_started:
+            render = (self.render_ended or ended) - self.render_started
+        return {
+            "db": self.db,
+            "ser": self.serialize,
+            "view": view,
+            "render": render,
+            "total": ended - self.started,
+        }
+
+
+def _view_name(view_func, method):
+    """Return e.g. RecipeViewSet.list, or the name of a plain view."""
+
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None:
+        return f"{view_func.__module__}.{view_func.__name__}"
+
+    actions = getattr(view_func, "actions", None) or {}
+    action = actions.get(method.lower())
+    if action is None:
+        return view_class.__name__
+    return f"{view_class.__name__}.{action}"
+
+
+class _TimedData:
+    """Serializer base adding the time taken by `data` to the timings."""
+
+    @property
+    def data(self):
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            self._timings.serialize += time.perf_counter() - started
+
+
+# Timed subclasses by serializer class.
+_timed_classes = {}
+
+
+def timed_serializer(serializer, request):
+    """Return `serializer`, timed if `request` is timed."""
+
+    timings = getattr(request, "_timings", None)
+    if timings is None:
+        return serializer
+
+    cls = type(serializer)
+    timed = _timed_classes.get(cls)
+    if timed is None:
+        timed = _timed_classes[cls] = type(
+            cls.__name__, (_TimedData, cls), {"__module__": cls.__module__}
+        )
+    serializer.__class__ = timed
+    serializer._timings = timings
+    return serializer
+
+
+class TimedSerializerMixin:
+    """Time the serializers of a view on sampled requests."""
+
+    def get_serializer(self, *args, **kwargs):
+        return timed_serializer(
+            super().get_serializer(*args, **kwargs), self.request
+        )
+
+
+class ServerTimingMiddleware:
+    """Report database, serializer, view and render times of requests.
+
+    A sampled request gets a Server-Timing header and a log line with its
+    number of queries, the time spent in SQL, in building serializer data
+    (see TimedSerializerMixin), in the view (including both) and in
+    rendering the response, e.g. encoding the JSON, and its total time.
+    Sampling is set by SERVER_TIMING_SAMPLE_RATE, with 0 the middleware is
+    left out of the stack altogether.
+    """
+
+    def __init__(self, get_response):
+        self.sample_rate = settings.SERVER_TIMING_SAMPLE_RATE
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timings = request._timings = RequestTimings()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings))
+            response = self.get_response(request)
+
+        durations = timings.durations(time.perf_counter())
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={durations["db"] * 1e3:.2f};'
+                f'desc="{timings.queries} queries"',
+                f'ser;dur={durations["ser"] * 1e3:.2f}',
+                f'view;dur={durations["view"] * 1e3:.2f}',
+                f'render;dur={durations["render"] * 1e3:.2f}',
+                f'total;dur={durations["total"] * 1e3:.2f}',
+            ]
+        )
+        self._log(request, response, timings, durations)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = getattr(request, "_timings", None)
+        if timings is not None:
+            timings.view = _view_name(view_func, request.method)
+            timings.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        timings = getattr(request, "_timings", None)
+        if timings is not None:
+            timings.render_started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda response: setattr(
+                    timings, "render_ended", time.perf_counter()
+                )
+            )
+        return response
+
+    def _log(self, request, response, timings, durations):
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "view": timings.view,
+            "status": response.status_code,
+            "queries": timings.queries,
+            **{
+                f"{name}_ms": round(duration * 1e3, 2)
+                for name, duration in durations.items()
+            },
+        }
+        logger.info(
+            " ".join(f"{key}={value}" for key, value in fields.items()),
+            extra={"timing": fields},
+        )
+
+
+class QueryCounter:
+    """Database execute wrapper counting queries."""
+
+    __slots__ = ("queries",)
+
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Record Prometheus metrics of every request, see core.metrics.
+
+    Requests are labelled by view and method, with the view named after
+    the viewset and action, e.g. recipe-list. METRICS_ENABLED=0 leaves the
+    middleware out of the stack.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            try:
+                response = self.get_response(request)
+            finally:
+                in_progress = getattr(request, "_metrics_in_progress", None)
+                if in_progress is not None:
+                    in_progress.dec()
+
+        view = getattr(request, "_metrics_view", metrics.UNMATCHED)
+        method = metrics.method_label(request)
+        metrics.REQUESTS.labels(view, method, response.status_code).inc()
+        metrics.LATENCY.labels(view, method).observe(
+            time.perf_counter() - started
+        )
+        metrics.QUERIES.labels(view, method).observe(counter.queries)
+        size = self._size(response)
+        if size is not None:
+            metrics.RESPONSE_SIZE.labels(view, method).observe(size)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = request._metrics_view = metrics.view_label(request, view_func)
+        in_progress = metrics.IN_PROGRESS.labels(
+            view, metrics.method_label(request)
+        )
+        in_progress.inc()
+        request._metrics_in_progress = in_progress
+
+    def _size(self, response):
+        """Return the size of the body, if known without reading it."""
+
+        if response.has_header("Content-Length"):
+            return int(response["Content-Length"])
+        if response.streaming:
+            return None
+        return len(response.content)
@@ -0,0 +1,93 @@
+# Generated by Django 3.2.25 on 2026-10-16 23:38
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_INDEX = django.contrib.postgres.indexes.GinIndex(
+    fields=["search_vector"], name="recipe_search_idx"
+)
+
+SEARCH_VECTOR_SQL = """
+    setweight(
+        to_tsvector('pg_catalog.english', coalesce({row}title, '')), 'A'
+    ) ||
+    setweight(
+        to_tsvector('pg_catalog.english', coalesce({row}description, '')),
+        'B'
+    )
+"""
+
+CREATE_TRIGGER_SQL = f"""
+CREATE FUNCTION core_recipe_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR_SQL.format(row="NEW.")};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON core_recipe
+    FOR EACH ROW EXECUTE PROCEDURE core_recipe_search_vector_update();
+
+UPDATE core_recipe SET search_vector = {SEARCH_VECTOR_SQL.format(row="")};
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS core_recipe_search_vector_trigger ON core_recipe;
+DROP FUNCTION IF EXISTS core_recipe_search_vector_update();
+"""
+
+
+def create_search_objects(apps, schema_editor):
+    """Create the GIN index and the trigger maintaining the vector."""
+
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    recipe = apps.get_model("core", "Recipe")
+    schema_editor.execute(CREATE_TRIGGER_SQL)
+    schema_editor.add_index(recipe, SEARCH_INDEX)
+
+
+def drop_search_objects(apps, schema_editor):
+    """Drop the GIN index and the trigger."""
+
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    recipe = apps.get_model("core", "Recipe")
+    schema_editor.remove_index(recipe, SEARCH_INDEX)
+    schema_editor.execute(DROP_TRIGGER_SQL)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0008_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        # The trigger and the GIN index only exist on PostgreSQL.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name="recipe",
+                    index=SEARCH_INDEX,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(
+                    create_search_objects,
+                    drop_search_objects,
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.2.25 on 2026-10-16 23:52
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import (
+    BtreeGistExtension,
+    TrigramExtension,
+)
+from django.db import migrations
+
+
+TRIGRAM_INDEXES = {
+    "ingredient": django.contrib.postgres.indexes.GistIndex(
+        fields=["user", "name"],
+        name="ingredient_name_trgm_idx",
+        opclasses=["gist_int8_ops", "gist_trgm_ops"],
+    ),
+    "tag": django.contrib.postgres.indexes.GistIndex(
+        fields=["user", "name"],
+        name="tag_name_trgm_idx",
+        opclasses=["gist_int8_ops", "gist_trgm_ops"],
+    ),
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Create the trigram GiST indexes."""
+
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for model_name, index in TRIGRAM_INDEXES.items():
+        model = apps.get_model("core", model_name)
+        schema_editor.add_index(model, index)
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    """Drop the trigram GiST indexes."""
+
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for model_name, index in TRIGRAM_INDEXES.items():
+        model = apps.get_model("core", model_name)
+        schema_editor.remove_index(model, index)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0009_recipe_search_vector"),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        TrigramExtension(),
+        # GiST indexes only exist on PostgreSQL.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name=model_name, index=index)
+                for model_name, index in TRIGRAM_INDEXES.items()
+            ],
+            database_operations=[
+                migrations.RunPython(
+                    create_trigram_indexes,
+                    drop_trigram_indexes,
+                ),
+            ],
+        ),
+    ]
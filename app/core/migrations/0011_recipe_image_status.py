@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-16 23:52
+
+from django.db import migrations, models
+
+
+def mark_existing_images(apps, schema_editor):
+    """Images uploaded before the worker existed are served as they are."""
+
+    recipe = apps.get_model("core", "Recipe")
+    recipe.objects.exclude(image="").exclude(image__isnull=True).update(
+        image_status="ready"
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0010_trigram_name_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="image_status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("", "No image"),
+                    ("pending", "Pending"),
+                    ("processing", "Processing"),
+                    ("ready", "Ready"),
+                    ("failed", "Failed"),
+                ],
+                default="",
+                editable=False,
+                max_length=10,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                condition=models.Q(
+                    ("image_status__in", ["pending", "processing"])
+                ),
+                fields=["id"],
+                name="recipe_image_queue_idx",
+            ),
+        ),
+        migrations.RunPython(mark_existing_images, migrations.RunPython.noop),
+    ]
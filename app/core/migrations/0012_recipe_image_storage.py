@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-17 00:02
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_recipe_image_status"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="recipe",
+            name="image",
+            field=models.ImageField(
+                null=True,
+                storage=core.storage.recipe_image_storage,
+                upload_to=core.models.recipe_image_file_path,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["image"], name="recipe_image_idx"),
+        ),
+    ]
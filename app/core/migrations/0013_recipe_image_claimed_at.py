@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_recipe_image_storage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="image_claimed_at",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+    ]
@@ -5,6 +5,8 @@ import uuid
 import os
 
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, GistIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import (
     AbstractBaseUser,
@@ -12,6 +14,8 @@ from django.contrib.auth.models import (
     PermissionsMixin,
 )
 
+from core.storage import recipe_image_storage
+
 
 def recipe_image_file_path(instance, filename):
     ext = os.path.splitext(filename)[1]
@@ -60,6 +64,13 @@ class User(AbstractBaseUser, PermissionsMixin):
 class Recipe(models.Model):
     """Recipe definition."""
 
+    class ImageStatus(models.TextChoices):
+        NONE = "", "No image"
+        PENDING = "pending", "Pending"
+        PROCESSING = "processing", "Processing"
+        READY = "ready", "Ready"
+        FAILED = "failed", "Failed"
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -71,7 +82,42 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField("Tag")
     ingredients = models.ManyToManyField("Ingredient")
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(
+        null=True,
+        upload_to=recipe_image_file_path,
+        storage=recipe_image_storage,
+    )
+    # Uploads are stored as is and optimised by the process_images worker.
+    image_status = models.CharField(
+        max_length=10,
+        choices=ImageStatus.choices,
+        default=ImageStatus.NONE,
+        blank=True,
+        editable=False,
+    )
+    # When a process_images worker claimed the image, to tell the claims
+    # of stopped workers from those still being processed.
+    image_claimed_at = models.DateTimeField(null=True, editable=False)
+    # Weighted title and description lexemes, kept up to date by a
+    # database trigger on PostgreSQL (see migration 0009).
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Backs the keyset pagination of a user's recipes by "-id".
+            models.Index(fields=["user", "id"], name="recipe_user_id_idx"),
+            GinIndex(fields=["search_vector"], name="recipe_search_idx"),
+            # Counts the references to shared, content addressed images.
+            models.Index(fields=["image"], name="recipe_image_idx"),
+            # Keeps polling for the queue of the image worker cheap.
+            models.Index(
+                fields=["id"],
+                name="recipe_image_queue_idx",
+                condition=models.Q(
+                    image_status__in=["pending", "processing"]
+                ),
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -85,6 +131,17 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "name"], name="tag_user_name_idx"),
+            # Per user trigram index answering autocomplete lookups.
+            GistIndex(
+                fields=["user", "name"],
+                name="tag_name_trgm_idx",
+                opclasses=["gist_int8_ops", "gist_trgm_ops"],
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -98,5 +155,18 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "name"],
+                name="ingredient_user_name_idx",
+            ),
+            GistIndex(
+                fields=["user", "name"],
+                name="ingredient_name_trgm_idx",
+                opclasses=["gist_int8_ops", "gist_trgm_ops"],
+            ),
+        ]
+
     def __str__(self):
         return self.name
@@ -0,0 +1,57 @@
+"""
+JSON renderer backed by orjson.
+
+Produces the very bytes DRF's JSONRenderer does for the default compact,
+unicode output, several times faster. Whatever orjson cannot render the
+same way, e.g. indented output or integers beyond 64 bits, is handed to
+JSONRenderer. Floats are the one known difference: outside of 1e-4 to 1e16
+orjson writes them as 1e16 or 1e-5 where Python writes 1e+16 or 1e-05,
+which the API does not produce, and NaN, which JSONRenderer refuses, is
+rendered as null.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if orjson is not None:
+    OPTIONS = (
+        # Left to the DRF encoder, which formats them differently.
+        orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+        | orjson.OPT_NON_STR_KEYS
+    )
+
+
+class ORJSONRenderer(JSONRenderer):
+    """Drop-in replacement for JSONRenderer, rendering with orjson."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (
+            orjson is None
+            or indent is not None
+            or self.ensure_ascii
+            or not self.compact
+            or not self.strict
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default, option=OPTIONS
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Escaped by JSONRenderer to keep the output a JavaScript subset.
+        if b"\xe2\x80" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                b"\xe2\x80\xa9", b"\\u2029"
+            )
+        return ret
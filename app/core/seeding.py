@@ -0,0 +1,434 @@
+"""
+Synthetic, reproducible datasets of users, recipes, tags and ingredients.
+
+The same dataset and seed always produce the same rows, whatever the chunk
+size or the database. Rows are generated lazily, one user at a time, and
+written in chunks, with COPY on PostgreSQL and bulk inserts elsewhere, so
+memory use does not grow with the size of the dataset. Neither sends
+signals, so the cache generations of the seeded users are moved forward
+explicitly.
+"""
+import collections
+import functools
+import io
+import itertools
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+
+from rest_framework.authtoken.models import Token
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.cache import bump_version
+from user.authentication import invalidate_user_tokens
+
+PASSWORD = "seeded-password"
+
+WORDS = (
+    "apple basil beef bread butter carrot cheese chicken chili chocolate "
+    "cinnamon coconut corn cream curry egg fennel fish garlic ginger honey "
+    "lamb leek lemon lentil lime mango mint miso mushroom noodle oat olive "
+    "onion orange paprika pasta pea pear pepper pork potato pumpkin rice "
+    "saffron salmon sesame spinach squash sugar thyme tofu tomato vanilla"
+).split()
+DISHES = (
+    "bake bowl broth cake curry gratin pie risotto roast salad soup stew "
+    "tart"
+).split()
+RECIPE_FIELDS = ("title", "description", "time_minutes", "price", "link")
+
+# Escapes of the text format of COPY.
+COPY_ESCAPES = str.maketrans(
+    {"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"}
+)
+
+
+class Range(collections.namedtuple("Range", ["low", "high"])):
+    """Inclusive range of integers drawn uniformly."""
+
+    @classmethod
+    def of(cls, value):
+        """Return `value` as a range, a single number being a fixed one."""
+
+        if isinstance(value, (tuple, list)):
+            return cls(*value)
+        return cls(value, value)
+
+    @classmethod
+    def parse(cls, text, type=int):
+        """Parse "8" or "5-240", converting the bounds with `type`."""
+
+        low, dash, high = text.partition("-")
+        low = type(low)
+        high = type(high) if dash else low
+        if low < 0 or high < low:
+            raise ValueError(f"Invalid range: {text!r}.")
+        return cls(low, high)
+
+    def draw(self, rng):
+        return rng.randint(self.low, self.high)
+
+
+def _title(rng):
+    words = rng.sample(WORDS, rng.randint(1, 3))
+    return " ".join(words + [rng.choice(DISHES)]).capitalize()
+
+
+def _description(rng):
+    sentences = [
+        " ".join(rng.choices(WORDS, k=rng.randint(6, 14))).capitalize() + "."
+        for _ in range(rng.randint(1, 4))
+    ]
+    return " ".join(sentences)
+
+
+def _names(rng, count, kind):
+    """Return `count` distinct names, e.g. "Lemon ingredient 3"."""
+
+    return [
+        f"{rng.choice(WORDS).capitalize()} {kind} {i}" for i in range(count)
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def _popularity(count, skew):
+    """Return the cumulative Zipf weights of `count` ranked items."""
+
+    return list(
+        itertools.accumulate(rank ** -skew for rank in range(1, count + 1))
+    )
+
+
+def _sample(rng, count, k, skew):
+    """Return `k` distinct indexes below `count`, low ones more often."""
+
+    k = min(k, count)
+    if not skew or k == count:
+        return rng.sample(range(count), k)
+
+    weights = _popularity(count, skew)
+    chosen = {}
+    while len(chosen) < k:
+        for index in rng.choices(
+            range(count), cum_weights=weights, k=k - len(chosen)
+        ):
+            chosen[index] = None
+    return list(chosen)
+
+
+class Dataset:
+    """Distributions of the rows of a synthetic dataset.
+
+    Numbers of recipes, tags and ingredients are per user, numbers of tags
+    and ingredients of recipes per recipe. Each is either fixed or a
+    `Range` drawn from for every user or recipe. Prices are in cents and
+    `skew` is the Zipf exponent of the popularity of the tags and
+    ingredients of a user, 0 making them all as popular.
+    """
+
+    def __init__(
+        self,
+        users=10,
+        recipes=100,
+        tags=20,
+        ingredients=50,
+        tags_per_recipe=3,
+        ingredients_per_recipe=8,
+        time_minutes=(5, 240),
+        price=(50, 99999),
+        link_ratio=0.5,
+        skew=0.0,
+        seed=0,
+    ):
+        self.users = users
+        self.recipes = Range.of(recipes)
+        self.tags = Range.of(tags)
+        self.ingredients = Range.of(ingredients)
+        self.tags_per_recipe = Range.of(tags_per_recipe)
+        self.ingredients_per_recipe = Range.of(ingredients_per_recipe)
+        self.time_minutes = Range.of(time_minutes)
+        self.price = Range.of(price)
+        self.link_ratio = link_ratio
+        self.skew = skew
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    @property
+    def email_prefix(self):
+        return f"seed-{self.seed}-"
+
+    def email(self, index):
+        return f"{self.email_prefix}{index}@example.com"
+
+    def rng(self, index):
+        """Return the random generator of the rows of user `index`."""
+
+        return random.Random(f"{self.seed}-{index}")
+
+    def recipes_of(self, rng, index, tags, ingredients):
+        """Yield (values, tag indexes, ingredient indexes) of recipes.
+
+        Values are those of RECIPE_FIELDS.
+        """
+
+        for i in range(self.recipes.draw(rng)):
+            values = (
+                _title(rng),
+                _description(rng),
+                self.time_minutes.draw(rng),
+                Decimal(self.price.draw(rng)) / 100,
+                (
+                    f"https://example.com/{index}/{i}"
+                    if rng.random() < self.link_ratio
+                    else ""
+                ),
+            )
+            yield (
+                values,
+                _sample(rng, tags, self.tags_per_recipe.draw(rng), self.skew),
+                _sample(
+                    rng,
+                    ingredients,
+                    self.ingredients_per_recipe.draw(rng),
+                    self.skew,
+                ),
+            )
+
+
+class BulkWriter:
+    """Write rows with bulk_create, on any database."""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, batch_size=1000):
+        self.using = using
+        self.batch_size = batch_size
+        self._reserved = collections.defaultdict(collections.deque)
+        self._highest = {}
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def ids(self, model, count):
+        """Reserve `count` primary keys of `model`.
+
+        Rows are inserted with their keys, which not every database
+        returns from bulk inserts otherwise. On PostgreSQL the keys come
+        from the sequence of the table, elsewhere they follow the largest
+        key in use.
+        """
+
+        reserved = self._reserved[model]
+        if len(reserved) < count:
+            size = max(count - len(reserved), self.batch_size)
+            if self.connection.vendor == "postgresql":
+                reserved.extend(self._nextval(model, size))
+            else:
+                if model not in self._highest:
+                    self._highest[model] = self._last(model)
+                last = self._highest[model]
+                reserved.extend(range(last + 1, last + 1 + size))
+                self._highest[model] = last + size
+        return [reserved.popleft() for _ in range(count)]
+
+    def _last(self, model):
+        last = model.objects.using(self.using).aggregate(last=Max("pk"))
+        return last["last"] or 0
+
+    def _nextval(self, model, count):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+                "FROM generate_series(1, %s)",
+                [model._meta.db_table, model._meta.pk.column, count],
+            )
+            return [pk for pk, in cursor.fetchall()]
+
+    def write(self, model, fields, rows):
+        """Insert `rows`, tuples of values of the `fields` of `model`.
+
+        Fields are named by their attribute, e.g. user_id, the other
+        fields take their default.
+        """
+
+        model.objects.using(self.using).bulk_create(
+            [model(**dict(zip(fields, row))) for row in rows],
+            batch_size=self.batch_size,
+        )
+
+
+class CopyWriter(BulkWriter):
+    """Write rows with COPY FROM STDIN, on PostgreSQL."""
+
+    def write(self, model, fields, rows):
+        """COPY `rows`, tuples of values of the `fields` of `model`.
+
+        Values are numbers, strings and booleans. The other fields take
+        the values bulk_create would insert for them, computed once.
+        """
+
+        connection = self.connection
+        given = [model._meta.get_field(name) for name in fields]
+        blank = model()
+        defaults = [
+            field
+            for field in model._meta.concrete_fields
+            if field not in given and not field.primary_key
+        ]
+        default_text = "".join(
+            "\t"
+            + _copy_text(
+                field.get_db_prep_save(field.pre_save(blank, True), connection)
+            )
+            for field in defaults
+        )
+        data = io.StringIO()
+        for row in rows:
+            data.write("\t".join(map(_copy_text, row)))
+            data.write(default_text)
+            data.write("\n")
+        data.seek(0)
+
+        quote = connection.ops.quote_name
+        columns = ", ".join(quote(field.column) for field in given + defaults)
+        # copy_expert() is psycopg2's own, raise Django's errors from it.
+        with connection.cursor() as cursor, connection.wrap_database_errors:
+            cursor.copy_expert(
+                f"COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN",
+                data,
+            )
+
+
+def _copy_text(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).translate(COPY_ESCAPES)
+
+
+def writer_for(using=DEFAULT_DB_ALIAS, batch_size=1000):
+    """Return the fastest writer the database supports."""
+
+    if connections[using].vendor == "postgresql":
+        return CopyWriter(using, batch_size)
+    return BulkWriter(using, batch_size)
+
+
+class _Chunks:
+    """Rows waiting to be written, by model in dependency order."""
+
+    def __init__(self, writer, fields, size, progress):
+        self.writer = writer
+        self.fields = fields
+        self.size = size
+        self.progress = progress
+        self.pending = {model: [] for model in fields}
+        self.written = dict.fromkeys(fields, 0)
+        self.count = 0
+
+    def add(self, model, *values):
+        self.pending[model].append(values)
+        self.count += 1
+        if self.count >= self.size:
+            self.flush()
+
+    def flush(self):
+        for model, rows in self.pending.items():
+            if rows:
+                self.writer.write(model, self.fields[model], rows)
+                self.written[model] += len(rows)
+                rows.clear()
+        self.count = 0
+        if self.progress is not None:
+            self.progress(self.written)
+
+
+def seed(dataset, writer=None, chunk_size=10000, progress=None):
+    """Insert `dataset`, returning the number of rows written per model.
+
+    Users are named after the seed, seeding the same dataset twice fails
+    on their unique email addresses. Everything is written in a single
+    transaction, `progress` is called with the running counts after every
+    chunk.
+    """
+
+    writer = writer or writer_for()
+    User = get_user_model()
+    RecipeTag = Recipe.tags.through
+    RecipeIngredient = Recipe.ingredients.through
+    chunks = _Chunks(
+        writer,
+        {
+            User: ("id", "email", "name", "password"),
+            Token: ("key", "user_id"),
+            Tag: ("id", "user_id", "name"),
+            Ingredient: ("id", "user_id", "name"),
+            Recipe: ("id", "user_id") + RECIPE_FIELDS,
+            RecipeTag: ("recipe_id", "tag_id"),
+            RecipeIngredient: ("recipe_id", "ingredient_id"),
+        },
+        chunk_size,
+        progress,
+    )
+    password = make_password(PASSWORD, salt=f"seed{dataset.seed}")
+    user_ids = []
+
+    with transaction.atomic(using=writer.using):
+        for index in range(dataset.users):
+            rng = dataset.rng(index)
+            (user_id,) = writer.ids(User, 1)
+            user_ids.append(user_id)
+            chunks.add(
+                User, user_id, dataset.email(index), f"User {index}", password
+            )
+            chunks.add(Token, f"{rng.getrandbits(160):040x}", user_id)
+
+            tag_ids = writer.ids(Tag, dataset.tags.draw(rng))
+            tag_names = _names(rng, len(tag_ids), "tag")
+            for tag_id, name in zip(tag_ids, tag_names):
+                chunks.add(Tag, tag_id, user_id, name)
+            ingredient_ids = writer.ids(
+                Ingredient, dataset.ingredients.draw(rng)
+            )
+            ingredient_names = _names(rng, len(ingredient_ids), "ingredient")
+            for ingredient_id, name in zip(ingredient_ids, ingredient_names):
+                chunks.add(Ingredient, ingredient_id, user_id, name)
+
+            for values, tags, ingredients in dataset.recipes_of(
+                rng, index, len(tag_ids), len(ingredient_ids)
+            ):
+                (recipe_id,) = writer.ids(Recipe, 1)
+                chunks.add(Recipe, recipe_id, user_id, *values)
+                for i in tags:
+                    chunks.add(RecipeTag, recipe_id, tag_ids[i])
+                for i in ingredients:
+                    chunks.add(RecipeIngredient, recipe_id, ingredient_ids[i])
+        chunks.flush()
+
+    for user_id in user_ids:
+        bump_version(user_id)
+        invalidate_user_tokens(user_id)
+
+    return chunks.written
+
+
+def seeded_users(dataset, using=DEFAULT_DB_ALIAS):
+    """Return the users of `dataset` with `index` and `token` attributes."""
+
+    users = list(
+        get_user_model()
+        .objects.using(using)
+        .filter(email__startswith=dataset.email_prefix)
+        .select_related("auth_token")
+        .order_by("id")
+    )
+    for index, user in enumerate(users):
+        user.index = index
+        user.token = user.auth_token.key
+    return users
@@ -0,0 +1,16 @@
+"""
+Signal handlers recording metrics.
+"""
+from django.conf import settings
+from django.core.signals import request_finished
+from django.dispatch import receiver
+
+from core.metrics import record_pools
+
+
+@receiver(request_finished)
+def record_pool_metrics(sender, **kwargs):
+    """Record the pools once the request gave its connections back."""
+
+    if settings.METRICS_ENABLED:
+        record_pools()
@@ -0,0 +1,89 @@
+"""
+File storages for uploaded images.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CONTENT_DIR = "sha256"
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files by the SHA-256 of their content.
+
+    A file saved as <dir>/<any name>.<ext> is stored once as
+    <dir>/sha256/<2 hex digits>/<hex digest>.<ext>, saving the same content
+    again only returns the existing name. Names never change content, so
+    they can be cached forever.
+
+    Files are shared, `delete()` must only be called once nothing refers
+    to a file anymore. As a saver of the same content may not have stored
+    its reference yet, files saved within the last `delete_grace` seconds
+    are kept.
+    """
+
+    delete_grace = 60 * 60
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        tmp_directory = self.path(directory)
+        os.makedirs(tmp_directory, exist_ok=True)
+
+        # Hash while copying to a temporary file, reading the content once.
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp_file.write(chunk)
+
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(
+                directory, CONTENT_DIR, hexdigest[:2], hexdigest + extension
+            )
+            path = self.path(name)
+            if os.path.exists(path):
+                # Refresh the file for the grace period of `delete()`.
+                os.utime(path)
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content is hashed.
+        return name
+
+    def delete(self, name):
+        try:
+            age = time.time() - os.path.getmtime(self.path(name))
+        except FileNotFoundError:
+            return
+        if age >= self.delete_grace:
+            super().delete(name)
+
+
+def recipe_image_storage():
+    """Return the storage of recipe images picked by the settings."""
+
+    if settings.RECIPE_IMAGE_STORAGE == "content":
+        return ContentAddressedStorage()
+    # Not default_storage itself, Django would then leave this callable out
+    # of migrations whenever it picks the default.
+    return FileSystemStorage()
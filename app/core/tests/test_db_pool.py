@@ -0,0 +1,214 @@
+"""
+Tests for the database connection pool.
+"""
+import threading
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from core.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Test the connection pool with fake connections."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def create_pool(self, **kwargs):
+        kwargs.setdefault("clock", self.clock)
+        return ConnectionPool(connect=FakeConnection, **kwargs)
+
+    def test_connection_reused(self):
+        """Test a connection given back is handed out again."""
+        pool = self.create_pool()
+
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        self.assertIs(pool.getconn(), conn)
+        stats = pool.stats()
+        self.assertEqual(stats["connections_created"], 1)
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertEqual(stats["in_use"], 1)
+
+    def test_timeout_when_exhausted(self):
+        """Test waiting for a connection gives up after the timeout."""
+        pool = self.create_pool(max_size=1, timeout=0)
+        pool.getconn()
+
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+
+        stats = pool.stats()
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["waits"], 1)
+        self.assertEqual(stats["size"], 1)
+
+    def test_waiter_gets_returned_connection(self):
+        """Test a blocked caller receives the next connection given back."""
+        pool = ConnectionPool(connect=FakeConnection, max_size=1, timeout=5)
+        conn = pool.getconn()
+        release = threading.Timer(0.05, pool.putconn, [conn])
+        release.start()
+
+        self.assertIs(pool.getconn(), conn)
+
+        release.join()
+        stats = pool.stats()
+        self.assertEqual(stats["waits"], 1)
+        self.assertGreater(stats["wait_time"], 0)
+        self.assertEqual(stats["max_wait"], stats["wait_time"])
+
+    def test_failed_health_check_replaces_connection(self):
+        """Test a connection idle for long is checked before reuse."""
+        checked = []
+
+        def check(conn):
+            checked.append(conn)
+            return False
+
+        pool = self.create_pool(check=check, check_after=5)
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        self.clock.now = 1
+        self.assertIs(pool.getconn(), conn)
+        self.assertEqual(checked, [])
+        pool.putconn(conn)
+
+        self.clock.now = 10
+        new_conn = pool.getconn()
+
+        self.assertIsNot(new_conn, conn)
+        self.assertEqual(checked, [conn])
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()["health_check_failures"], 1)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_connection_replaced_after_max_lifetime(self):
+        """Test connections older than the max lifetime are closed."""
+        pool = self.create_pool(max_lifetime=60)
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        self.clock.now = 61
+        new_conn = pool.getconn()
+
+        self.assertIsNot(new_conn, conn)
+        self.assertTrue(conn.closed)
+        pool.putconn(new_conn)
+        self.assertEqual(pool.stats()["idle"], 1)
+
+    def test_idle_connections_reaped(self):
+        """Test idle connections are closed down to the minimum size."""
+        pool = self.create_pool(min_size=1, max_idle=30)
+        conns = [pool.getconn() for _ in range(3)]
+        for conn in conns:
+            pool.putconn(conn)
+
+        self.clock.now = 31
+        pool.putconn(pool.getconn())
+
+        stats = pool.stats()
+        self.assertEqual(stats["size"], 1)
+        self.assertEqual(stats["connections_closed"], 2)
+        self.assertEqual(sum(not conn.closed for conn in conns), 1)
+
+    def test_unusable_connection_discarded_on_return(self):
+        """Test a connection failing its reset is not pooled."""
+
+        def reset(conn):
+            raise RuntimeError("broken")
+
+        pool = self.create_pool(reset=reset)
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()["size"], 0)
+
+    def test_failed_connect_frees_slot(self):
+        """Test a failing connect does not use up the pool."""
+
+        def connect():
+            raise OSError("refused")
+
+        pool = ConnectionPool(connect=connect, max_size=1, timeout=0)
+
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                pool.getconn()
+        self.assertEqual(pool.stats()["size"], 0)
+
+    def test_close(self):
+        """Test closing a pool closes idle and later returned connections."""
+        pool = self.create_pool()
+        idle, in_use = pool.getconn(), pool.getconn()
+        pool.putconn(idle)
+
+        pool.close()
+        self.assertTrue(idle.closed)
+        self.assertFalse(in_use.closed)
+
+        pool.putconn(in_use)
+        self.assertTrue(in_use.closed)
+        self.assertEqual(pool.stats()["size"], 0)
+
+
+@skipUnless(
+    connection.settings_dict["ENGINE"] == "core.db.backends.postgresql_pool",
+    "requires the pooled PostgreSQL backend",
+)
+class PooledBackendTests(TestCase):
+    """Test the pooled PostgreSQL backend."""
+
+    def test_close_returns_connection_to_pool(self):
+        """Test closing a Django connection keeps the session open."""
+        wrapper = connection.copy()
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT pg_backend_pid()")
+            pid = cursor.fetchone()[0]
+
+        wrapper.close()
+        self.assertFalse(raw.closed)
+
+        wrapper.ensure_connection()
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT pg_backend_pid()")
+            self.assertEqual(cursor.fetchone()[0], pid)
+        wrapper.close()
+
+    def test_open_transaction_rolled_back_on_return(self):
+        """Test a connection is handed out again without a transaction."""
+        wrapper = connection.copy()
+        wrapper.ensure_connection()
+        wrapper.set_autocommit(False)
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+        wrapper.close()
+        wrapper.ensure_connection()
+
+        self.assertTrue(wrapper.get_autocommit())
+        self.assertEqual(wrapper.connection.get_transaction_status(), 0)
+        wrapper.close()
@@ -0,0 +1,109 @@
+"""
+Tests for the gc_images command.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.models import Recipe
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class GcImagesTests(TestCase):
+    """Test collecting orphaned images."""
+
+    def setUp(self):
+        self.addCleanup(shutil.rmtree, MEDIA_ROOT, ignore_errors=True)
+        user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        Recipe.objects.create(
+            user=user,
+            title="Sample recipe",
+            time_minutes=5,
+            price=Decimal("1.00"),
+            image="uploads/recipe/used.jpg",
+        )
+        self.old = time.time() - 2 * 24 * 60 * 60
+        self.files = {
+            name: self.create_file(name, age=age)
+            for name, age in [
+                ("uploads/recipe/used.jpg", self.old),
+                ("uploads/recipe/orphan.jpg", self.old),
+                ("uploads/recipe/sha256/ab/orphan.jpg", self.old),
+                ("uploads/recipe/new.jpg", None),
+                ("renditions/card/uploads/recipe/used.jpg", self.old),
+                ("renditions/card/uploads/recipe/orphan.jpg", self.old),
+            ]
+        }
+
+    def create_file(self, name, age=None):
+        path = os.path.join(MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"image")
+        if age is not None:
+            os.utime(path, (age, age))
+        return path
+
+    def remaining(self):
+        return {
+            name for name, path in self.files.items() if os.path.exists(path)
+        }
+
+    def gc_images(self, *args):
+        out = io.StringIO()
+        call_command("gc_images", "--batch-size", "2", *args, stdout=out)
+        return out.getvalue()
+
+    def test_orphans_deleted(self):
+        """Test old unreferenced images and their renditions are deleted."""
+        out = self.gc_images()
+
+        self.assertEqual(
+            self.remaining(),
+            {
+                "uploads/recipe/used.jpg",
+                "uploads/recipe/new.jpg",
+                "renditions/card/uploads/recipe/used.jpg",
+            },
+        )
+        self.assertIn("Scanned 6 files", out)
+        self.assertIn("3 orphans (15 bytes) deleted", out)
+
+    def test_dry_run(self):
+        """Test a dry run only reports orphans."""
+        out = self.gc_images("--dry-run")
+
+        self.assertEqual(self.remaining(), set(self.files))
+        self.assertIn("3 orphans (15 bytes) would be collected", out)
+
+    def test_quarantine(self):
+        """Test orphans can be moved aside instead of deleted."""
+        quarantine = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, quarantine)
+
+        self.gc_images("--quarantine", quarantine)
+
+        self.assertNotIn("uploads/recipe/orphan.jpg", self.remaining())
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(quarantine, "uploads/recipe/orphan.jpg")
+            )
+        )
+
+    def test_min_age(self):
+        """Test files younger than the minimum age are kept."""
+        self.gc_images("--min-age", str(3 * 24 * 60 * 60))
+
+        self.assertEqual(self.remaining(), set(self.files))
@@ -0,0 +1,240 @@
+"""
+Tests for the Prometheus metrics.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from prometheus_client import REGISTRY
+from prometheus_client.values import MultiProcessValue
+
+from rest_framework.test import APIClient
+
+from core.db.pool import ConnectionPool, PoolTimeout, close_pools, get_pool
+from core.metrics import record_pools
+from core.models import Recipe
+from core.tests.test_db_pool import FakeConnection
+
+METRICS_URL = reverse("metrics")
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsMiddlewareTests(TestCase):
+    """Test requests are recorded by view and action."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="metrics@example.com", password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertCounted(self, view, method, status, request):
+        labels = {"view": view, "method": method}
+        requests = sample("http_requests_total", status=status, **labels)
+        latency = sample("http_request_duration_seconds_count", **labels)
+
+        request()
+
+        self.assertEqual(
+            sample("http_requests_total", status=status, **labels),
+            requests + 1,
+        )
+        self.assertEqual(
+            sample("http_request_duration_seconds_count", **labels),
+            latency + 1,
+        )
+        self.assertEqual(sample("http_requests_in_progress", **labels), 0)
+
+    def test_viewset_actions(self):
+        """Test viewset requests are labelled by basename and action."""
+        recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price="1.00"
+        )
+        url = reverse("recipe:recipe-upload-image", args=[recipe.id])
+
+        self.assertCounted(
+            "recipe-list",
+            "GET",
+            "200",
+            lambda: self.client.get(reverse("recipe:recipe-list")),
+        )
+        self.assertCounted(
+            "tag-list",
+            "GET",
+            "200",
+            lambda: self.client.get(reverse("recipe:tag-list")),
+        )
+        self.assertCounted(
+            "recipe-upload-image",
+            "POST",
+            "400",
+            lambda: self.client.post(url, {}, format="multipart"),
+        )
+
+    def test_other_views(self):
+        """Test other views are labelled by URL namespace and name."""
+        self.assertCounted(
+            "user-token",
+            "POST",
+            "400",
+            lambda: self.client.post(reverse("user:token"), {}),
+        )
+        self.assertCounted(
+            "unmatched", "GET", "404", lambda: self.client.get("/nowhere/")
+        )
+
+    def test_queries_and_size(self):
+        """Test query counts and response sizes are recorded."""
+        labels = {"view": "user-me", "method": "GET"}
+        queries = sample("http_request_db_queries_sum", **labels)
+        size = sample("http_response_size_bytes_sum", **labels)
+
+        res = self.client.get(reverse("user:me"))
+
+        self.assertEqual(
+            sample("http_response_size_bytes_sum", **labels),
+            size + len(res.content),
+        )
+        self.assertGreaterEqual(
+            sample("http_request_db_queries_sum", **labels), queries
+        )
+
+
+class MetricsViewTests(TestCase):
+    """Test the scrape endpoint."""
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token_required(self):
+        """Test metrics are only served with the token."""
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, 401)
+
+        res = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION="Bearer secret"
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b"http_requests_total", res.content)
+
+    @override_settings(METRICS_TOKEN="", DEBUG=False)
+    def test_disabled_without_token(self):
+        """Test metrics are not served without a token outside DEBUG."""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 404)
+
+    @override_settings(METRICS_TOKEN="", DEBUG=True)
+    def test_aggregated_across_processes(self):
+        """Test the values written by every worker process are added up."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        with patch.dict("os.environ", {"PROMETHEUS_MULTIPROC_DIR": directory}):
+            for pid, count in [(101, 2), (102, 3)]:
+                value = MultiProcessValue(lambda pid=pid: pid)(
+                    "counter",
+                    "worker_jobs",
+                    "worker_jobs_total",
+                    [],
+                    [],
+                    "Jobs done.",
+                )
+                value.inc(count)
+
+            res = self.client.get(METRICS_URL)
+
+        self.assertIn(b"worker_jobs_total 5.0", res.content)
+
+    @override_settings(METRICS_TOKEN="", DEBUG=True)
+    def test_dead_processes_dropped(self):
+        """Test live gauges leave out workers that died without cleaning."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        dead = subprocess.Popen(["true"])
+        dead.wait()
+
+        with patch.dict("os.environ", {"PROMETHEUS_MULTIPROC_DIR": directory}):
+            for pid, count in [(os.getpid(), 1), (dead.pid, 4)]:
+                for typ, metric, name in [
+                    ("gauge", "busy_workers", "busy_workers"),
+                    ("counter", "worker_jobs", "worker_jobs_total"),
+                ]:
+                    value = MultiProcessValue(lambda pid=pid: pid)(
+                        typ, metric, name, [], [], "", "livesum"
+                    )
+                    value.inc(count)
+
+            res = self.client.get(METRICS_URL)
+
+        self.assertIn(b"busy_workers 1.0", res.content)
+        self.assertFalse(
+            os.path.exists(
+                os.path.join(directory, f"gauge_livesum_{dead.pid}.db")
+            )
+        )
+        # Counters of dead workers still count.
+        self.assertIn(b"worker_jobs_total 5.0", res.content)
+
+
+class PoolMetricsTests(TestCase):
+    """Test the stats of the database pools are exported."""
+
+    def setUp(self):
+        self.pool = get_pool(
+            "metrics-test",
+            lambda: ConnectionPool(
+                connect=FakeConnection, name="metrics-test", timeout=0
+            ),
+        )
+        self.addCleanup(close_pools, "metrics-test")
+
+    def test_pool_stats_recorded(self):
+        """Test pool sizes and waits are recorded, counted once."""
+
+        labels = {"pool": "metrics-test"}
+        waits = sample("db_pool_waits_total", **labels)
+        timeouts = sample("db_pool_timeouts_total", **labels)
+        connections = [self.pool.getconn() for _ in range(4)]
+        with self.assertRaises(PoolTimeout):
+            self.pool.getconn()
+        self.pool.putconn(connections.pop())
+
+        for _ in range(2):
+            record_pools()
+
+        self.assertEqual(sample("db_pool_waits_total", **labels), waits + 1)
+        self.assertEqual(
+            sample("db_pool_timeouts_total", **labels), timeouts + 1
+        )
+        self.assertEqual(
+            sample("db_pool_connections", state="in_use", **labels), 3
+        )
+        self.assertEqual(
+            sample("db_pool_connections", state="idle", **labels), 1
+        )
+        self.assertEqual(sample("db_pool_max_connections", **labels), 4)
+
+    @override_settings(METRICS_TOKEN="", DEBUG=True)
+    def test_pool_stats_served(self):
+        """Test the pool metrics are served on the scrape endpoint."""
+
+        res = self.client.get(METRICS_URL)
+
+        for name in [
+            "db_pool_connections",
+            "db_pool_max_connections",
+            "db_pool_waits_total",
+            "db_pool_wait_seconds_total",
+            "db_pool_timeouts_total",
+            "db_pool_max_wait_seconds",
+        ]:
+            self.assertIn(f'{name}{{pool="metrics-test"'.encode(), res.content)
@@ -0,0 +1,94 @@
+"""
+Tests for the Server-Timing middleware.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+RECIPES_URL = reverse("recipe:recipe-list")
+ME_URL = reverse("user:me")
+
+
+class ServerTimingMiddlewareTests(TestCase):
+    """Test timing sampled requests."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="timing@example.com", password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_timing_header_and_log(self):
+        """Test sampled requests get a Server-Timing header and log line."""
+        with self.assertLogs("core.middleware", "INFO") as logs:
+            res = self.client.get(RECIPES_URL)
+
+        metrics = [
+            metric.split(";")[0]
+            for metric in res["Server-Timing"].split(", ")
+        ]
+        self.assertEqual(metrics, ["db", "ser", "view", "render", "total"])
+        self.assertRegex(res["Server-Timing"], r'desc="[1-9]\d* queries"')
+
+        (record,) = logs.records
+        self.assertEqual(record.timing["view"], "RecipeViewSet.list")
+        self.assertEqual(record.timing["status"], 200)
+        self.assertGreater(record.timing["queries"], 0)
+        self.assertGreaterEqual(
+            record.timing["total_ms"], record.timing["view_ms"]
+        )
+        self.assertIn("view=RecipeViewSet.list", record.getMessage())
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_serializer_timed(self):
+        """Test building serializer data is timed apart from the view."""
+        Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price="1.00"
+        )
+
+        def slow_data(serializer):
+            clock.return_value += 0.25
+            return []
+
+        with patch("core.middleware.time.perf_counter") as clock, patch(
+            "recipe.serializers.RecipeRowListSerializer.data",
+            property(slow_data),
+        ), self.assertLogs("core.middleware", "INFO") as logs:
+            clock.return_value = 1.0
+            res = self.client.get(RECIPES_URL)
+
+        self.assertIn("ser;dur=250.00", res["Server-Timing"])
+        timing = logs.records[0].timing
+        self.assertEqual(timing["ser_ms"], 250.0)
+        self.assertEqual(timing["view_ms"], 250.0)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_generic_view_name(self):
+        """Test views which are not viewsets are named by their class."""
+        with self.assertLogs("core.middleware", "INFO") as logs:
+            self.client.get(ME_URL)
+
+        self.assertEqual(logs.records[0].timing["view"], "ManageUserView")
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0.5)
+    def test_not_sampled(self):
+        """Test requests outside of the sample are not timed."""
+        with patch("core.middleware.random.random", return_value=0.7):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn("Server-Timing", res)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_disabled(self):
+        """Test the middleware is left out when disabled."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn("Server-Timing", res)
@@ -0,0 +1,132 @@
+"""
+Tests for the orjson based JSON renderer and parser.
+"""
+import io
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.management.commands.benchmark_json import recipe_payload
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Test the renderer produces the bytes of JSONRenderer."""
+
+    def assertRendersAsDRF(self, data, *args):
+        self.assertEqual(
+            ORJSONRenderer().render(data, *args),
+            JSONRenderer().render(data, *args),
+        )
+
+    def test_recipe_payload(self):
+        """Test rendering realistic recipe lists."""
+        self.assertRendersAsDRF(recipe_payload(50))
+
+    def test_values(self):
+        """Test rendering the values the DRF encoder converts."""
+        self.assertRendersAsDRF(
+            {
+                "decimal": Decimal("12.50"),
+                "aware": datetime(2024, 5, 1, 8, 30, 15, 123456, timezone.utc),
+                "naive": datetime(2024, 5, 1, 8, 30),
+                "offset": datetime(
+                    2024, 5, 1, tzinfo=timezone(timedelta(hours=2))
+                ),
+                "date": date(2024, 5, 1),
+                "time": time(8, 30, 15, 123456),
+                "duration": timedelta(minutes=90),
+                "uuid": uuid.UUID(int=7),
+                "lazy": gettext_lazy("Recipe"),
+                "set": {1},
+                "bytes": b"abc",
+                "float": 0.3,
+                "none": None,
+                "nested": OrderedDict(b=[1, True, "x"], a={2: "two"}),
+            }
+        )
+
+    def test_unicode(self):
+        """Test non ASCII text is kept, except for JavaScript newlines."""
+        data = {"title": "Crème brûlée 🍮 \u2028\u2029 \x00\"\\\n"}
+
+        self.assertRendersAsDRF(data)
+        self.assertIn(b"\\u2028\\u2029", ORJSONRenderer().render(data))
+
+    def test_none(self):
+        """Test no data renders as an empty body."""
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_indent(self):
+        """Test indented output is left to JSONRenderer."""
+        data = {"a": [1, 2]}
+
+        self.assertRendersAsDRF(data, "application/json; indent=4")
+        self.assertRendersAsDRF(data, None, {"indent": 2})
+
+    def test_large_integers(self):
+        """Test integers beyond 64 bits are left to JSONRenderer."""
+        self.assertRendersAsDRF({"id": 2 ** 70})
+
+
+class ORJSONParserTests(SimpleTestCase):
+    """Test the parser reads what JSONParser reads."""
+
+    def parse(self, parser, body, encoding="utf-8"):
+        return parser.parse(
+            io.BytesIO(body), parser_context={"encoding": encoding}
+        )
+
+    def assertParsesAsDRF(self, body, encoding="utf-8"):
+        expected = self.parse(JSONParser(), body, encoding)
+        result = self.parse(ORJSONParser(), body, encoding)
+
+        self.assertEqual(result, expected)
+        self.assertEqual(repr(result), repr(expected))
+
+    def test_recipe_payload(self):
+        """Test parsing realistic recipe lists."""
+        self.assertParsesAsDRF(JSONRenderer().render(recipe_payload(50)))
+
+    def test_values(self):
+        """Test parsing numbers, unicode and escapes."""
+        self.assertParsesAsDRF(
+            '{"a": [1, -2.5, 1e400, 123456789012345678901234567890], '
+            '"b": "Crème \\u2028 \\ud83c\\udf6e", "c": null}'.encode()
+        )
+
+    def test_other_encodings(self):
+        """Test bodies in other encodings than UTF-8."""
+        self.assertParsesAsDRF(
+            '{"title": "Crème"}'.encode("utf-16"), encoding="utf-16"
+        )
+
+    def test_invalid(self):
+        """Test invalid documents raise a parse error."""
+        for body in (b"{", b'{"a": NaN}', b"\xff"):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError):
+                    self.parse(ORJSONParser(), body)
+
+
+class BenchmarkJSONTests(SimpleTestCase):
+    """Test the benchmark_json command."""
+
+    def test_benchmark(self):
+        """Test the command compares both renderers and parsers."""
+        out = io.StringIO()
+        call_command("benchmark_json", sizes=[3], repeat=1, stdout=out)
+
+        self.assertIn("3 recipes", out.getvalue())
+        self.assertIn("render", out.getvalue())
+        self.assertIn("parse", out.getvalue())
@@ -0,0 +1,199 @@
+"""
+Tests for seeding synthetic datasets.
+"""
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from core.models import Ingredient, Recipe, Tag
+from core.seeding import (
+    BulkWriter,
+    CopyWriter,
+    Dataset,
+    Range,
+    seed,
+    seeded_users,
+)
+
+
+def snapshot():
+    return [
+        (
+            recipe.user.email,
+            recipe.title,
+            recipe.description,
+            recipe.time_minutes,
+            recipe.price,
+            recipe.link,
+            recipe.image.name,
+            sorted(tag.name for tag in recipe.tags.all()),
+            sorted(ingredient.name for ingredient in recipe.ingredients.all()),
+        )
+        for recipe in Recipe.objects.order_by("id")
+        .select_related("user")
+        .prefetch_related("tags", "ingredients")
+    ]
+
+
+class SeedTests(TestCase):
+    """Test seeding datasets."""
+
+    dataset = Dataset(
+        users=2,
+        recipes=5,
+        tags=4,
+        ingredients=6,
+        tags_per_recipe=2,
+        ingredients_per_recipe=3,
+    )
+
+    def reseed(self, dataset, **kwargs):
+        """Seed `dataset` again, returning the rows and tokens."""
+        get_user_model().objects.all().delete()
+        seed(dataset, **kwargs)
+        tokens = [user.token for user in seeded_users(dataset)]
+        return snapshot(), tokens
+
+    def test_counts(self):
+        """Test the rows and links of every user are inserted."""
+        written = seed(self.dataset, chunk_size=3)
+        users = seeded_users(self.dataset)
+
+        self.assertEqual([user.index for user in users], [0, 1])
+        self.assertEqual(written[Recipe], 10)
+        self.assertEqual(written[Recipe.tags.through], 20)
+        for user in users:
+            self.assertEqual(Tag.objects.filter(user=user).count(), 4)
+            self.assertEqual(Ingredient.objects.filter(user=user).count(), 6)
+            recipes = Recipe.objects.filter(user=user)
+            self.assertEqual(recipes.count(), 5)
+            for recipe in recipes:
+                self.assertEqual(
+                    recipe.tags.filter(user=user).distinct().count(), 2
+                )
+                self.assertEqual(
+                    recipe.ingredients.filter(user=user).distinct().count(),
+                    3,
+                )
+
+    def test_reproducible(self):
+        """Test the same seed produces the same rows, in any chunks."""
+        rows, tokens = self.reseed(self.dataset)
+        self.assertEqual(len(rows), 10)
+
+        self.assertEqual(
+            self.reseed(self.dataset, chunk_size=7), (rows, tokens)
+        )
+        self.assertEqual(
+            self.reseed(self.dataset, writer=BulkWriter(batch_size=2)),
+            (rows, tokens),
+        )
+
+        other = Dataset(**{**self.dataset.as_dict(), "seed": 1})
+        self.assertNotEqual(self.reseed(other)[0], rows)
+
+    def test_distributions(self):
+        """Test counts and values are drawn from their ranges."""
+        dataset = Dataset(
+            users=3,
+            recipes=(0, 8),
+            tags=(1, 5),
+            tags_per_recipe=(0, 9),
+            time_minutes=(10, 20),
+            price=(100, 200),
+            link_ratio=0,
+            skew=1.5,
+        )
+        seed(dataset)
+
+        for user in seeded_users(dataset):
+            self.assertLessEqual(Recipe.objects.filter(user=user).count(), 8)
+            self.assertIn(Tag.objects.filter(user=user).count(), range(1, 6))
+        for recipe in Recipe.objects.all():
+            self.assertIn(recipe.time_minutes, range(10, 21))
+            self.assertTrue(1 <= recipe.price <= 2)
+            self.assertEqual(recipe.link, "")
+
+    def test_range_parse(self):
+        """Test ranges are parsed from a number or two."""
+        self.assertEqual(Range.parse("8"), Range(8, 8))
+        self.assertEqual(Range.parse("5-240"), Range(5, 240))
+        for text in ["", "9-3", "a", "1-2-3"]:
+            with self.assertRaises(ValueError):
+                Range.parse(text)
+
+    def test_token_authenticates(self):
+        """Test seeded users can make requests with their token."""
+        dataset = Dataset(users=1, recipes=3, seed=7)
+        seed(dataset)
+        (user,) = seeded_users(dataset)
+
+        res = self.client.get(
+            reverse("recipe:recipe-list"),
+            HTTP_AUTHORIZATION=f"Token {user.token}",
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.json()), 3)
+
+    def test_cache_invalidated(self):
+        """Test cached responses of seeded users are invalidated."""
+        with patch("core.seeding.bump_version") as bump_version:
+            seed(self.dataset)
+
+        self.assertEqual(
+            [call.args for call in bump_version.call_args_list],
+            [(user.id,) for user in seeded_users(self.dataset)],
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "Requires PostgreSQL.")
+    def test_copy_matches_bulk_create(self):
+        """Test COPY writes the rows bulk inserts do."""
+        rows = self.reseed(self.dataset, writer=BulkWriter())
+        self.assertEqual(self.reseed(self.dataset, writer=CopyWriter()), rows)
+
+        # The sequences moved past the copied keys.
+        user = Recipe.objects.first().user
+        Recipe.objects.create(
+            user=user, title="Soup", time_minutes=5, price="1.00"
+        )
+
+
+class SeedDataCommandTests(TestCase):
+    """Test the seed_data command."""
+
+    def test_seed_data(self):
+        """Test the dataset described by the options is seeded."""
+        out = StringIO()
+        call_command(
+            "seed_data",
+            "--users=2",
+            "--recipes=3",
+            "--tags=2",
+            "--price=1-2.50",
+            "--seed=5",
+            "--chunk-size=4",
+            stdout=out,
+        )
+
+        self.assertEqual(Recipe.objects.count(), 6)
+        self.assertEqual(Tag.objects.count(), 4)
+        self.assertTrue(
+            all(1 <= recipe.price <= 2.5 for recipe in Recipe.objects.all())
+        )
+        self.assertIn("6 core.Recipe", out.getvalue())
+
+    def test_seeded_before(self):
+        """Test seeding the same seed twice fails without writing."""
+        options = ["--users=1", "--recipes=1"]
+        call_command("seed_data", *options, stdout=StringIO())
+
+        with self.assertRaisesMessage(CommandError, "seeded before"):
+            call_command("seed_data", *options, stdout=StringIO())
+        self.assertEqual(Recipe.objects.count(), 1)
@@ -0,0 +1,73 @@
+"""
+Tests for the file storages.
+"""
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, override_settings
+
+from core.storage import ContentAddressedStorage, recipe_image_storage
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    """Test the content addressed storage."""
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+    def stored_files(self):
+        return [
+            os.path.join(root, name)
+            for root, _, names in os.walk(self.location)
+            for name in names
+        ]
+
+    def test_named_by_content(self):
+        """Test files are named by the hash of their content."""
+        name = self.storage.save("uploads/recipe/a.JPG", ContentFile(b"x"))
+
+        self.assertEqual(
+            name,
+            "uploads/recipe/sha256/2d/"
+            "2d711642b726b04401627ca9fbac32f5c8530fb1903cc4db02258717921a4881"
+            ".jpg",
+        )
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), b"x")
+
+    def test_same_content_stored_once(self):
+        """Test saving the same content again reuses the stored file."""
+        first = self.storage.save("uploads/recipe/a.jpg", ContentFile(b"x"))
+        second = self.storage.save("uploads/recipe/b.jpg", ContentFile(b"x"))
+        other = self.storage.save("uploads/recipe/c.jpg", ContentFile(b"y"))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(len(self.stored_files()), 2)
+
+    def test_recently_saved_file_kept(self):
+        """Test files saved within the grace period are not deleted."""
+        name = self.storage.save("uploads/recipe/a.jpg", ContentFile(b"x"))
+
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+
+        self.storage.delete_grace = 0
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+
+    @override_settings(RECIPE_IMAGE_STORAGE="content")
+    def test_storage_picked_by_settings(self):
+        """Test the recipe image storage follows the settings."""
+        self.assertIsInstance(recipe_image_storage(), ContentAddressedStorage)
+
+        with self.settings(RECIPE_IMAGE_STORAGE="uuid"):
+            self.assertNotIsInstance(
+                recipe_image_storage(), ContentAddressedStorage
+            )
@@ -0,0 +1,50 @@
+"""
+Helpers shared by the test suites.
+"""
+
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Assertions on the number of database queries a block issues."""
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using="default"):
+        """Fail if the block runs more than `budget` queries."""
+
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+
+        executed = len(context)
+        if executed > budget:
+            queries = "\n".join(
+                f"{i}. {q['sql']}"
+                for i, q in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(
+                f"{executed} queries executed, {budget} allowed.\n{queries}"
+            )
+
+    def assertQueriesConstant(self, request, grow, using="default"):
+        """Fail if `request` runs more queries after `grow` is called.
+
+        `request` is called once, `grow` adds more rows to the result and
+        `request` is called again; both calls must cost the same.
+        """
+
+        with CaptureQueriesContext(connections[using]) as before:
+            request()
+
+        grow()
+
+        with CaptureQueriesContext(connections[using]) as after:
+            request()
+
+        self.assertEqual(
+            len(before),
+            len(after),
+            "Query count grows with the result size.",
+        )
@@ -0,0 +1,29 @@
+"""
+Views for the metrics endpoint.
+"""
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_safe
+
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from core.metrics import exposition
+
+
+@require_safe
+def metrics(request):
+    """Serve the metrics of all worker processes to Prometheus.
+
+    Requires the METRICS_TOKEN as bearer token, or DEBUG without a token.
+    """
+    token = settings.METRICS_TOKEN
+    if not token and not settings.DEBUG:
+        raise Http404("Metrics are disabled.")
+    if token:
+        authorization = request.META.get("HTTP_AUTHORIZATION", "")
+        if not hmac.compare_digest(authorization, f"Bearer {token}"):
+            return HttpResponse(status=401)
+
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,171 @@
+"""
+Per user versioned response cache and ETags for the recipe APIs.
+
+Every user owns a generation counter in the shared cache. Cached responses
+and ETags are derived from that counter, so bumping it after any write
+invalidates all of the user's entries at once without having to find them.
+Nothing is cached when the cache is not shared by all workers, see
+CACHE_SHARED in the settings.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.cache import bump_generation, get_generation, reset_generation
+
+
+def _cache():
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f"recipe:version:{user_id}"
+
+
+def get_version(user_id):
+    """Return the current cache generation of a user."""
+
+    return get_generation(
+        _version_key(user_id), alias=settings.RECIPE_CACHE_ALIAS
+    )
+
+
+def bump_version(user_id):
+    """Invalidate every cached response of a user."""
+
+    bump_generation(_version_key(user_id), alias=settings.RECIPE_CACHE_ALIAS)
+
+
+def reset_version(user_id):
+    """Start a fresh generation, e.g. for a newly created user."""
+
+    reset_generation(
+        _version_key(user_id), alias=settings.RECIPE_CACHE_ALIAS
+    )
+
+
+def _request_version(request):
+    """Return the generation of the request's user, read once per request."""
+
+    if not hasattr(request, "_recipe_cache_version"):
+        request._recipe_cache_version = get_version(request.user.pk)
+    return request._recipe_cache_version
+
+
+def _request_digest(request):
+    """Hash everything besides the user that shapes a response."""
+
+    request_id = "\n".join(
+        [
+            request.build_absolute_uri(),
+            request.META.get("HTTP_ACCEPT", ""),
+        ]
+    )
+    return hashlib.sha256(request_id.encode()).hexdigest()
+
+
+def _is_cacheable(view, request, actions):
+    return (
+        settings.CACHE_SHARED
+        and view.action in actions
+        and request.method in ("GET", "HEAD")
+        and request.user.is_authenticated
+    )
+
+
+class ConditionalGetMixin:
+    """Answer unchanged list and detail requests with 304 Not Modified.
+
+    The ETag is derived from the user's cache generation, so it is known
+    before any query runs or anything is serialized.
+    """
+
+    conditional_actions = ("list", "retrieve")
+
+    def _etag(self, request):
+        """Return the strong ETag of a request, or None."""
+
+        if not _is_cacheable(self, request, self.conditional_actions):
+            return None
+
+        version = _request_version(request)
+        digest = hashlib.sha256(
+            f"{request.user.pk}:{version}:{_request_digest(request)}".encode()
+        ).hexdigest()
+
+        return f'"{digest[:32]}"'
+
+    def _conditional(self, request, handler, *args, **kwargs):
+        etag = self._etag(request)
+        if etag is None:
+            return handler(request, *args, **kwargs)
+
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH", "")
+        client_etags = [
+            tag[2:] if tag.startswith("W/") else tag
+            for tag in parse_etags(if_none_match)
+        ]
+        if etag in client_etags or "*" in client_etags:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+
+        if response.status_code in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED,
+        ):
+            response["ETag"] = etag
+            patch_vary_headers(response, ["Authorization"])
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(request, super().retrieve, *args, **kwargs)
+
+
+class CachedResponseMixin:
+    """Serve list and detail responses from the per user cache."""
+
+    cached_actions = ("list", "retrieve")
+
+    def _response_cache_key(self, request):
+        """Return the cache key of a request, or None if not cacheable."""
+
+        if not _is_cacheable(self, request, self.cached_actions):
+            return None
+
+        version = _request_version(request)
+        digest = _request_digest(request)
+
+        return f"recipe:response:{request.user.pk}:{version}:{digest}"
+
+    def _cached(self, request, handler, *args, **kwargs):
+        key = self._response_cache_key(request)
+        if key is None:
+            return handler(request, *args, **kwargs)
+
+        cache = _cache()
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(request, super().retrieve, *args, **kwargs)
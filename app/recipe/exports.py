@@ -0,0 +1,70 @@
+"""
+Streamed exports of recipe libraries as NDJSON or CSV.
+
+Recipes are read in chunks from a single query, through a server-side
+cursor where the database has them, and the tags and ingredients of each
+chunk are loaded with one query per relation. Each chunk is encoded and
+sent before the next one is read, so the memory a worker needs does not
+depend on the size of the library.
+"""
+import csv
+import io
+import itertools
+
+from core.renderers import ORJSONRenderer
+
+
+def represented_chunks(queryset, serializer, chunk_size):
+    """Yield lists of represented recipes, `chunk_size` at most each.
+
+    `queryset` yields the rows `serializer`, a RecipeRowListSerializer,
+    represents.
+    """
+
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield serializer.to_representation(chunk)
+
+
+def ndjson(chunks, fields):
+    """Encode every recipe as a JSON object on its own line."""
+
+    renderer = ORJSONRenderer()
+    for items in chunks:
+        yield b"".join(renderer.render(item) + b"\n" for item in items)
+
+
+def _cell(value):
+    if isinstance(value, list):
+        return "; ".join(item["name"] for item in value)
+    return value
+
+
+def csv_rows(chunks, fields):
+    """Encode recipes as CSV rows under a header row.
+
+    Tags and ingredients are given by their names, separated by "; ".
+    """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for items in chunks:
+        writer.writerows(
+            [_cell(item[field]) for field in fields] for item in items
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+# Export formats by name: content type, file extension and encoder.
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson", ndjson),
+    "csv": ("text/csv; charset=utf-8", "csv", csv_rows),
+}
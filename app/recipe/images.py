@@ -0,0 +1,156 @@
+"""
+Background processing of uploaded recipe images.
+
+Uploads are stored as they are and queued by setting the image status of
+the recipe to pending. The process_images command claims queued recipes,
+has their images decoded, downscaled and re-encoded by a pool of processes
+and swaps the optimised file in, unless the recipe got another image in the
+meantime.
+"""
+import io
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from PIL import Image, ImageOps
+
+from core.models import Recipe, recipe_image_file_path
+from recipe.cache import bump_version
+
+Status = Recipe.ImageStatus
+
+# Encoder options of the formats that are re-encoded, other formats (e.g.
+# animated GIFs) are kept as uploaded.
+SAVE_OPTIONS = {
+    "JPEG": {"quality": 85, "optimize": True, "progressive": True},
+    "PNG": {"optimize": True},
+    "WEBP": {"quality": 80, "method": 6},
+}
+
+
+def image_storage():
+    return Recipe._meta.get_field("image").storage
+
+
+def image_references(name):
+    """Return how many recipes use the stored image `name`."""
+
+    return Recipe.objects.filter(image=name).count()
+
+
+def delete_image(name):
+    """Delete a stored image, unless a recipe still uses it.
+
+    With content addressed storage one file may back any number of recipes.
+    """
+
+    if not image_references(name):
+        image_storage().delete(name)
+
+
+def optimise_image(name):
+    """Downscale and re-encode the stored image `name`.
+
+    Runs in the worker processes and never touches the database. Returns
+    the name of the optimised copy, or `name` if it is kept as it is.
+    """
+
+    storage = image_storage()
+    max_size = settings.RECIPE_IMAGE_MAX_SIZE
+
+    with storage.open(name) as image_file, Image.open(image_file) as image:
+        image_format = image.format
+        if image_format not in SAVE_OPTIONS:
+            return name
+
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, **SAVE_OPTIONS[image_format])
+
+    return storage.save(
+        recipe_image_file_path(None, name), ContentFile(buffer.getvalue())
+    )
+
+
+def _bump_owners(user_ids):
+    for user_id in set(user_ids):
+        bump_version(user_id)
+
+
+def claim_pending(limit):
+    """Mark up to `limit` queued recipes as processing.
+
+    Returns (id, user_id, image) tuples. Rows claimed by a concurrent worker
+    are skipped where the database supports it.
+    """
+
+    with transaction.atomic():
+        claimed = list(
+            Recipe.objects.select_for_update(skip_locked=True)
+            .filter(image_status=Status.PENDING)
+            .order_by("id")
+            .values_list("id", "user_id", "image")[:limit]
+        )
+        Recipe.objects.filter(id__in=[pk for pk, _, _ in claimed]).update(
+            image_status=Status.PROCESSING, image_claimed_at=timezone.now()
+        )
+
+    _bump_owners(user_id for _, user_id, _ in claimed)
+    return claimed
+
+
+def requeue_interrupted():
+    """Queue again the recipes left processing by a stopped worker.
+
+    Claims younger than RECIPE_IMAGE_CLAIM_TIMEOUT are left to the workers
+    still running.
+    """
+
+    cutoff = timezone.now() - timedelta(
+        seconds=settings.RECIPE_IMAGE_CLAIM_TIMEOUT
+    )
+    interrupted = Recipe.objects.filter(
+        Q(image_claimed_at__lt=cutoff) | Q(image_claimed_at=None),
+        image_status=Status.PROCESSING,
+    )
+    user_ids = list(interrupted.values_list("user_id", flat=True))
+    interrupted.update(image_status=Status.PENDING)
+    _bump_owners(user_ids)
+
+    return len(user_ids)
+
+
+def complete(recipe_id, user_id, name, optimised_name):
+    """Point the recipe at its optimised image, if it still has `name`."""
+
+    updated = Recipe.objects.filter(
+        id=recipe_id, image=name, image_status=Status.PROCESSING
+    ).update(image=optimised_name, image_status=Status.READY)
+
+    if optimised_name != name:
+        # Drop whichever of the two files the recipe does not use.
+        delete_image(name if updated else optimised_name)
+    if updated:
+        bump_version(user_id)
+
+    return bool(updated)
+
+
+def fail(recipe_id, user_id, name):
+    """Flag the image of a recipe as unprocessable, if it still has `name`."""
+
+    updated = Recipe.objects.filter(
+        id=recipe_id, image=name, image_status=Status.PROCESSING
+    ).update(image_status=Status.FAILED)
+    if updated:
+        bump_version(user_id)
+
+    return bool(updated)
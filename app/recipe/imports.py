@@ -0,0 +1,158 @@
+"""
+Streamed imports of recipe archives in NDJSON, one recipe per line.
+
+Lines are read and validated one at a time and the valid recipes are
+written in batches, each in its own transaction, so an import of any size
+holds one batch in memory. Tags and ingredients are looked up by name once
+per import and the ids are kept in a name to id map, looked up again when
+a batch fails on a row deleted since. After every batch the
+position in the archive is saved to a checkpoint, from which an interrupted
+import carries on. A batch whose commit was not followed by its
+checkpoint, e.g. when the process is killed in between, is imported again.
+"""
+import io
+import json
+import os
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError
+
+from rest_framework.exceptions import ParseError, ValidationError
+
+from core.parsers import ORJSONParser
+from recipe import serializers
+
+# Errors reported in full, the others are only counted.
+MAX_ERRORS = 100
+
+
+class FileCheckpoint:
+    """Checkpoint kept in a JSON file, written atomically."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as checkpoint:
+                return json.load(checkpoint)
+        except FileNotFoundError:
+            return None
+
+    def save(self, state):
+        partial = f"{self.path}.partial"
+        with open(partial, "w") as checkpoint:
+            json.dump(state, checkpoint)
+        os.replace(partial, self.path)
+
+
+class CacheCheckpoint:
+    """Checkpoint kept in the cache, for a day after its last update."""
+
+    timeout = 24 * 60 * 60
+
+    def __init__(self, key):
+        self.key = key
+
+    def load(self):
+        return caches[settings.RECIPE_CACHE_ALIAS].get(self.key)
+
+    def save(self, state):
+        caches[settings.RECIPE_CACHE_ALIAS].set(self.key, state, self.timeout)
+
+
+class RecipeImporter:
+    """Import the recipes of `user` from lines of NDJSON.
+
+    Every line is validated with RecipeExportSerializer, which reads what
+    the export writes, and invalid lines are skipped and reported.
+    """
+
+    serializer_class = serializers.RecipeExportSerializer
+
+    def __init__(self, user, batch_size=500, checkpoint=None):
+        self.user = user
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.serializer = self.serializer_class(
+            many=True, context={"known_names": {}}
+        )
+        self.parser = ORJSONParser()
+
+    def _resume(self, stream):
+        """Return the saved state, with `stream` moved past its lines."""
+
+        state = {"line": 0, "offset": 0, "imported": 0, "failed": 0}
+        saved = self.checkpoint.load() if self.checkpoint else None
+        if not saved:
+            return state
+
+        state.update(saved)
+        seekable = getattr(stream, "seekable", lambda: False)()
+        if seekable:
+            stream.seek(state["offset"])
+        else:
+            for _ in range(state["line"]):
+                stream.readline()
+        return state
+
+    def _create(self, batch):
+        self.serializer.create([{**data, "user": self.user} for data in batch])
+
+    def _commit(self, batch, state):
+        if batch:
+            try:
+                self._create(batch)
+            except IntegrityError:
+                # A tag or ingredient in the name to id map was deleted
+                # meanwhile, the batch is rolled back. Look the names up
+                # again and retry it once.
+                self.serializer.context["known_names"].clear()
+                self._create(batch)
+            state["imported"] += len(batch)
+            batch.clear()
+        if self.checkpoint:
+            self.checkpoint.save(state)
+
+    def run(self, stream):
+        """Import the lines of the binary `stream`, return the outcome.
+
+        The outcome holds the number of the last line read and the
+        numbers of recipes imported and lines failed, including those of
+        earlier runs resumed from, and the errors of this run by line.
+        """
+
+        state = self._resume(stream)
+        child = self.serializer.child
+        batch = []
+        errors = []
+
+        for line in iter(stream.readline, b""):
+            state["line"] += 1
+            state["offset"] += len(line)
+            if not line.strip():
+                continue
+
+            try:
+                data = self.parser.parse(io.BytesIO(line))
+                batch.append(child.run_validation(data))
+            except (ParseError, ValidationError) as exc:
+                state["failed"] += 1
+                if len(errors) < MAX_ERRORS:
+                    detail = exc.detail
+                    if isinstance(exc, ParseError):
+                        detail = {"non_field_errors": [detail]}
+                    errors.append({"line": state["line"], "errors": detail})
+                continue
+
+            if len(batch) >= self.batch_size:
+                self._commit(batch, state)
+        self._commit(batch, state)
+
+        return {
+            "line": state["line"],
+            "imported": state["imported"],
+            "failed": state["failed"],
+            "errors": errors,
+        }
@@ -0,0 +1,40 @@
+"""
+Pagination for the recipe APIs.
+"""
+
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Opaque cursor pagination over the ordering declared by the view.
+
+    Pages are fetched with a range filter on the ordering column instead of
+    an OFFSET, so every page costs the same however deep the client goes.
+    Pagination is opt-in: requests without a `cursor` or `page_size`
+    parameter keep receiving the plain, unpaginated list.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if (
+            self.cursor_query_param not in params
+            and self.page_size_query_param not in params
+        ):
+            return None
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        """Use the ordering of the view the pagination is attached to."""
+
+        if hasattr(view, "get_ordering"):
+            ordering = view.get_ordering()
+        else:
+            ordering = getattr(view, "ordering", None) or self.ordering
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
@@ -0,0 +1,126 @@
+"""
+Resized renditions of recipe images, generated on first request.
+
+Renditions are cached on disk under renditions/<rendition>/<image name> in
+the media directory, where the proxy serves them directly. Only requests for
+a missing rendition reach Django, which generates it once however many
+requests for it arrive at the same time.
+"""
+import fcntl
+import hashlib
+import math
+import os
+import posixpath
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from PIL import Image, ImageOps
+
+from recipe.images import SAVE_OPTIONS, image_storage
+
+RENDITIONS_DIR = "renditions"
+
+# Generation is serialized through a fixed set of lock files shared by all
+# processes of the host, keys hashing to the same file wait for each other.
+LOCK_DIR = os.path.join(tempfile.gettempdir(), "recipe-renditions")
+LOCK_STRIPES = 64
+
+
+def rendition_name(name, rendition):
+    """Return the storage name of a rendition of the image `name`."""
+
+    return posixpath.join(RENDITIONS_DIR, rendition, name)
+
+
+def rendition_urls(name):
+    """Return the URLs of all renditions of the image `name`."""
+
+    storage = image_storage()
+    return {
+        rendition: storage.url(rendition_name(name, rendition))
+        for rendition in settings.RECIPE_IMAGE_RENDITIONS
+    }
+
+
+@contextmanager
+def single_flight(key):
+    """Hold an exclusive lock on `key`, across threads and processes."""
+
+    digest = hashlib.sha256(key.encode()).digest()
+    stripe = int.from_bytes(digest[:4], "big") % LOCK_STRIPES
+    os.makedirs(LOCK_DIR, exist_ok=True)
+
+    # Every open() gets its own lock, so threads exclude each other as well.
+    with open(os.path.join(LOCK_DIR, f"{stripe}.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def get_rendition(name, rendition):
+    """Return the path of a rendition, generating it if it is missing.
+
+    Raises KeyError for unknown renditions, and OSError or ValueError if
+    the image does not exist or cannot be decoded.
+    """
+
+    spec = settings.RECIPE_IMAGE_RENDITIONS[rendition]
+    storage = image_storage()
+    path = storage.path(rendition_name(name, rendition))
+    if os.path.exists(path):
+        return path
+
+    with single_flight(path):
+        # Whoever held the lock before may have generated it already.
+        if not os.path.exists(path):
+            _generate(storage, name, spec, path)
+
+    return path
+
+
+def _generate(storage, name, spec, path):
+    width, height = spec["size"]
+
+    with storage.open(name) as image_file, Image.open(image_file) as image:
+        image_format = image.format
+        if spec.get("crop"):
+            # Let JPEG decode at the smallest scale still covering the crop.
+            ratio = max(width, height) / min(image.size)
+            if ratio < 1:
+                image.draft(
+                    image.mode,
+                    (
+                        math.ceil(image.width * ratio),
+                        math.ceil(image.height * ratio),
+                    ),
+                )
+            image = ImageOps.fit(
+                ImageOps.exif_transpose(image), (width, height), Image.LANCZOS
+            )
+        else:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((width, height), Image.LANCZOS)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        # Write next to the target and rename, so that the proxy never
+        # serves a partially written file.
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                image.save(
+                    tmp_file,
+                    format=image_format,
+                    **SAVE_OPTIONS.get(image_format, {}),
+                )
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
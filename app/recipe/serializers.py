@@ -1,9 +1,58 @@
 """
 Serializers for recipe APIs.
 """
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.functional import cached_property
+from drf_spectacular.utils import extend_schema_field
+from PIL import Image
 from rest_framework import serializers
 
 from core.models import Recipe, Tag, Ingredient
+from recipe.cache import bump_version
+from recipe.renditions import rendition_urls
+from recipe.uploads import read_image_header, with_extension
+
+
+def resolve_names(model, user_id, names, known=None):
+    """Return a name to id map for `names`, creating the missing rows.
+
+    All names are looked up with one query and the missing ones are
+    inserted with one bulk insert, however many names are given. `known`
+    is a name to id map of the user's rows kept across calls, names in it
+    are not looked up again and the others are added to it.
+    """
+
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+
+    ids = {} if known is None else known
+    lookup = [name for name in names if name not in ids]
+    if not lookup:
+        return {name: ids[name] for name in names}
+
+    queryset = model.objects.filter(user_id=user_id)
+    existing = queryset.filter(name__in=lookup).order_by("id")
+    for pk, name in existing.values_list("id", "name"):
+        ids.setdefault(name, pk)
+
+    missing = [name for name in lookup if name not in ids]
+    if missing:
+        created = model.objects.bulk_create(
+            [model(user_id=user_id, name=name) for name in missing]
+        )
+        features = connections[queryset.db].features
+        if features.can_return_rows_from_bulk_insert:
+            ids.update((obj.name, obj.pk) for obj in created)
+        else:
+            ids.update(
+                queryset.filter(name__in=missing).values_list("name", "id")
+            )
+
+    return {name: ids[name] for name in names}
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -34,7 +83,151 @@ class TagSerializer(serializers.ModelSerializer):
         ]
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class AutocompleteSerializer(serializers.Serializer):
+    """Serializer for tag and ingredient name suggestions."""
+
+    id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(read_only=True)
+    similarity = serializers.FloatField(read_only=True, allow_null=True)
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Create and update many recipes with set-based queries."""
+
+    def _link(self, recipes, field, model, items, replace=False):
+        """Link each recipe to its items with one insert per relation.
+
+        `items` holds one list of payloads per recipe, or None to leave
+        the recipe's current links untouched.
+        """
+
+        relation = getattr(Recipe, field)
+        through = relation.through
+        source = f"{relation.field.m2m_field_name()}_id"
+        target = f"{relation.field.m2m_reverse_field_name()}_id"
+
+        pairs = [
+            (recipe, recipe_items)
+            for recipe, recipe_items in zip(recipes, items)
+            if recipe_items is not None
+        ]
+        names = defaultdict(list)
+        for recipe, recipe_items in pairs:
+            names[recipe.user_id].extend(item["name"] for item in recipe_items)
+        # Name to id maps the caller keeps across calls, e.g. imports.
+        known = self.context.get("known_names")
+        ids = {
+            user_id: resolve_names(
+                model,
+                user_id,
+                user_names,
+                known=(
+                    None
+                    if known is None
+                    else known.setdefault((model, user_id), {})
+                ),
+            )
+            for user_id, user_names in names.items()
+        }
+
+        rows = []
+        for recipe, recipe_items in pairs:
+            user_ids = ids[recipe.user_id]
+            linked = dict.fromkeys(
+                user_ids[item["name"]] for item in recipe_items
+            )
+            rows.extend(
+                through(**{source: recipe.pk, target: pk}) for pk in linked
+            )
+
+        if replace and pairs:
+            through.objects.filter(
+                **{f"{source}__in": [recipe.pk for recipe, _ in pairs]}
+            ).delete()
+        through.objects.bulk_create(rows)
+
+    def create(self, validated_data):
+        """Create all recipes, then link their tags and ingredients."""
+
+        tags = [item.pop("tags", []) for item in validated_data]
+        ingredients = [item.pop("ingredients", []) for item in validated_data]
+        recipes = [Recipe(**item) for item in validated_data]
+
+        with transaction.atomic():
+            features = connections[Recipe.objects.db].features
+            if features.can_return_rows_from_bulk_insert:
+                Recipe.objects.bulk_create(recipes)
+            else:
+                for recipe in recipes:
+                    recipe.save()
+
+            self._link(recipes, "tags", Tag, tags)
+            self._link(recipes, "ingredients", Ingredient, ingredients)
+
+            # Bulk inserts send no signals, invalidate the cache explicitly.
+            for user_id in {recipe.user_id for recipe in recipes}:
+                bump_version(user_id)
+
+        return recipes
+
+    def update(self, instance, validated_data):
+        """Update the recipes in `instance`, paired with items by position."""
+
+        tags = [item.pop("tags", None) for item in validated_data]
+        ingredients = [
+            item.pop("ingredients", None) for item in validated_data
+        ]
+
+        fields = set()
+        for recipe, item in zip(instance, validated_data):
+            for attr, val in item.items():
+                setattr(recipe, attr, val)
+            fields.update(item)
+
+        with transaction.atomic():
+            if fields:
+                Recipe.objects.bulk_update(instance, sorted(fields))
+
+            self._link(instance, "tags", Tag, tags, replace=True)
+            self._link(
+                instance,
+                "ingredients",
+                Ingredient,
+                ingredients,
+                replace=True,
+            )
+
+            for user_id in {recipe.user_id for recipe in instance}:
+                bump_version(user_id)
+
+        return instance
+
+
+class SparseFieldsMixin:
+    """Represent only the fields named in the `fields` argument, if any."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        self.sparse_fields = fields
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.sparse_fields is None:
+            return fields
+
+        unknown = [name for name in self.sparse_fields if name not in fields]
+        if unknown:
+            raise serializers.ValidationError(
+                {"fields": [f"Unknown fields: {', '.join(unknown)}."]}
+            )
+        return {
+            name: field
+            for name, field in fields.items()
+            if name in self.sparse_fields
+        }
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializers for Recipe API."""
 
     tags = TagSerializer(many=True, required=False)
@@ -52,29 +245,21 @@ class RecipeSerializer(serializers.ModelSerializer):
             "ingredients",
         ]
         read_only_fields = ["id"]
+        list_serializer_class = RecipeListSerializer
 
-    def _get_or_create_ingredients(self, ings, recipe):
-        """Create or return ingredients for recipe."""
+    def _set_related(self, recipe, field, model, items, replace=False):
+        """Link `items` to recipe, creating the missing ones in bulk."""
 
-        auth_user = self.context["request"].user
-        for ing in ings:
-            ing_instance, _ = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ing,
-            )
-            recipe.ingredients.add(ing_instance)
-
-    def _get_or_create_tags(self, tags, recipe):
-        """Create or return a tag as needed."""
-
-        auth_user = self.context["request"].user
-        for tag in tags:
-            tag_obj, _ = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-
-            recipe.tags.add(tag_obj)
+        ids = resolve_names(
+            model,
+            recipe.user_id,
+            [item["name"] for item in items],
+        )
+        manager = getattr(recipe, field)
+        if replace:
+            manager.set(ids.values())
+        elif ids:
+            manager.add(*ids.values())
 
     def create(self, validated_data):
         """Create a recipe."""
@@ -83,8 +268,8 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         recipe = Recipe.objects.create(**validated_data)
 
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        self._set_related(recipe, "tags", Tag, tags)
+        self._set_related(recipe, "ingredients", Ingredient, ingredients)
         return recipe
 
     def update(self, instance, validated_data):
@@ -94,12 +279,16 @@ class RecipeSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop("ingredients", None)
 
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            self._set_related(instance, "tags", Tag, tags, replace=True)
 
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            self._set_related(
+                instance,
+                "ingredients",
+                Ingredient,
+                ingredients,
+                replace=True,
+            )
 
         for attr, val in validated_data.items():
             setattr(instance, attr, val)
@@ -111,15 +300,224 @@ class RecipeSerializer(serializers.ModelSerializer):
 class RecipeDetailSerializer(RecipeSerializer):
     """Show one recipe with more details."""
 
+    image_renditions = serializers.SerializerMethodField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + [
+            "description",
+            "image",
+            "image_status",
+            "image_renditions",
+        ]
+
+    @extend_schema_field(
+        serializers.DictField(child=serializers.URLField(), allow_null=True)
+    )
+    def get_image_renditions(self, recipe):
+        """Return the URL of every rendition of the image, by name."""
+
+        if not recipe.image:
+            return None
+
+        urls = rendition_urls(recipe.image.name)
+        request = self.context.get("request")
+        if request is not None:
+            urls = {
+                rendition: request.build_absolute_uri(url)
+                for rendition, url in urls.items()
+            }
+        return urls
+
+
+# Fields representing the values the database returns as they are.
+IDENTITY_FIELDS = (serializers.IntegerField, serializers.CharField)
+
+
+class RecipeRowListSerializer(serializers.ListSerializer):
+    """Represent recipe rows, loading their related rows in bulk."""
+
+    def to_representation(self, data):
+        rows = list(data)
+        ids = [row["id"] for row in rows]
+        for field in self.child.nested_fields:
+            related = self.child.related_rows(field, ids)
+            for row in rows:
+                row[field] = related.get(row["id"], [])
+
+        return [self.child.to_representation(row) for row in rows]
+
+
+class RecipeRowSerializer(serializers.BaseSerializer):
+    """Read-only output of RecipeSerializer, built from `values()` rows.
+
+    Creating recipe, tag and ingredient instances and running a serializer
+    field per attribute dominates the cost of long recipe lists. This takes
+    rows of `value_fields` instead and only converts the values whose
+    representation differs from what the database returns. The related
+    rows of a whole list are loaded with one query per relation, in id
+    order, and grouped by recipe in one pass.
+    """
+
+    serializer_class = RecipeSerializer
+
+    class Meta:
+        list_serializer_class = RecipeRowListSerializer
+
+    def __init__(self, *args, fields=None, **kwargs):
+        self.sparse_fields = fields
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def _fields(self):
+        return self.serializer_class(
+            context=self.context, fields=self.sparse_fields
+        ).fields
+
+    @property
+    def field_names(self):
+        """Return the names of the represented fields, in order."""
+
+        return list(self._fields)
+
+    @cached_property
+    def nested_fields(self):
+        """Map the nested fields to the fields of their items."""
+
+        return {
+            name: list(field.child.fields)
+            for name, field in self._fields.items()
+            if isinstance(field, serializers.ListSerializer)
+        }
+
+    @cached_property
+    def value_fields(self):
+        """Return the fields to select from the recipes."""
+
+        # The id groups the related rows, even if it is not represented.
+        fields = ["id"]
+        fields.extend(
+            field.source
+            for name, field in self._fields.items()
+            if name not in self.nested_fields
+        )
+        return list(dict.fromkeys(fields))
+
+    @cached_property
+    def _converters(self):
+        return [
+            (
+                name,
+                name if name in self.nested_fields else field.source,
+                None
+                if name in self.nested_fields
+                or isinstance(field, IDENTITY_FIELDS)
+                else field.to_representation,
+            )
+            for name, field in self._fields.items()
+        ]
+
+    def related_rows(self, field, recipe_ids):
+        """Return the related items of `field` by recipe id."""
+
+        relation = getattr(self.serializer_class.Meta.model, field)
+        source = f"{relation.field.m2m_field_name()}_id"
+        target = relation.field.m2m_reverse_field_name()
+        names = self.nested_fields[field]
+
+        rows = (
+            relation.through.objects.filter(**{f"{source}__in": recipe_ids})
+            .order_by(f"{target}_id")
+            .values_list(source, *(f"{target}__{name}" for name in names))
+        )
+        related = defaultdict(list)
+        for recipe_id, *values in rows:
+            related[recipe_id].append(dict(zip(names, values)))
+
+        return related
+
+    def to_representation(self, row):
+        ret = {}
+        for name, source, convert in self._converters:
+            value = row[source]
+            if convert is not None and value is not None:
+                value = convert(value)
+            ret[name] = value
+
+        return ret
+
+
+class RecipeExportSerializer(RecipeSerializer):
+    """Fields of exported recipes."""
+
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ["description", "image"]
+        fields = RecipeSerializer.Meta.fields + ["description"]
+
+
+class RecipeExportRowSerializer(RecipeRowSerializer):
+    """Output of RecipeExportSerializer, built from `values()` rows."""
+
+    serializer_class = RecipeExportSerializer
+
+
+class RecipeImportSerializer(serializers.Serializer):
+    """Outcome of a recipe import."""
+
+    line = serializers.IntegerField(
+        read_only=True, help_text="Number of the last line read."
+    )
+    imported = serializers.IntegerField(read_only=True)
+    failed = serializers.IntegerField(read_only=True)
+    errors = serializers.ListField(
+        child=serializers.DictField(),
+        read_only=True,
+        help_text="Errors of the first failed lines, by line number.",
+    )
+
+
+class ImageUploadField(serializers.FileField):
+    """Image file validated from its header, without decoding it."""
+
+    default_error_messages = {
+        "invalid_image": (
+            "Upload a valid image. The file you uploaded was either not an "
+            "image or a corrupted image."
+        ),
+        "format": "Unsupported image format, use one of: {formats}.",
+        "dimensions": (
+            "Images may be at most {max_dimension} pixels wide and high."
+        ),
+        "pixels": "Images may have at most {max_pixels} pixels.",
+    }
+
+    def to_internal_value(self, data):
+        image_file = super().to_internal_value(data)
+
+        try:
+            image_format, (width, height) = read_image_header(image_file)
+        except (OSError, Image.DecompressionBombError):
+            self.fail("invalid_image")
+
+        if image_format not in settings.RECIPE_IMAGE_FORMATS:
+            self.fail(
+                "format", formats=", ".join(settings.RECIPE_IMAGE_FORMATS)
+            )
+        max_dimension = settings.RECIPE_IMAGE_MAX_DIMENSION
+        if width > max_dimension or height > max_dimension:
+            self.fail("dimensions", max_dimension=max_dimension)
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self.fail("pixels", max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS)
+
+        # Store under the extension of the actual format.
+        image_file.name = with_extension(image_file.name, image_format)
+        return image_file
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for recipe image upload."""
 
+    image = ImageUploadField()
+
     class Meta:
         model = Recipe
-        fields = ["id", "image"]
-        read_only_fields = ["id"]
-        extra_kwargs = {"image": {"required": "True"}}
+        fields = ["id", "image", "image_status"]
+        read_only_fields = ["id", "image_status"]
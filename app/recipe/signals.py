@@ -0,0 +1,39 @@
+"""
+Signal handlers keeping the recipe response cache fresh.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import bump_version, reset_version
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_owner(sender, instance, **kwargs):
+    """Invalidate the cached responses of the owner of `instance`."""
+
+    bump_version(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_links_owner(sender, instance, action, **kwargs):
+    """Invalidate cached responses when recipe links change."""
+
+    if action.startswith("post_"):
+        bump_version(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def start_user_generation(sender, instance, created, **kwargs):
+    """Give new users a fresh cache generation."""
+
+    if created:
+        reset_version(instance.pk)
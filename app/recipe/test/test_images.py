@@ -0,0 +1,317 @@
+"""
+Tests for the processing and the renditions of recipe images.
+"""
+import io
+import os
+import shutil
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe import images, renditions
+
+
+def create_recipe_with_image(user, content, name="photo.jpg"):
+    """Create a recipe with a freshly uploaded image."""
+
+    recipe = Recipe.objects.create(
+        user=user,
+        title="Sample recipe",
+        time_minutes=5,
+        price=Decimal("1.00"),
+    )
+    recipe.image.save(name, ContentFile(content), save=False)
+    recipe.image_status = Recipe.ImageStatus.PENDING
+    recipe.save()
+
+    return recipe
+
+
+def jpeg(size):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+optimise_image = images.optimise_image
+# Images killing the worker process optimising them, inherited by the
+# forked workers.
+crashing_images = set()
+
+
+def optimise_or_crash(name):
+    """Optimise the image `name`, unless it is one of `crashing_images`."""
+
+    if name in crashing_images:
+        os._exit(1)
+    return optimise_image(name)
+
+
+def process_images(*args):
+    call_command("process_images", "--once", *args, stdout=io.StringIO())
+
+
+@override_settings(RECIPE_IMAGE_MAX_SIZE=100)
+class ProcessImagesTests(TestCase):
+    """Test the process_images command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+
+    def tearDown(self):
+        for recipe in Recipe.objects.all():
+            recipe.image.delete(save=False)
+
+    def test_image_downscaled(self):
+        """Test queued images are downscaled and the upload dropped."""
+        recipe = create_recipe_with_image(self.user, jpeg((400, 200)))
+        original_path = recipe.image.path
+
+        process_images("--workers", "0")
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, Recipe.ImageStatus.READY)
+        self.assertNotEqual(recipe.image.path, original_path)
+        self.assertFalse(os.path.exists(original_path))
+        with Image.open(recipe.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertEqual(image.format, "JPEG")
+
+    def test_invalid_image_failed(self):
+        """Test images that cannot be decoded are flagged as failed."""
+        recipe = create_recipe_with_image(self.user, b"not an image")
+
+        with self.assertLogs("core.management", "ERROR"):
+            process_images("--workers", "0")
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, Recipe.ImageStatus.FAILED)
+        self.assertTrue(os.path.exists(recipe.image.path))
+
+    def test_replaced_image_kept(self):
+        """Test a result is dropped if the recipe got another image."""
+        recipe = create_recipe_with_image(self.user, jpeg((400, 200)))
+        [(recipe_id, user_id, name)] = images.claim_pending(10)
+        optimised = images.optimise_image(name)
+        recipe.image.save("new.jpg", ContentFile(jpeg((10, 10))))
+
+        self.assertFalse(images.complete(recipe_id, user_id, name, optimised))
+
+        recipe.refresh_from_db()
+        self.assertNotIn(recipe.image.name, (name, optimised))
+        self.assertFalse(images.image_storage().exists(optimised))
+        images.delete_image(name)
+
+    def test_shared_image_deleted_with_last_reference(self):
+        """Test an image used by several recipes is kept while in use."""
+        recipe = create_recipe_with_image(self.user, jpeg((10, 10)))
+        name = recipe.image.name
+        Recipe.objects.create(
+            user=self.user,
+            title="Copy",
+            time_minutes=5,
+            price=Decimal("1.00"),
+            image=name,
+        )
+
+        images.delete_image(name)
+        self.assertTrue(images.image_storage().exists(name))
+
+        Recipe.objects.update(image="")
+        images.delete_image(name)
+        self.assertFalse(images.image_storage().exists(name))
+
+    def test_interrupted_images_requeued(self):
+        """Test images left processing past the claim timeout are retried."""
+        recipe = create_recipe_with_image(self.user, jpeg((400, 200)))
+        images.claim_pending(10)
+        Recipe.objects.update(
+            image_claimed_at=timezone.now() - timedelta(minutes=11)
+        )
+
+        process_images("--workers", "0")
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, Recipe.ImageStatus.READY)
+
+    def test_claimed_images_not_requeued(self):
+        """Test images claimed by a running worker are left to it."""
+        recipe = create_recipe_with_image(self.user, jpeg((400, 200)))
+        images.claim_pending(10)
+
+        self.assertEqual(images.requeue_interrupted(), 0)
+        process_images("--workers", "0")
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, Recipe.ImageStatus.PROCESSING)
+
+
+@override_settings(RECIPE_IMAGE_MAX_SIZE=100)
+class ProcessImagesPoolTests(TransactionTestCase):
+    """Test images are processed by a pool of worker processes."""
+
+    def test_processed_in_worker_processes(self):
+        user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        recipes = [
+            create_recipe_with_image(user, jpeg((400, 200))) for _ in range(3)
+        ]
+
+        process_images("--workers", "2")
+
+        for recipe in recipes:
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.image_status, Recipe.ImageStatus.READY)
+            with Image.open(recipe.image.path) as image:
+                self.assertEqual(image.size, (100, 50))
+            recipe.image.delete(save=False)
+
+    def test_broken_pool_fails_culprit_only(self):
+        """Test only the image killing a worker is flagged as failed."""
+        user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        crash = create_recipe_with_image(user, jpeg((10, 10)))
+        recipes = [
+            create_recipe_with_image(user, jpeg((400, 200))) for _ in range(4)
+        ]
+        crashing_images.add(crash.image.name)
+        self.addCleanup(crashing_images.clear)
+
+        with patch(
+            "recipe.images.optimise_image", optimise_or_crash
+        ), self.assertLogs("core.management", "ERROR") as logs:
+            process_images("--workers", "2")
+
+        self.assertEqual(len(logs.records), 1)
+        crash.refresh_from_db()
+        self.assertEqual(crash.image_status, Recipe.ImageStatus.FAILED)
+        crash.image.delete(save=False)
+        for recipe in recipes:
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.image_status, Recipe.ImageStatus.READY)
+            recipe.image.delete(save=False)
+
+
+def rendition_url(rendition, name):
+    return reverse("image-rendition", args=[rendition, name])
+
+
+class RenditionTests(TestCase):
+    """Test the image renditions."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.recipe = create_recipe_with_image(self.user, jpeg((800, 400)))
+        self.name = self.recipe.image.name
+
+    def tearDown(self):
+        shutil.rmtree(
+            images.image_storage().path(renditions.RENDITIONS_DIR),
+            ignore_errors=True,
+        )
+        self.recipe.image.delete(save=False)
+
+    def get_image(self, url):
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return Image.open(io.BytesIO(b"".join(res.streaming_content)))
+
+    def test_renditions_generated(self):
+        """Test renditions are generated in their configured sizes."""
+        expected = {
+            "thumbnail": (200, 200),
+            "card": (640, 400),
+            "full": (800, 400),
+        }
+        for rendition, size in expected.items():
+            res = self.client.get(rendition_url(rendition, self.name))
+
+            self.assertEqual(res["Content-Type"], "image/jpeg")
+            self.assertIn("immutable", res["Cache-Control"])
+            image = Image.open(io.BytesIO(b"".join(res.streaming_content)))
+            self.assertEqual(image.size, size)
+            self.assertTrue(
+                images.image_storage().exists(
+                    renditions.rendition_name(self.name, rendition)
+                )
+            )
+
+    def test_rendition_generated_once(self):
+        """Test concurrent requests for a rendition generate it once."""
+        generate = renditions._generate
+        calls = []
+
+        def slow_generate(*args):
+            calls.append(args)
+            time.sleep(0.05)
+            generate(*args)
+
+        with patch("recipe.renditions._generate", side_effect=slow_generate):
+            threads = [
+                threading.Thread(
+                    target=renditions.get_rendition,
+                    args=(self.name, "thumbnail"),
+                )
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.client.get(rendition_url("thumbnail", self.name))
+
+        self.assertEqual(len(calls), 1)
+
+    def test_unknown_rendition_not_found(self):
+        """Test requesting an unknown rendition returns 404."""
+        res = self.client.get(rendition_url("huge", self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_missing_image_not_found(self):
+        """Test requesting a rendition of a missing image returns 404."""
+        res = self.client.get(
+            rendition_url("thumbnail", "uploads/recipe/missing.jpg")
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_detail_exposes_renditions(self):
+        """Test the recipe detail links every rendition."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.get(
+            reverse("recipe:recipe-detail", args=[self.recipe.id])
+        )
+
+        urls = res.data["image_renditions"]
+        self.assertEqual(set(urls), {"thumbnail", "card", "full"})
+        self.assertTrue(
+            urls["card"].endswith(
+                f"/static/media/renditions/card/{self.name}"
+            )
+        )
+        image = self.get_image(urls["card"])
+        self.assertEqual(image.size, (640, 400))
@@ -0,0 +1,280 @@
+"""
+Tests for importing recipe archives.
+"""
+import gzip
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase
+
+from core.models import Ingredient, Recipe, Tag
+from core.tests.utils import QueryBudgetMixin
+from recipe.imports import FileCheckpoint, RecipeImporter
+
+
+def archive(*items):
+    """Return an NDJSON archive of `items`, strings taken as lines."""
+
+    return b"".join(
+        (item if isinstance(item, str) else json.dumps(item)).encode() + b"\n"
+        for item in items
+    )
+
+
+def recipe_item(title, tags=(), ingredients=()):
+    return {
+        "title": title,
+        "time_minutes": 10,
+        "price": "4.50",
+        "description": f"{title} description",
+        "tags": [{"name": name} for name in tags],
+        "ingredients": [{"name": name} for name in ingredients],
+    }
+
+
+class Unseekable(io.BytesIO):
+    """Stream that can only be read forward, like a request body."""
+
+    def seekable(self):
+        return False
+
+
+class RecipeImporterTests(QueryBudgetMixin, TestCase):
+    """Test importing recipes from NDJSON."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="import@example.com", password="testpass123"
+        )
+
+    def test_import(self):
+        """Test valid lines are imported with their tags and ingredients."""
+        Tag.objects.create(user=self.user, name="Vegan")
+
+        result = RecipeImporter(self.user).run(
+            io.BytesIO(
+                archive(
+                    recipe_item("Soup", ["Vegan", "Quick"], ["Leek"]),
+                    recipe_item("Stew", ["Quick"], ["Leek", "Bean"]),
+                )
+            )
+        )
+
+        self.assertEqual(
+            result, {"line": 2, "imported": 2, "failed": 0, "errors": []}
+        )
+        soup = Recipe.objects.get(user=self.user, title="Soup")
+        self.assertEqual(soup.price, Decimal("4.50"))
+        self.assertEqual(soup.description, "Soup description")
+        self.assertEqual(
+            sorted(soup.tags.values_list("name", flat=True)),
+            ["Quick", "Vegan"],
+        )
+        # Names are resolved to the existing rows, created once otherwise.
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 2)
+
+    def test_invalid_lines(self):
+        """Test invalid lines are skipped and reported by line."""
+        result = RecipeImporter(self.user).run(
+            io.BytesIO(
+                archive(
+                    recipe_item("Soup"),
+                    "{not json",
+                    "",
+                    {**recipe_item("Stew"), "time_minutes": "long"},
+                    recipe_item("Salad"),
+                )
+            )
+        )
+
+        self.assertEqual(result["line"], 5)
+        self.assertEqual(result["imported"], 2)
+        self.assertEqual(result["failed"], 2)
+        self.assertEqual(
+            [error["line"] for error in result["errors"]], [2, 4]
+        )
+        self.assertIn("non_field_errors", result["errors"][0]["errors"])
+        self.assertIn("time_minutes", result["errors"][1]["errors"])
+        self.assertEqual(
+            sorted(Recipe.objects.values_list("title", flat=True)),
+            ["Salad", "Soup"],
+        )
+
+    def test_errors_capped(self):
+        """Test only the first errors are reported, all are counted."""
+        with patch("recipe.imports.MAX_ERRORS", 2):
+            result = RecipeImporter(self.user).run(
+                io.BytesIO(archive(*["[]"] * 5))
+            )
+
+        self.assertEqual(result["failed"], 5)
+        self.assertEqual(len(result["errors"]), 2)
+
+    def test_batches(self):
+        """Test recipes are written in batches, names looked up once."""
+        items = [
+            recipe_item(f"Recipe {i}", ["Quick"], ["Leek"]) for i in range(6)
+        ]
+        saved = []
+        checkpoint = Mock(**{"load.return_value": None})
+        checkpoint.save.side_effect = lambda state: saved.append(
+            state["imported"]
+        )
+
+        # Names are looked up and created in the first batch only, the
+        # recipes inserted one by one where bulk inserts return no keys.
+        with self.assertMaxQueries(24):
+            RecipeImporter(self.user, batch_size=2, checkpoint=checkpoint).run(
+                io.BytesIO(archive(*items))
+            )
+
+        self.assertEqual(saved, [2, 4, 6, 6])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 6)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_resume(self):
+        """Test an import resumes after the last saved batch."""
+        data = archive(*[recipe_item(f"Recipe {i}") for i in range(5)])
+        saved = {
+            "line": 2,
+            "offset": len(b"".join(data.splitlines(True)[:2])),
+            "imported": 2,
+            "failed": 0,
+        }
+
+        for stream in [io.BytesIO(data), Unseekable(data)]:
+            with self.subTest(seekable=stream.seekable()):
+                Recipe.objects.all().delete()
+                with tempfile.TemporaryDirectory() as tmp:
+                    checkpoint = FileCheckpoint(os.path.join(tmp, "import"))
+                    checkpoint.save(saved)
+
+                    result = RecipeImporter(
+                        self.user, checkpoint=checkpoint
+                    ).run(stream)
+
+                    self.assertEqual(checkpoint.load()["line"], 5)
+                self.assertEqual(result["imported"], 5)
+                self.assertEqual(
+                    sorted(Recipe.objects.values_list("title", flat=True)),
+                    ["Recipe 2", "Recipe 3", "Recipe 4"],
+                )
+
+    def test_cache_invalidated(self):
+        """Test cached responses of the user are invalidated per batch."""
+        with patch("recipe.serializers.bump_version") as bump_version:
+            RecipeImporter(self.user, batch_size=1).run(
+                io.BytesIO(archive(recipe_item("Soup"), recipe_item("Stew")))
+            )
+
+        self.assertEqual(
+            [call.args for call in bump_version.call_args_list],
+            [(self.user.id,)] * 2,
+        )
+
+
+class RecipeImporterTransactionTests(TransactionTestCase):
+    """Test imports committing their batches for real."""
+
+    def test_name_deleted(self):
+        """Test names deleted during an import are looked up again."""
+        user = get_user_model().objects.create_user(
+            email="import@example.com", password="testpass123"
+        )
+
+        def delete_tags(state):
+            if state["imported"] == 1:
+                Tag.objects.filter(user=user).delete()
+
+        # The tag is deleted once the first batch is written.
+        checkpoint = Mock(**{"load.return_value": None})
+        checkpoint.save.side_effect = delete_tags
+
+        result = RecipeImporter(
+            user, batch_size=1, checkpoint=checkpoint
+        ).run(
+            io.BytesIO(
+                archive(
+                    recipe_item("Soup", ["Quick"]),
+                    recipe_item("Stew", ["Quick"]),
+                )
+            )
+        )
+
+        self.assertEqual(result["imported"], 2)
+        stew = Recipe.objects.get(user=user, title="Stew")
+        self.assertEqual(
+            list(stew.tags.values_list("name", flat=True)), ["Quick"]
+        )
+
+
+class ImportRecipesCommandTests(TestCase):
+    """Test the import_recipes command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="import@example.com", password="testpass123"
+        )
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with (gzip.open if name.endswith(".gz") else open)(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_import(self):
+        """Test plain and compressed archives are imported."""
+        for name in ["recipes.ndjson", "recipes.ndjson.gz"]:
+            path = self.write(name, archive(recipe_item("Soup"), "[]"))
+            out, err = io.StringIO(), io.StringIO()
+
+            call_command(
+                "import_recipes",
+                path,
+                "--user=import@example.com",
+                stdout=out,
+                stderr=err,
+            )
+
+            self.assertIn(
+                "Imported 1 recipes from 2 lines, 1 failed.", out.getvalue()
+            )
+            self.assertIn("Line 2:", err.getvalue())
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_checkpoint(self):
+        """Test an import with a checkpoint is not repeated."""
+        path = self.write("recipes.ndjson", archive(recipe_item("Soup")))
+        checkpoint = os.path.join(self.tmp.name, "checkpoint.json")
+
+        for _ in range(2):
+            call_command(
+                "import_recipes",
+                path,
+                "--user=import@example.com",
+                f"--checkpoint={checkpoint}",
+                stdout=io.StringIO(),
+            )
+
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_invalid(self):
+        """Test unknown users, archives and batch sizes are rejected."""
+        path = self.write("recipes.ndjson", b"")
+        for args, message in [
+            ([path, "--user=nobody@example.com"], "No user"),
+            (["missing.ndjson", "--user=import@example.com"], "No such"),
+            ([path, "--user=import@example.com", "--batch-size=0"], "posit"),
+        ]:
+            with self.subTest(args=args):
+                with self.assertRaisesMessage(CommandError, message):
+                    call_command("import_recipes", *args)
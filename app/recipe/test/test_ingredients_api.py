@@ -16,6 +16,7 @@ from recipe.serializers import IngredientSerializer
 
 
 INGREDIENTS_URL = reverse("recipe:ingredient-list")
+AUTOCOMPLETE_URL = reverse("recipe:ingredient-autocomplete")
 
 
 def get_detail_url(ingredient_id):
@@ -151,3 +152,14 @@ class AuthenticatedAPITests(TestCase):
         res = self.client.get(INGREDIENTS_URL, {"assigned_only": 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_autocomplete_ingredients(self):
+        """Test autocompleting ingredient names."""
+
+        create_ingredient("Garlic", user=self.user)
+        create_ingredient("Ginger", user=self.user)
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "garl"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([i["name"] for i in res.data], ["Garlic"])
@@ -3,23 +3,46 @@ Tests for recipe APIs.
 """
 
 from decimal import Decimal
+import csv
+import gzip
+import io
+import json
 import tempfile
 import os
+from unittest.mock import patch
 
 from PIL import Image
 
+from unittest import skipUnless
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.db.models import Prefetch
+from django.test import TestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
 from core.models import Recipe, Tag, Ingredient
-from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from core.storage import ContentAddressedStorage
+from core.tests.utils import QueryBudgetMixin
+from recipe.imports import RecipeImporter
+from recipe.serializers import (
+    RecipeDetailSerializer,
+    RecipeRowSerializer,
+    RecipeSerializer,
+)
+from recipe.views import RecipeViewSet
 
 
 RECIPES_URL = reverse("recipe:recipe-list")
+BULK_URL = reverse("recipe:recipe-bulk")
+EXPORT_URL = reverse("recipe:recipe-export")
+IMPORT_URL = reverse("recipe:recipe-import-recipes")
 
 
 def detail_url(recipe_id):
@@ -52,6 +75,25 @@ def create_user(**kwargs):
     return get_user_model().objects.create_user(**kwargs)
 
 
+def create_full_recipe(user, tags=2, ingredients=2):
+    """Create and return a recipe with its own tags and ingredients."""
+
+    recipe = create_recipe(user=user)
+    recipe.tags.add(
+        *[
+            Tag.objects.create(user=user, name=f"Tag {recipe.id}-{i}")
+            for i in range(tags)
+        ]
+    )
+    recipe.ingredients.add(
+        *[
+            Ingredient.objects.create(user=user, name=f"Ing {recipe.id}-{i}")
+            for i in range(ingredients)
+        ]
+    )
+    return recipe
+
+
 class PublicRecipeAPITests(TestCase):
     """Test unauthenticated API requests."""
 
@@ -471,6 +513,505 @@ class PrivateRecipeAPITests(TestCase):
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
 
+    def test_filter_no_duplicates(self):
+        """Test recipes matching several filters are listed once."""
+
+        recipe = create_full_recipe(user=self.user)
+        tag_ids = ",".join(str(t.id) for t in recipe.tags.all())
+        ing_ids = ",".join(str(i.id) for i in recipe.ingredients.all())
+
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(
+                RECIPES_URL, {"tags": tag_ids, "ingredients": ing_ids}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in res.data], [recipe.id])
+        self.assertNotIn("DISTINCT", context.captured_queries[0]["sql"])
+
+    def test_filter_match_all(self):
+        """Test filtering recipes carrying every requested tag."""
+
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="Quick")
+        ing = Ingredient.objects.create(user=self.user, name="Tofu")
+        r1 = create_recipe(user=self.user, title="Both tags")
+        r2 = create_recipe(user=self.user, title="One tag")
+        r3 = create_recipe(user=self.user, title="Both tags, no tofu")
+        r1.tags.add(tag1, tag2)
+        r1.ingredients.add(ing)
+        r2.tags.add(tag1)
+        r2.ingredients.add(ing)
+        r3.tags.add(tag1, tag2)
+
+        params = {"tags": f"{tag1.id},{tag2.id},{tag1.id}", "match": "all"}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in res.data], [r3.id, r1.id])
+
+        params["ingredients"] = str(ing.id)
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual([r["id"] for r in res.data], [r1.id])
+
+    def test_filter_invalid_params(self):
+        """Test malformed or oversized filters are rejected up front."""
+
+        cases = [
+            {"tags": "1,two"},
+            {"tags": "1,,2"},
+            {"ingredients": "-1"},
+            {"ingredients": "9" * 40},
+            {"tags": ",".join(str(i) for i in range(1, 200))},
+            {"tags": "1", "match": "some"},
+        ]
+
+        for params in cases:
+            with self.subTest(params=params):
+                res = self.client.get(RECIPES_URL, params)
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_recipes(self):
+        """Test searching recipes by title and description."""
+
+        r1 = create_recipe(user=self.user, title="Lemon tart")
+        r2 = create_recipe(
+            user=self.user,
+            title="Fish",
+            description="Baked with lemon zest",
+        )
+        create_recipe(user=self.user, title="Chocolate cake")
+        other = create_user(email="other@example.com", password="pass123")
+        create_recipe(user=other, title="Lemon pie")
+
+        res = self.client.get(RECIPES_URL, {"search": "lemon"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertCountEqual([r["id"] for r in res.data], [r1.id, r2.id])
+
+    @skipUnless(connection.vendor == "postgresql", "Requires PostgreSQL.")
+    def test_search_ranked_by_relevance(self):
+        """Test title matches rank above description matches."""
+
+        in_title = create_recipe(
+            user=self.user, title="Lemon tart", description="Sweet"
+        )
+        in_description = create_recipe(
+            user=self.user, title="Fish", description="Served with lemons"
+        )
+        in_title.title = "Lemon and lemon tart"
+        in_title.save()
+
+        res = self.client.get(RECIPES_URL, {"search": "lemon"})
+
+        self.assertEqual(
+            [r["id"] for r in res.data], [in_title.id, in_description.id]
+        )
+
+        res = self.client.get(RECIPES_URL, {"search": "lemon", "page_size": 1})
+        ids = [r["id"] for r in res.data["results"]]
+        res = self.client.get(res.data["next"])
+        ids.extend(r["id"] for r in res.data["results"])
+
+        self.assertEqual(ids, [in_title.id, in_description.id])
+
+    def test_list_paginated_with_cursor(self):
+        """Test walking the recipe list page by page with cursors."""
+
+        recipes = [
+            create_recipe(user=self.user, title=f"Recipe {i}")
+            for i in range(5)
+        ]
+        expected = [r.id for r in reversed(recipes)]
+
+        res = self.client.get(RECIPES_URL, {"page_size": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data["previous"])
+        ids = [r["id"] for r in res.data["results"]]
+
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids.extend(r["id"] for r in res.data["results"])
+
+        self.assertEqual(ids, expected)
+        self.assertIsNotNone(res.data["previous"])
+
+        res = self.client.get(res.data["previous"])
+        self.assertEqual(
+            [r["id"] for r in res.data["results"]],
+            expected[2:4],
+        )
+
+    @patch("recipe.pagination.KeysetPagination.max_page_size", 2)
+    def test_list_page_size_capped(self):
+        """Test the requested page size is capped."""
+
+        for _ in range(3):
+            create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, {"page_size": 100})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertIsNotNone(res.data["next"])
+
+    def test_invalid_cursor_error(self):
+        """Test an invalid cursor is rejected."""
+
+        res = self.client.get(RECIPES_URL, {"cursor": "not-a-cursor"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BulkRecipeAPITests(QueryBudgetMixin, TestCase):
+    """Test the bulk recipe endpoint."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="bulk@example.com",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+
+    def _items(self, count):
+        """Return `count` recipe payloads sharing tags and ingredients."""
+
+        return [
+            {
+                "title": f"Bulk {i}",
+                "time_minutes": 10 + i,
+                "price": "4.50",
+                "tags": [{"name": "Shared"}, {"name": f"Tag {i}"}],
+                "ingredients": [{"name": "Salt"}],
+            }
+            for i in range(count)
+        ]
+
+    def test_bulk_create(self):
+        """Test creating many recipes with their tags and ingredients."""
+
+        Tag.objects.create(user=self.user, name="Shared")
+
+        res = self.client.post(BULK_URL, self._items(3), format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [r["title"] for r in res.data],
+            ["Bulk 0", "Bulk 1", "Bulk 2"],
+        )
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 3)
+        self.assertEqual(Tag.objects.filter(name="Shared").count(), 1)
+        self.assertEqual(Ingredient.objects.filter(name="Salt").count(), 1)
+        for recipe in recipes:
+            self.assertEqual(recipe.tags.count(), 2)
+            self.assertEqual(recipe.ingredients.count(), 1)
+
+    def test_bulk_create_errors_per_item(self):
+        """Test invalid items are reported by position and nothing is saved."""
+
+        items = self._items(3)
+        del items[1]["title"]
+
+        res = self.client.post(BULK_URL, items, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn("title", res.data[1])
+        self.assertEqual(res.data[2], {})
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(Tag.objects.exists())
+
+    def test_bulk_requires_list(self):
+        """Test the bulk endpoint rejects a single object."""
+
+        res = self.client.post(BULK_URL, self._items(1)[0], format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch("recipe.views.RecipeViewSet.bulk_max_items", 2)
+    def test_bulk_max_items(self):
+        """Test the number of items in one request is capped."""
+
+        res = self.client.post(BULK_URL, self._items(3), format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    @skipUnlessDBFeature("can_return_rows_from_bulk_insert")
+    def test_bulk_create_queries_constant(self):
+        """Test bulk creation costs the same for any number of items."""
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(BULK_URL, self._items(2), format="json")
+
+        with self.assertMaxQueries(len(small)):
+            res = self.client.post(BULK_URL, self._items(20), format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_bulk_update(self):
+        """Test partially updating many recipes."""
+
+        r1 = create_full_recipe(user=self.user)
+        r2 = create_full_recipe(user=self.user)
+        items = [
+            {"id": r1.id, "title": "New title", "tags": [{"name": "Fresh"}]},
+            {"id": r2.id, "price": "1.25"},
+        ]
+
+        res = self.client.patch(BULK_URL, items, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        r1.refresh_from_db()
+        r2.refresh_from_db()
+        self.assertEqual(r1.title, "New title")
+        self.assertEqual([t.name for t in r1.tags.all()], ["Fresh"])
+        self.assertEqual(r1.ingredients.count(), 2)
+        self.assertEqual(r2.price, Decimal("1.25"))
+        self.assertEqual(r2.tags.count(), 2)
+        self.assertEqual(res.data[0]["tags"][0]["name"], "Fresh")
+
+    def test_bulk_update_other_user_recipe(self):
+        """Test bulk updates cannot touch other users' recipes."""
+
+        other = create_user(email="other@example.com", password="pass123")
+        mine = create_recipe(user=self.user)
+        theirs = create_recipe(user=other, title="Theirs")
+        items = [
+            {"id": mine.id, "title": "Mine"},
+            {"id": theirs.id, "title": "Stolen"},
+            {"title": "No id"},
+        ]
+
+        res = self.client.patch(BULK_URL, items, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn("id", res.data[1])
+        self.assertIn("id", res.data[2])
+        theirs.refresh_from_db()
+        mine.refresh_from_db()
+        self.assertEqual(theirs.title, "Theirs")
+        self.assertEqual(mine.title, "Test Recipe")
+
+    def test_bulk_update_ids_out_of_range(self):
+        """Test ids no key can have are reported per item."""
+
+        recipe = create_recipe(user=self.user)
+        items = [
+            {"id": recipe.id, "title": "Mine"},
+            {"id": 10**20, "title": "Huge"},
+            {"id": -1, "title": "Negative"},
+            {"id": 0, "title": "Zero"},
+        ]
+
+        res = self.client.patch(BULK_URL, items, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        for error in res.data[1:]:
+            self.assertEqual(error["id"], ["Not found."])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, "Test Recipe")
+
+    def test_bulk_update_items_not_objects(self):
+        """Test items which are not objects are reported per item."""
+
+        recipe = create_recipe(user=self.user)
+        items = [{"id": recipe.id, "title": "Mine"}, None, 5]
+
+        res = self.client.patch(BULK_URL, items, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        for error in res.data[1:]:
+            self.assertEqual(list(error), ["non_field_errors"])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, "Test Recipe")
+
+
+@override_settings(CACHE_SHARED=True)
+class RecipeResponseCacheTests(QueryBudgetMixin, TestCase):
+    """Test caching of recipe responses."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="cache@example.com",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        """Test repeating a list request runs no queries."""
+
+        create_full_recipe(user=self.user)
+        first = self.client.get(RECIPES_URL)
+
+        with self.assertMaxQueries(0):
+            second = self.client.get(RECIPES_URL)
+
+        self.assertEqual(first.data, second.data)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_process_local_cache_unused(self):
+        """Test nothing is cached where other workers miss invalidations."""
+
+        recipe = create_full_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        # Changed without an invalidation this worker sees, as by another.
+        Recipe.objects.filter(id=recipe.id).update(title="Changed")
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn("ETag", res)
+        self.assertEqual(res.data[0]["title"], "Changed")
+
+    def test_cache_keyed_by_query_params(self):
+        """Test different filters are cached separately."""
+
+        r1 = create_full_recipe(user=self.user)
+        create_full_recipe(user=self.user)
+        tag = r1.tags.first()
+
+        self.client.get(RECIPES_URL)
+        res = self.client.get(RECIPES_URL, {"tags": tag.id})
+
+        self.assertEqual([r["id"] for r in res.data], [r1.id])
+
+    def test_write_invalidates_cache(self):
+        """Test creating and updating recipes is visible right away."""
+
+        recipe = create_full_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        self.client.get(detail_url(recipe.id))
+
+        self.client.post(
+            RECIPES_URL,
+            {"title": "New", "time_minutes": 5, "price": "1.00"},
+        )
+        self.client.patch(detail_url(recipe.id), {"title": "Changed"})
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data), 2)
+        res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(res.data["title"], "Changed")
+
+    def test_related_changes_invalidate_cache(self):
+        """Test renaming or unlinking tags is visible in recipes."""
+
+        recipe = create_full_recipe(user=self.user)
+        tag = recipe.tags.first()
+        self.client.get(detail_url(recipe.id))
+
+        tag.name = "Renamed"
+        tag.save()
+        res = self.client.get(detail_url(recipe.id))
+        self.assertIn("Renamed", [t["name"] for t in res.data["tags"]])
+
+        recipe.tags.remove(tag)
+        res = self.client.get(detail_url(recipe.id))
+        self.assertNotIn("Renamed", [t["name"] for t in res.data["tags"]])
+
+        recipe.ingredients.clear()
+        res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(res.data["ingredients"], [])
+
+    def test_bulk_create_invalidates_cache(self):
+        """Test bulk created recipes are visible right away."""
+
+        self.client.get(RECIPES_URL)
+        items = [{"title": "Bulk", "time_minutes": 1, "price": "1.00"}]
+
+        self.client.post(BULK_URL, items, format="json")
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data), 1)
+
+    def test_cache_limited_to_user(self):
+        """Test cached responses are not shared between users."""
+
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        other = create_user(email="other@example.com", password="pass123")
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data, [])
+
+
+@override_settings(CACHE_SHARED=True)
+class ConditionalGetTests(QueryBudgetMixin, TestCase):
+    """Test ETag based conditional requests on recipes."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="etag@example.com",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_not_modified(self):
+        """Test a matching If-None-Match gets a 304 without queries."""
+
+        create_full_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        etag = res["ETag"]
+
+        with self.assertMaxQueries(0):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+        self.assertEqual(res.content, b"")
+
+    def test_etag_changes_on_write(self):
+        """Test the ETag changes once the user's data changes."""
+
+        recipe = create_full_recipe(user=self.user)
+        etag = self.client.get(detail_url(recipe.id))["ETag"]
+
+        self.client.patch(detail_url(recipe.id), {"title": "Changed"})
+        res = self.client.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+        self.assertEqual(res.data["title"], "Changed")
+
+    def test_etag_depends_on_request(self):
+        """Test ETags differ between URLs and between users."""
+
+        create_recipe(user=self.user)
+        list_etag = self.client.get(RECIPES_URL)["ETag"]
+        filtered_etag = self.client.get(RECIPES_URL, {"tags": "1"})["ETag"]
+        other = create_user(email="other@example.com", password="pass123")
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=list_etag)
+
+        self.assertNotEqual(list_etag, filtered_etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
+
+    def test_no_etag_on_writes(self):
+        """Test write responses carry no ETag."""
+
+        res = self.client.post(
+            RECIPES_URL,
+            {"title": "New", "time_minutes": 5, "price": "1.00"},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("ETag", res)
+
 
 class ImageUploadTests(TestCase):
     """Tests for the Image upload API."""
@@ -504,10 +1045,96 @@ class ImageUploadTests(TestCase):
             res = self.client.post(url, payload, format="multipart")
 
         self.recipe.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn("image", res.data)
+        self.assertEqual(res.data["image_status"], "pending")
+        self.assertEqual(self.recipe.image_status, "pending")
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    def upload(self, image, name="image.jpg", recipe=None):
+        """Upload `image`, an image or raw bytes, as the recipe image."""
+
+        if not isinstance(image, bytes):
+            buffer = io.BytesIO()
+            image.save(buffer, format=image.format or "JPEG")
+            image = buffer.getvalue()
+
+        return self.client.post(
+            image_upload_url((recipe or self.recipe).id),
+            {"image": SimpleUploadedFile(name, image)},
+            format="multipart",
+        )
+
+    @override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=2048)
+    def test_upload_too_large_rejected(self):
+        """Test uploads larger than the limit are rejected with 413."""
+        for size in (3000, 2 ** 20):
+            res = self.upload(b"\xff" * size)
+
+            self.assertEqual(
+                res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=1000)
+    def test_upload_too_many_pixels_not_decoded(self):
+        """Test oversized images are rejected before being decoded."""
+        with patch("PIL.ImageFile.ImageFile.load") as load:
+            res = self.upload(Image.new("RGB", (40, 40)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", res.data)
+        load.assert_not_called()
+
+    @override_settings(RECIPE_IMAGE_MAX_DIMENSION=30)
+    def test_upload_too_wide_rejected(self):
+        """Test images wider than the limit are rejected."""
+        res = self.upload(Image.new("RGB", (31, 1)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_unsupported_format_rejected(self):
+        """Test images in formats not accepted are rejected."""
+        image = Image.new("RGB", (10, 10))
+        image.format = "BMP"
+
+        res = self.upload(image, name="image.bmp")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_not_an_image_rejected(self):
+        """Test files that are not images are rejected."""
+        res = self.upload(b"astringinsteadofimage")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_stored_with_format_extension(self):
+        """Test images are stored under the extension of their format."""
+        image = Image.new("RGB", (10, 10))
+        image.format = "PNG"
+
+        res = self.upload(image, name="image.jpg")
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.endswith(".png"))
+
+    def test_upload_same_image_stored_once(self):
+        """Test content addressed storage shares identical uploads."""
+        other = create_recipe(user=self.user)
+        image = Image.new("RGB", (10, 10))
+        field = Recipe._meta.get_field("image")
+
+        with patch.object(field, "storage", ContentAddressedStorage()):
+            self.upload(image)
+            self.upload(image, name="copy.jpg", recipe=other)
+
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, other.image.name)
+        self.assertIn("/sha256/", self.recipe.image.name)
+
     def upload_image_bad_request(self):
         """Test uploading invalid image."""
 
@@ -516,3 +1143,612 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, payload, format="multipart")
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(RECIPE_CACHE_TIMEOUT=0)
+class RecipeQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test the recipe endpoints run a constant number of queries."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="budget@example.com",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+
+    def _grow(self, count=3):
+        """Add more recipes with tags and ingredients."""
+
+        def grow():
+            for _ in range(count):
+                create_full_recipe(user=self.user)
+
+        return grow
+
+    def test_list_queries_constant(self):
+        """Test listing recipes does not query per recipe."""
+
+        create_full_recipe(user=self.user)
+
+        self.assertQueriesConstant(
+            lambda: self.client.get(RECIPES_URL),
+            self._grow(),
+        )
+
+        with self.assertMaxQueries(3):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data), 4)
+        self.assertEqual(len(res.data[0]["tags"]), 2)
+
+    def test_paginated_list_queries_constant(self):
+        """Test a page of recipes does not query per recipe."""
+
+        create_full_recipe(user=self.user)
+
+        self.assertQueriesConstant(
+            lambda: self.client.get(RECIPES_URL, {"page_size": 10}),
+            self._grow(),
+        )
+
+    def test_filtered_list_queries_constant(self):
+        """Test filtering recipes does not query per recipe."""
+
+        tag = Tag.objects.create(user=self.user, name="Shared")
+
+        def grow():
+            for _ in range(3):
+                create_full_recipe(user=self.user).tags.add(tag)
+
+        grow()
+        self.assertQueriesConstant(
+            lambda: self.client.get(RECIPES_URL, {"tags": str(tag.id)}),
+            grow,
+        )
+
+    def test_detail_queries_constant(self):
+        """Test the recipe detail does not query per tag or ingredient."""
+
+        recipe = create_full_recipe(user=self.user)
+
+        def grow():
+            for i in range(3):
+                recipe.tags.create(user=self.user, name=f"Extra {i}")
+                recipe.ingredients.create(user=self.user, name=f"Extra {i}")
+
+        self.assertQueriesConstant(
+            lambda: self.client.get(detail_url(recipe.id)),
+            grow,
+        )
+
+        with self.assertMaxQueries(3):
+            self.client.get(detail_url(recipe.id))
+
+    def test_upload_image_skips_prefetch(self):
+        """Test uploading an image does not load tags or ingredients."""
+
+        recipe = create_full_recipe(user=self.user)
+        url = image_upload_url(recipe.id)
+
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_f:
+            Image.new("RGB", (10, 10)).save(image_f, format="JPEG")
+            image_f.seek(0)
+
+            with self.assertMaxQueries(2) as context:
+                res = self.client.post(
+                    url, {"image": image_f}, format="multipart"
+                )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(
+            any("core_tag" in q["sql"] for q in context.captured_queries)
+        )
+        recipe.refresh_from_db()
+        recipe.image.delete()
+
+    def _payload(self, size):
+        """Return a recipe payload with `size` tags and ingredients."""
+
+        return {
+            "title": f"Recipe with {size}",
+            "time_minutes": 30,
+            "price": Decimal("5.99"),
+            "tags": [{"name": f"Tag {i}"} for i in range(size)],
+            "ingredients": [{"name": f"Ing {i}"} for i in range(size)],
+        }
+
+    def test_create_queries_constant(self):
+        """Test creating a recipe costs the same for any number of tags."""
+
+        Tag.objects.create(user=self.user, name="Tag 0")
+
+        with CaptureQueriesContext(connection) as small:
+            res = self.client.post(
+                RECIPES_URL, self._payload(2), format="json"
+            )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        with self.assertMaxQueries(len(small)):
+            res = self.client.post(
+                RECIPES_URL, self._payload(30), format="json"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data["id"])
+        self.assertEqual(recipe.tags.count(), 30)
+        self.assertEqual(recipe.ingredients.count(), 30)
+        self.assertEqual(Tag.objects.filter(name="Tag 0").count(), 1)
+
+    def test_update_queries_constant(self):
+        """Test updating a recipe costs the same for any number of tags."""
+
+        recipe = create_full_recipe(user=self.user)
+        url = detail_url(recipe.id)
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.patch(url, self._payload(2), format="json")
+
+        with self.assertMaxQueries(len(small)):
+            res = self.client.patch(url, self._payload(30), format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["tags"]), 30)
+        self.assertEqual(recipe.ingredients.count(), 30)
+
+    def test_duplicate_names_linked_once(self):
+        """Test repeated tag names in a payload create a single tag."""
+
+        payload = self._payload(0)
+        payload["tags"] = [{"name": "Dup"}, {"name": "Dup"}]
+
+        res = self.client.post(RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data["tags"]), 1)
+        self.assertEqual(Tag.objects.filter(name="Dup").count(), 1)
+
+
+class RecipeRowSerializerTests(TestCase):
+    """Test the row based list output matches RecipeSerializer."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="rows@example.com",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+
+        shared = Tag.objects.create(user=self.user, name="Shared")
+        prices = ["0.50", "5", "999.99", "12.30"]
+        for i, price in enumerate(prices):
+            recipe = create_full_recipe(user=self.user, tags=i, ingredients=i)
+            recipe.title = f"Crème brûlée {i} \u2028"
+            recipe.price = Decimal(price)
+            recipe.link = "" if i % 2 else recipe.link
+            recipe.save()
+            if i % 2:
+                recipe.tags.add(shared)
+
+    def expected(self):
+        """Serialize the recipes with RecipeSerializer, related by id."""
+
+        recipes = Recipe.objects.order_by("-id").prefetch_related(
+            Prefetch("tags", queryset=Tag.objects.order_by("id")),
+            Prefetch(
+                "ingredients", queryset=Ingredient.objects.order_by("id")
+            ),
+        )
+        return RecipeSerializer(recipes, many=True).data
+
+    def test_fields_match(self):
+        """Test every field of every recipe is represented identically."""
+
+        serializer = RecipeRowSerializer(
+            Recipe.objects.order_by("-id").values(
+                *RecipeRowSerializer().value_fields
+            ),
+            many=True,
+        )
+        expected = self.expected()
+        render = JSONRenderer().render
+
+        self.assertEqual(len(serializer.data), len(expected))
+        for row, recipe in zip(serializer.data, expected):
+            self.assertEqual(list(row), list(recipe))
+            for field, value in recipe.items():
+                with self.subTest(id=recipe["id"], field=field):
+                    self.assertEqual(type(row[field]), type(value))
+                    self.assertEqual(render(row[field]), render(value))
+
+    def test_list_rendered_identically(self):
+        """Test the list endpoint renders the bytes RecipeSerializer does."""
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.content, JSONRenderer().render(self.expected()))
+
+    def test_paginated_list(self):
+        """Test pages hold the same recipes as the serializer output."""
+
+        res = self.client.get(RECIPES_URL, {"page_size": 3})
+        results = res.data["results"]
+        res = self.client.get(res.data["next"])
+        results.extend(res.data["results"])
+
+        self.assertEqual(results, self.expected())
+
+
+class SparseFieldsTests(QueryBudgetMixin, TestCase):
+    """Test trimming recipe responses with the fields parameter."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="sparse@example.com",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_full_recipe(user=self.user)
+
+    def test_list_fields(self):
+        """Test the list holds the requested fields in serializer order."""
+
+        with self.assertMaxQueries(1) as context:
+            res = self.client.get(RECIPES_URL, {"fields": "title,id"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data, [{"id": self.recipe.id, "title": self.recipe.title}]
+        )
+        sql = context.captured_queries[0]["sql"]
+        self.assertNotIn("price", sql)
+        self.assertNotIn("description", sql)
+
+    def test_list_nested_field(self):
+        """Test related items are only loaded when requested."""
+
+        with self.assertMaxQueries(2) as context:
+            res = self.client.get(RECIPES_URL, {"fields": "tags"})
+
+        self.assertEqual(len(res.data[0]["tags"]), 2)
+        self.assertEqual(list(res.data[0]), ["tags"])
+        self.assertFalse(
+            any("ingredient" in q["sql"] for q in context.captured_queries)
+        )
+
+    def test_paginated_list_fields(self):
+        """Test pages work without the ordering field requested."""
+
+        create_recipe(user=self.user, title="Second")
+
+        res = self.client.get(
+            RECIPES_URL, {"fields": "title", "page_size": 1}
+        )
+        res = self.client.get(res.data["next"])
+
+        self.assertEqual(res.data["results"], [{"title": self.recipe.title}])
+
+    def test_detail_fields(self):
+        """Test the detail only loads the requested columns."""
+
+        with self.assertMaxQueries(1) as context:
+            res = self.client.get(
+                detail_url(self.recipe.id), {"fields": "id,title"}
+            )
+
+        self.assertEqual(
+            res.data, {"id": self.recipe.id, "title": self.recipe.title}
+        )
+        sql = context.captured_queries[0]["sql"]
+        self.assertNotIn("description", sql)
+        self.assertNotIn("price", sql)
+
+    def test_detail_method_field(self):
+        """Test fields computed from other columns load those columns."""
+
+        with self.assertMaxQueries(1):
+            res = self.client.get(
+                detail_url(self.recipe.id), {"fields": "image_renditions"}
+            )
+
+        self.assertEqual(res.data, {"image_renditions": None})
+
+    def test_unknown_fields_rejected(self):
+        """Test unknown fields are rejected."""
+
+        for url, fields in [
+            (RECIPES_URL, "id,description"),
+            (detail_url(self.recipe.id), "id,user"),
+        ]:
+            with self.subTest(url=url):
+                res = self.client.get(url, {"fields": fields})
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn("fields", res.data)
+
+    def test_fields_ignored_on_writes(self):
+        """Test updates still return every field."""
+
+        res = self.client.patch(
+            detail_url(self.recipe.id) + "?fields=id", {"title": "New"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["title"], "New")
+        self.assertIn("tags", res.data)
+
+
+class RecipeExportTests(QueryBudgetMixin, TestCase):
+    """Test streaming exports of recipe libraries."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="export@example.com",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [create_full_recipe(user=self.user) for _ in range(3)]
+        other = create_user(email="other@example.com", password="pass1234")
+        create_full_recipe(user=other)
+
+    def export(self, params=None, **extra):
+        res = self.client.get(EXPORT_URL, params, **extra)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        return res, b"".join(res.streaming_content)
+
+    def test_export_ndjson(self):
+        """Test recipes are exported newest first, one per line."""
+
+        res, content = self.export()
+
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        self.assertIn('filename="recipes.ndjson"', res["Content-Disposition"])
+        items = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [item["id"] for item in items],
+            [recipe.id for recipe in reversed(self.recipes)],
+        )
+        recipe = self.recipes[-1]
+        self.assertEqual(items[0]["description"], recipe.description)
+        self.assertEqual(items[0]["price"], str(recipe.price))
+        self.assertEqual(
+            [tag["name"] for tag in items[0]["tags"]],
+            [tag.name for tag in recipe.tags.order_by("id")],
+        )
+
+    def test_export_csv(self):
+        """Test recipes are exported as CSV rows, with related names."""
+
+        res, content = self.export({"as": "csv", "fields": "id,tags"})
+
+        self.assertEqual(res["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.reader(io.StringIO(content.decode())))
+        self.assertEqual(rows[0], ["id", "tags"])
+        recipe = self.recipes[-1]
+        self.assertEqual(
+            rows[1],
+            [
+                str(recipe.id),
+                "; ".join(tag.name for tag in recipe.tags.order_by("id")),
+            ],
+        )
+        self.assertEqual(len(rows), 4)
+
+    def test_export_empty_csv(self):
+        """Test an empty library exports the header row only."""
+
+        Recipe.objects.filter(user=self.user).delete()
+
+        _, content = self.export({"as": "csv", "fields": "id,title"})
+
+        self.assertEqual(content, b"id,title\r\n")
+
+    def test_export_filtered(self):
+        """Test exports are filtered like the list."""
+
+        tag = self.recipes[0].tags.first()
+
+        _, content = self.export({"tags": str(tag.id)})
+
+        (line,) = content.splitlines()
+        self.assertEqual(json.loads(line)["id"], self.recipes[0].id)
+
+    def test_export_searched(self):
+        """Test exports are limited to the recipes matching a search."""
+
+        Recipe.objects.filter(id=self.recipes[1].id).update(
+            title="Lemon pie"
+        )
+
+        res = self.client.get(RECIPES_URL, {"search": "lemon"})
+        _, content = self.export({"search": "lemon"})
+
+        items = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([item["id"] for item in items], [self.recipes[1].id])
+        self.assertEqual([item["id"] for item in res.json()], [items[0]["id"]])
+
+    def test_export_in_chunks(self):
+        """Test related rows are loaded per chunk of recipes."""
+
+        with patch.object(RecipeViewSet, "export_chunk_size", 2):
+            res = self.client.get(EXPORT_URL)
+            # One query for the recipes, two for each chunk of them.
+            with self.assertMaxQueries(5):
+                content = b"".join(res.streaming_content)
+
+        self.assertEqual(len(content.splitlines()), 3)
+
+    def test_export_gzip(self):
+        """Test the export is compressed for clients accepting gzip."""
+
+        _, plain = self.export()
+        res, content = self.export(HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", res["Vary"])
+        self.assertEqual(gzip.decompress(content), plain)
+
+    def test_export_invalid_params(self):
+        """Test unknown formats and fields are rejected before streaming."""
+
+        for params, field in [
+            ({"as": "xml"}, "as"),
+            ({"fields": "id,user"}, "fields"),
+        ]:
+            with self.subTest(params=params):
+                res = self.client.get(EXPORT_URL, params)
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn(field, res.data)
+
+
+class RecipeImportTests(TestCase):
+    """Test streaming imports of recipe archives."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="import@example.com",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+        self.lines = [
+            json.dumps(
+                {
+                    "title": f"Recipe {i}",
+                    "time_minutes": 10,
+                    "price": "4.50",
+                    "tags": [{"name": "Quick"}],
+                }
+            ).encode()
+            for i in range(3)
+        ]
+
+    def post(self, data, params=""):
+        return self.client.generic(
+            "POST",
+            f"{IMPORT_URL}{params}",
+            data,
+            content_type="application/x-ndjson",
+        )
+
+    def test_import_ndjson(self):
+        """Test an NDJSON request body is imported."""
+
+        res = self.post(b"\n".join([*self.lines, b"{"]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["line"], 4)
+        self.assertEqual(res.data["imported"], 3)
+        self.assertEqual(res.data["failed"], 1)
+        self.assertEqual(res.data["errors"][0]["line"], 4)
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 3)
+        self.assertEqual(Tag.objects.get(user=self.user).recipe_set.count(), 3)
+
+    def test_import_multipart(self):
+        """Test an archive uploaded as a multipart file is imported."""
+
+        archive = SimpleUploadedFile("recipes.ndjson", b"\n".join(self.lines))
+
+        res = self.client.post(
+            IMPORT_URL, {"file": archive}, format="multipart"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["imported"], 3)
+
+    def test_import_resumed(self):
+        """Test an import given an id carries on where it stopped."""
+
+        commit = RecipeImporter._commit
+        commits = []
+
+        def fail_second_batch(importer, batch, state):
+            commits.append(len(batch))
+            if len(commits) == 2:
+                raise DatabaseError
+            commit(importer, batch, state)
+
+        with patch.object(RecipeImporter, "_commit", fail_second_batch):
+            with self.assertRaises(DatabaseError):
+                self.post(
+                    b"\n".join(self.lines), "?import_id=a-1&batch_size=2"
+                )
+        res = self.post(b"\n".join(self.lines), "?import_id=a-1")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["imported"], 3)
+        # The first batch was not imported again.
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 3)
+
+        res = self.post(b"\n".join(self.lines), "?import_id=b-1")
+        self.assertEqual(res.data["imported"], 3)
+
+    def test_import_invalid_params(self):
+        """Test invalid ids, batch sizes and missing files are rejected."""
+
+        for params, field in [
+            ("?import_id=a/b", "import_id"),
+            ("?import_id=" + "a" * 65, "import_id"),
+            ("?batch_size=0", "batch_size"),
+            ("?batch_size=x", "batch_size"),
+            ("?batch_size=5001", "batch_size"),
+        ]:
+            with self.subTest(params=params):
+                res = self.post(self.lines[0], params)
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn(field, res.data)
+
+        res = self.client.post(IMPORT_URL, {}, format="multipart")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("file", res.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    @override_settings(RECIPE_IMPORT_MAX_UPLOAD_SIZE=10)
+    def test_import_too_large(self):
+        """Test archives over the size limit are rejected unread."""
+
+        res = self.post(self.lines[0])
+
+        self.assertEqual(
+            res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_export_round_trip(self):
+        """Test an exported library imports as the same recipes."""
+
+        other = create_user(email="other@example.com", password="pass1234")
+        for _ in range(2):
+            create_full_recipe(user=other)
+        self.client.force_authenticate(other)
+        res = self.client.get(EXPORT_URL)
+        archive = b"".join(res.streaming_content)
+
+        self.client.force_authenticate(self.user)
+        res = self.post(archive)
+
+        self.assertEqual(res.data["imported"], 2)
+        fields = ["title", "description", "time_minutes", "price", "link"]
+        for imported, exported in zip(
+            Recipe.objects.filter(user=self.user).order_by("-id"),
+            Recipe.objects.filter(user=other).order_by("id"),
+        ):
+            self.assertEqual(
+                [getattr(imported, field) for field in fields],
+                [getattr(exported, field) for field in fields],
+            )
+            self.assertEqual(
+                sorted(imported.tags.values_list("name", flat=True)),
+                sorted(exported.tags.values_list("name", flat=True)),
+            )
+            self.assertEqual(
+                sorted(imported.ingredients.values_list("name", flat=True)),
+                sorted(exported.ingredients.values_list("name", flat=True)),
+            )
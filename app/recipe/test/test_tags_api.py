@@ -3,10 +3,12 @@ Tests for the tags API.
 """
 
 from decimal import Decimal
+from unittest import skipUnless
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -17,6 +19,7 @@ from recipe.serializers import TagSerializer
 
 
 TAGS_URL = reverse("recipe:tag-list")
+AUTOCOMPLETE_URL = reverse("recipe:tag-autocomplete")
 
 
 def get_detail_url(tag_id):
@@ -150,3 +153,88 @@ class PrivateTagsAPITests(TestCase):
         res = self.client.get(TAGS_URL, {"assigned_only": 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_list_tags_paginated(self):
+        """Test listing tags page by page ordered by name."""
+
+        for name in ["Apple", "Banana", "Cherry"]:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {"page_size": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [t["name"] for t in res.data["results"]]
+        self.assertEqual(names, ["Cherry", "Banana"])
+
+        res = self.client.get(res.data["next"])
+
+        self.assertEqual([t["name"] for t in res.data["results"]], ["Apple"])
+        self.assertIsNone(res.data["next"])
+
+    def test_autocomplete_prefix(self):
+        """Test autocompleting tag names from a prefix."""
+
+        Tag.objects.create(user=self.user, name="Chicken")
+        Tag.objects.create(user=self.user, name="Chickpea")
+        Tag.objects.create(user=self.user, name="Beef")
+        other = create_user(email="other@example.com")
+        Tag.objects.create(user=other, name="Chick")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "chick"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertCountEqual(
+            [t["name"] for t in res.data], ["Chicken", "Chickpea"]
+        )
+        self.assertEqual(set(res.data[0]), {"id", "name", "similarity"})
+
+    def test_autocomplete_limit(self):
+        """Test autocomplete returns at most `limit` matches."""
+
+        for i in range(5):
+            Tag.objects.create(user=self.user, name=f"Spicy {i}")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "spicy", "limit": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 2)
+
+    def test_autocomplete_invalid_params(self):
+        """Test autocomplete rejects missing terms and bad limits."""
+
+        for params in [{}, {"q": " "}, {"q": "a", "limit": "x"}]:
+            with self.subTest(params=params):
+                res = self.client.get(AUTOCOMPLETE_URL, params)
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(connection.vendor == "postgresql", "Requires PostgreSQL.")
+    def test_autocomplete_fuzzy_ranked(self):
+        """Test misspelt terms match, closest names first."""
+
+        Tag.objects.create(user=self.user, name="Vegetarian")
+        Tag.objects.create(user=self.user, name="Vegan")
+        Tag.objects.create(user=self.user, name="Dessert")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "vegitarian"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]["name"], "Vegetarian")
+        self.assertNotIn("Dessert", [t["name"] for t in res.data])
+        similarities = [t["similarity"] for t in res.data]
+        self.assertEqual(similarities, sorted(similarities, reverse=True))
+
+    @override_settings(CACHE_SHARED=True)
+    def test_list_tags_not_modified(self):
+        """Test polling unchanged tags gets a 304."""
+
+        tag = Tag.objects.create(user=self.user, name="Snack")
+        etag = self.client.get(TAGS_URL)["ETag"]
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        tag.delete()
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
@@ -0,0 +1,129 @@
+"""
+Streaming upload of recipe images and archives.
+
+Uploads are streamed in small chunks to a temporary file and abandoned as
+soon as they grow past the size limit, so an upload never holds more than
+one chunk in memory. Images are then checked from their header alone, see
+`read_image_header`, before anything decodes them. Archives sent as the
+request body are read from the request as they arrive.
+"""
+import os
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+from PIL import Image
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import BaseParser, DataAndFiles, MultiPartParser
+
+# Room for the multipart boundaries and headers around the file.
+MULTIPART_OVERHEAD = 64 * 2 ** 10
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "The uploaded file is too large."
+    default_code = "upload_too_large"
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Stream files to disk, giving up once they exceed `max_size` bytes."""
+
+    chunk_size = 64 * 2 ** 10
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size
+
+    def _too_large(self):
+        return UploadTooLarge(
+            f"Files may not be larger than {self.max_size} bytes."
+        )
+
+    def handle_raw_input(self, input_data, META, content_length, *args):
+        # Reject what is too large to possibly fit before reading anything.
+        if content_length > self.max_size + MULTIPART_OVERHEAD:
+            raise self._too_large()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            # Closing the temporary file deletes it.
+            self.file.close()
+            raise self._too_large()
+
+        return super().receive_data_chunk(raw_data, start)
+
+
+class LimitedMultiPartParser(MultiPartParser):
+    """Multipart parser streaming files through a size limited handler.
+
+    The limit is read from the setting named by `max_size_setting`.
+    """
+
+    max_size_setting = None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context["request"]
+        request.upload_handlers = [
+            LimitedTemporaryFileUploadHandler(
+                request, max_size=getattr(settings, self.max_size_setting)
+            )
+        ]
+        return super().parse(stream, media_type, parser_context)
+
+
+class ImageUploadParser(LimitedMultiPartParser):
+    """Multipart parser for recipe images."""
+
+    max_size_setting = "RECIPE_IMAGE_MAX_UPLOAD_SIZE"
+
+
+class ArchiveUploadParser(LimitedMultiPartParser):
+    """Multipart parser for recipe archives, see recipe.imports."""
+
+    max_size_setting = "RECIPE_IMPORT_MAX_UPLOAD_SIZE"
+
+
+class NDJSONUploadParser(BaseParser):
+    """Hand an NDJSON request body over unread, as the `file` upload."""
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context["request"]
+        max_size = settings.RECIPE_IMPORT_MAX_UPLOAD_SIZE
+        if int(request.META.get("CONTENT_LENGTH") or 0) > max_size:
+            raise UploadTooLarge(
+                f"Files may not be larger than {max_size} bytes."
+            )
+        return DataAndFiles({}, {"file": stream})
+
+
+def read_image_header(image_file):
+    """Return the format and the size of an image, from its header only.
+
+    Pillow parses the header when an image is opened and defers decoding
+    the pixel data until it is needed, which it never is here. Raises
+    OSError if the file is not an image, and DecompressionBombError for
+    images too large for Pillow to even consider.
+    """
+
+    try:
+        with Image.open(image_file) as image:
+            return image.format, image.size
+    finally:
+        image_file.seek(0)
+
+
+def with_extension(name, image_format):
+    """Return `name` with the usual extension of `image_format`."""
+
+    extension = settings.RECIPE_IMAGE_FORMATS[image_format]
+    return os.path.splitext(name)[0] + extension
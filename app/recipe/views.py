@@ -1,78 +1,338 @@
 """
 Views for the Recipe API.
 """
+import mimetypes
 
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
+    inline_serializer,
     OpenApiParameter,
     OpenApiTypes,
 )
+from PIL import Image
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramBase,
+)
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection, transaction
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    FloatField,
+    Func,
+    OuterRef,
+    Q,
+    Value,
+)
+from django.db.models.functions import Cast
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.middleware.gzip import re_accepts_gzip
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from django.views.decorators.http import require_safe
 
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import FileField
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from core.middleware import TimedSerializerMixin, timed_serializer
 from core.models import Recipe, Tag, Ingredient
-from recipe import serializers
+from recipe import exports, imports, renditions, serializers
+from recipe.cache import CachedResponseMixin, ConditionalGetMixin
+from recipe.pagination import KeysetPagination
+from recipe.uploads import (
+    ArchiveUploadParser,
+    ImageUploadParser,
+    NDJSONUploadParser,
+)
+from user.authentication import CachedTokenAuthentication
+
+
+# Largest primary key, that of a BigAutoField.
+MAX_ID = 2**63 - 1
+
+
+class TrigramWordDistance(TrigramBase):
+    """Word distance to a string, usable for GiST nearest-neighbour scans."""
+
+    function = ""
+    arg_joiner = " <->> "
+
+
+FIELDS_PARAMETER = OpenApiParameter(
+    "fields",
+    OpenApiTypes.STR,
+    description="Comma separated list of the fields to return, all of them \
+        by default.",
+)
+FILTER_PARAMETERS = [
+    OpenApiParameter(
+        "tags",
+        OpenApiTypes.STR,
+        description="Comma separated list of tag ids to filter.",
+    ),
+    OpenApiParameter(
+        "ingredients",
+        OpenApiTypes.STR,
+        description="Comma separeted list of ingredient ids to filter.",
+    ),
+    OpenApiParameter(
+        "search",
+        OpenApiTypes.STR,
+        description="Search words in title and description, most \
+            relevant recipes first.",
+    ),
+    OpenApiParameter(
+        "match",
+        OpenApiTypes.STR,
+        enum=["any", "all"],
+        description="Return recipes with any (default) or all of the \
+            given tags and ingredients.",
+    ),
+]
 
 
 @extend_schema_view(
     list=extend_schema(
+        parameters=[*FILTER_PARAMETERS, FIELDS_PARAMETER],
+        responses=serializers.RecipeSerializer(many=True),
+    ),
+    retrieve=extend_schema(parameters=[FIELDS_PARAMETER]),
+    export=extend_schema(
         parameters=[
             OpenApiParameter(
-                "tags",
+                "as",
                 OpenApiTypes.STR,
-                description="Comma separated list of tag ids to filter.",
+                enum=list(exports.FORMATS),
+                description="Export as NDJSON (default), one JSON object \
+                    per line, or as CSV.",
             ),
+            *FILTER_PARAMETERS,
+            FIELDS_PARAMETER,
+        ],
+        responses={
+            (200, content_type): OpenApiTypes.STR
+            for content_type, _, _ in exports.FORMATS.values()
+        },
+    ),
+    import_recipes=extend_schema(
+        parameters=[
             OpenApiParameter(
-                "ingredients",
+                "import_id",
                 OpenApiTypes.STR,
-                description="Comma separeted list of ingredient ids to \
-                    filter.",
+                description="Name of the import, posting the same archive \
+                    again under the same name carries on after the last \
+                    batch imported.",
             ),
-        ]
-    )
+            OpenApiParameter(
+                "batch_size",
+                OpenApiTypes.INT,
+                description="Recipes written per transaction.",
+            ),
+        ],
+        request={
+            "application/x-ndjson": OpenApiTypes.BINARY,
+            "multipart/form-data": inline_serializer(
+                "RecipeArchiveUpload",
+                {"file": FileField()},
+            ),
+        },
+        responses=serializers.RecipeImportSerializer,
+    ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    TimedSerializerMixin,
+    ConditionalGetMixin,
+    CachedResponseMixin,
+    viewsets.ModelViewSet,
+):
     """View to manage recipe APIs."""
 
     serializer_class = serializers.RecipeDetailSerializer
-    queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    queryset = Recipe.objects.defer("search_vector")
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
-
-    def _params_to_ints(self, qs):
+    pagination_class = KeysetPagination
+    ordering = "-id"
+    search_ordering = ("-rank", "-id")
+    search_config = "english"
+    bulk_max_items = 1000
+    max_filter_ids = 100
+    export_chunk_size = 1000
+    import_batch_size = 500
+    import_max_batch_size = 5000
+    sparse_actions = ("list", "retrieve", "export")
+    search_actions = ("list", "export")
+    # Recipe fields read by serializer fields that are not model fields.
+    sparse_field_sources = {"image_renditions": ["image"]}
+
+    def _params_to_ints(self, qs, param):
         """Convert a string of comma separated numbers to integer list."""
 
-        return [int(s_id) for s_id in qs.split(",")]
+        values = qs.split(",")
+        if len(values) > self.max_filter_ids:
+            msg = f"Ensure there are at most {self.max_filter_ids} ids."
+            raise ValidationError({param: [msg]})
+        if not all(
+            s_id.isascii() and s_id.isdigit() and len(s_id) <= 18
+            for s_id in values
+        ):
+            raise ValidationError(
+                {param: ["Expected a comma separated list of ids."]}
+            )
+
+        return list(dict.fromkeys(int(s_id) for s_id in values))
+
+    def _filter_related(self, queryset, field, ids, match):
+        """Filter recipes linked to any or all of the given related ids.
+
+        Both modes are semi-joins on the through table, so recipes are
+        never multiplied by their links and no DISTINCT is needed.
+        """
+
+        relation = getattr(Recipe, field)
+        source = f"{relation.field.m2m_field_name()}_id"
+        target = f"{relation.field.m2m_reverse_field_name()}_id"
+        links = relation.through.objects.filter(**{f"{target}__in": ids})
+
+        if match == "all":
+            complete = (
+                links.values(source)
+                .annotate(matched=Count(target))
+                .filter(matched=len(ids))
+                .values(source)
+            )
+            return queryset.filter(id__in=complete)
+
+        return queryset.filter(
+            Exists(links.filter(**{source: OuterRef("pk")}))
+        )
+
+    def _search_term(self):
+        """Return the search term for list and export requests, if any."""
+
+        if self.action not in self.search_actions:
+            return None
+        return self.request.query_params.get("search", "").strip() or None
+
+    def _search(self, queryset, term):
+        """Filter recipes matching `term`, ranked on PostgreSQL."""
+
+        if connection.vendor != "postgresql":
+            return queryset.filter(
+                Q(title__icontains=term) | Q(description__icontains=term)
+            )
+
+        query = SearchQuery(
+            term, config=self.search_config, search_type="websearch"
+        )
+        # Cast the real returned by ts_rank so cursor positions round-trip.
+        rank = Cast(SearchRank(F("search_vector"), query), FloatField())
+        return queryset.filter(search_vector=query).annotate(rank=rank)
+
+    def _requested_fields(self):
+        """Return the fields asked for with `fields`, or None for all."""
+
+        if self.action not in self.sparse_actions:
+            return None
+
+        names = self.request.query_params.get("fields", "").split(",")
+        names = [name.strip() for name in names if name.strip()]
+        return list(dict.fromkeys(names)) or None
+
+    def _columns(self, serializer):
+        """Return the recipe columns the fields of `serializer` read."""
+
+        columns = ["id"]
+        for name, field in serializer.fields.items():
+            for source in self.sparse_field_sources.get(name, [field.source]):
+                try:
+                    model_field = Recipe._meta.get_field(source)
+                except FieldDoesNotExist:
+                    continue
+                if model_field.concrete and not model_field.many_to_many:
+                    columns.append(source)
+
+        return columns
+
+    def get_ordering(self):
+        """Order by relevance when searching, newest first otherwise."""
+
+        if self._search_term() and connection.vendor == "postgresql":
+            return self.search_ordering
+        return (self.ordering,)
 
     def get_queryset(self):
         """Retrieve recipes for authenticated User."""
 
         tags = self.request.query_params.get("tags")
         ingredients = self.request.query_params.get("ingredients")
+        match = self.request.query_params.get("match", "any")
         queryset = self.queryset
 
+        if match not in ("any", "all"):
+            raise ValidationError({"match": ['Expected "any" or "all".']})
+
         if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            tag_ids = self._params_to_ints(tags, "tags")
+            queryset = self._filter_related(queryset, "tags", tag_ids, match)
 
         if ingredients:
-            ing_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ing_ids)
+            ing_ids = self._params_to_ints(ingredients, "ingredients")
+            queryset = self._filter_related(
+                queryset, "ingredients", ing_ids, match
+            )
 
-        return (
-            queryset.filter(user=self.request.user).order_by("-id").distinct()
+        search = self._search_term()
+        if search:
+            queryset = self._search(queryset, search)
+
+        queryset = queryset.filter(user=self.request.user).order_by(
+            *self.get_ordering()
         )
 
+        if self.action in ("list", "export"):
+            # Plain rows, the serializer loads tags and ingredients itself.
+            fields = self.get_serializer().value_fields
+            ordering = [field.lstrip("-") for field in self.get_ordering()]
+            return queryset.values(*dict.fromkeys(fields + ordering))
+
+        requested = self._requested_fields()
+        if requested is not None:
+            queryset = queryset.only(*self._columns(self.get_serializer()))
+        if self.action != "upload_image":
+            queryset = queryset.prefetch_related(
+                *(
+                    field
+                    for field in ("tags", "ingredients")
+                    if requested is None or field in requested
+                )
+            )
+
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        """Return a serializer limited to the requested fields."""
+
+        if self.action in self.sparse_actions:
+            kwargs.setdefault("fields", self._requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
     def get_serializer_class(self):
         """Return the serializer class for Request."""
 
         if self.action == "list":
-            return serializers.RecipeSerializer
+            return serializers.RecipeRowSerializer
+        elif self.action == "export":
+            return serializers.RecipeExportRowSerializer
         elif self.action == "upload_image":
             return serializers.RecipeImageSerializer
 
@@ -83,15 +343,246 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         serializer.save(user=self.request.user)
 
-    @action(methods=["POST"], detail=True, url_path="upload-image")
+    def _bulk_response(self, recipes, status_code):
+        """Serialize bulk written recipes in a constant number of queries."""
+
+        ids = [recipe.id for recipe in recipes]
+        fetched = Recipe.objects.filter(id__in=ids).prefetch_related(
+            "tags", "ingredients"
+        )
+        by_id = {recipe.id: recipe for recipe in fetched}
+        serializer = self.get_serializer(
+            [by_id[pk] for pk in ids],
+            many=True,
+        )
+
+        return Response(serializer.data, status=status_code)
+
+    def _bulk_create(self, items):
+        """Validate and create all items, or none of them."""
+
+        serializer = self.get_serializer(data=items, many=True)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        recipes = serializer.save(user=self.request.user)
+        return self._bulk_response(recipes, status.HTTP_201_CREATED)
+
+    def _bulk_update(self, items):
+        """Validate and partially update all items, or none of them."""
+
+        id_errors = []
+        ids = []
+        for item in items:
+            if not isinstance(item, dict):
+                # Reported by the serializer, there is no id to check.
+                id_errors.append({})
+                ids.append(None)
+                continue
+            pk = item.get("id")
+            if not isinstance(pk, int) or isinstance(pk, bool):
+                id_errors.append({"id": ["A valid integer is required."]})
+            elif not 0 < pk <= MAX_ID:
+                # Never a key, and out of range for the database to bind.
+                id_errors.append({"id": ["Not found."]})
+            elif pk in ids:
+                id_errors.append({"id": ["Duplicated recipe id."]})
+            else:
+                id_errors.append({})
+            ids.append(pk)
+
+        checked = [
+            (pk, error)
+            for pk, error in zip(ids, id_errors)
+            if pk is not None and not error
+        ]
+        found = Recipe.objects.filter(user=self.request.user).in_bulk(
+            [pk for pk, _ in checked]
+        )
+        for pk, error in checked:
+            if pk not in found:
+                error["id"] = ["Not found."]
+
+        instances = [found.get(pk) for pk in ids]
+        serializer = self.get_serializer(
+            instances,
+            data=items,
+            many=True,
+            partial=True,
+        )
+        serializer.is_valid()
+        if any(id_errors) or serializer.errors:
+            errors = []
+            for item_errors in serializer.errors or [{} for _ in items]:
+                # Items that are not objects fail as a whole, with a list.
+                if not isinstance(item_errors, dict):
+                    item_errors = {"non_field_errors": item_errors}
+                errors.append(item_errors)
+            return Response(
+                [
+                    {**field_errors, **id_error}
+                    for field_errors, id_error in zip(errors, id_errors)
+                ],
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        recipes = serializer.save()
+        return self._bulk_response(recipes, status.HTTP_200_OK)
+
+    @extend_schema(
+        request=serializers.RecipeDetailSerializer(many=True),
+        responses=serializers.RecipeDetailSerializer(many=True),
+    )
+    @action(methods=["POST", "PATCH"], detail=False, url_path="bulk")
+    def bulk(self, request):
+        """Create (POST) or update (PATCH) many recipes at once.
+
+        The whole batch is written in one transaction; when any item is
+        invalid nothing is written and the errors are returned per item.
+        """
+
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {"non_field_errors": ["Expected a list of items."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > self.bulk_max_items:
+            return Response(
+                {
+                    "non_field_errors": [
+                        f"Ensure there are at most {self.bulk_max_items} "
+                        "items."
+                    ]
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with transaction.atomic():
+            if request.method == "POST":
+                return self._bulk_create(items)
+            return self._bulk_update(items)
+
+    @action(methods=["GET"], detail=False)
+    def export(self, request):
+        """Stream all the recipes of the user, filtered like the list.
+
+        The body is compressed on the fly for clients accepting gzip.
+        """
+
+        name = request.query_params.get("as", "ndjson")
+        if name not in exports.FORMATS:
+            raise ValidationError(
+                {"as": [f"Expected one of: {', '.join(exports.FORMATS)}."]}
+            )
+        content_type, extension, encode = exports.FORMATS[name]
+
+        serializer = self.get_serializer(many=True)
+        content = encode(
+            exports.represented_chunks(
+                self.get_queryset(), serializer, self.export_chunk_size
+            ),
+            serializer.child.field_names,
+        )
+        gzipped = re_accepts_gzip.search(
+            request.META.get("HTTP_ACCEPT_ENCODING", "")
+        )
+        if gzipped:
+            content = compress_sequence(content)
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = (
+            f'attachment; filename="recipes.{extension}"'
+        )
+        if gzipped:
+            response["Content-Encoding"] = "gzip"
+        patch_vary_headers(response, ["Accept-Encoding"])
+        # Let the proxy pass chunks on as they come.
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    def _import_params(self):
+        """Return the validated checkpoint name and batch size."""
+
+        import_id = self.request.query_params.get("import_id", "")
+        if import_id and not (
+            len(import_id) <= 64
+            and import_id.isascii()
+            and import_id.replace("-", "").replace("_", "").isalnum()
+        ):
+            raise ValidationError(
+                {
+                    "import_id": [
+                        "Use at most 64 letters, digits, dashes and "
+                        "underscores."
+                    ]
+                }
+            )
+
+        batch_size = self.request.query_params.get("batch_size", "")
+        if not batch_size:
+            return import_id, self.import_batch_size
+        if not (batch_size.isascii() and batch_size.isdigit()) or not (
+            1 <= int(batch_size) <= self.import_max_batch_size
+        ):
+            raise ValidationError(
+                {
+                    "batch_size": [
+                        "Expected a number between 1 and "
+                        f"{self.import_max_batch_size}."
+                    ]
+                }
+            )
+        return import_id, int(batch_size)
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="import",
+        parser_classes=[NDJSONUploadParser, ArchiveUploadParser],
+    )
+    def import_recipes(self, request):
+        """Import recipes from an NDJSON archive, one recipe per line.
+
+        The archive is the request body, or the `file` of a multipart
+        upload. Valid lines are imported in batches, invalid ones are
+        reported.
+        """
+
+        import_id, batch_size = self._import_params()
+        archive = request.data.get("file")
+        if archive is None:
+            raise ValidationError({"file": ["No file was submitted."]})
+
+        checkpoint = None
+        if import_id:
+            checkpoint = imports.CacheCheckpoint(
+                f"recipe:import:{request.user.pk}:{import_id}"
+            )
+        importer = imports.RecipeImporter(
+            request.user, batch_size=batch_size, checkpoint=checkpoint
+        )
+        serializer = timed_serializer(
+            serializers.RecipeImportSerializer(importer.run(archive)), request
+        )
+        return Response(serializer.data)
+
+    @action(
+        methods=["POST"],
+        detail=True,
+        url_path="upload-image",
+        parser_classes=[ImageUploadParser],
+    )
     def upload_image(self, request, pk=None):
-        """Upload an image to recipe."""
+        """Upload an image to recipe, to be optimised in the background."""
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            serializer.save(image_status=Recipe.ImageStatus.PENDING)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -106,9 +597,27 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 description="Filter by items related to recipes.",
             )
         ]
-    )
+    ),
+    autocomplete=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "q",
+                OpenApiTypes.STR,
+                required=True,
+                description="Prefix or approximate name to complete.",
+            ),
+            OpenApiParameter(
+                "limit",
+                OpenApiTypes.INT,
+                description="Maximum number of matches to return.",
+            ),
+        ],
+        responses=serializers.AutocompleteSerializer(many=True),
+    ),
 )
 class BaseRecipeRelViewSet(
+    TimedSerializerMixin,
+    ConditionalGetMixin,
     mixins.DestroyModelMixin,
     mixins.UpdateModelMixin,
     mixins.ListModelMixin,
@@ -116,8 +625,13 @@ class BaseRecipeRelViewSet(
 ):
     """Base viewset for Models that has relations with recipe"""
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    ordering = "-name"
+    autocomplete_limit = 10
+    autocomplete_max_limit = 50
+    autocomplete_min_similarity = 0.3
 
     def get_queryset(self):
         """Retrieve Tag for authenticated users."""
@@ -132,10 +646,65 @@ class BaseRecipeRelViewSet(
 
         return (
             queryset.filter(user=self.request.user)
-            .order_by("-name")
+            .order_by(self.ordering)
             .distinct()
         )
 
+    def _autocomplete_params(self):
+        """Return the validated search term and number of matches."""
+
+        term = self.request.query_params.get("q", "").strip()
+        if not term:
+            raise ValidationError({"q": ["This field is required."]})
+        if len(term) > 255:
+            raise ValidationError(
+                {"q": ["Ensure this field has no more than 255 characters."]}
+            )
+
+        limit = self.request.query_params.get("limit", "")
+        if not limit:
+            return term, self.autocomplete_limit
+        if not (limit.isascii() and limit.isdigit()) or int(limit) < 1:
+            raise ValidationError({"limit": ["A valid integer is required."]})
+
+        return term, min(int(limit), self.autocomplete_max_limit)
+
+    @action(methods=["GET"], detail=False)
+    def autocomplete(self, request):
+        """Return the user's names closest to `q`, best matches first."""
+
+        term, limit = self._autocomplete_params()
+        queryset = self.queryset.filter(user=request.user)
+
+        if connection.vendor == "postgresql":
+            # A nearest-neighbour walk of the (user, name) trigram index
+            # yields the closest names first and stops after `limit`.
+            similarity = Func(
+                Value(term),
+                F("name"),
+                function="WORD_SIMILARITY",
+                output_field=FloatField(),
+            )
+            matches = [
+                match
+                for match in queryset.annotate(similarity=similarity)
+                .order_by(TrigramWordDistance("name", term), "id")
+                .values("id", "name", "similarity")[:limit]
+                if match["similarity"] >= self.autocomplete_min_similarity
+            ]
+        else:
+            matches = list(
+                queryset.filter(name__istartswith=term)
+                .annotate(similarity=Value(None, output_field=FloatField()))
+                .order_by("name", "id")
+                .values("id", "name", "similarity")[:limit]
+            )
+
+        serializer = timed_serializer(
+            serializers.AutocompleteSerializer(matches, many=True), request
+        )
+        return Response(serializer.data)
+
 
 class TagViewSet(BaseRecipeRelViewSet):
     """Handles tag requests"""
@@ -149,3 +718,25 @@ class IngredientViewSet(BaseRecipeRelViewSet):
 
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+
+
+@require_safe
+def image_rendition(request, rendition, name):
+    """Serve a rendition of a recipe image, generating it on first use.
+
+    The proxy answers requests for renditions that exist on disk itself,
+    only the first request for each one ends up here.
+    """
+    if not name.startswith("uploads/"):
+        raise Http404("Not a recipe image.")
+
+    try:
+        path = renditions.get_rendition(name, rendition)
+    except (KeyError, OSError, ValueError, Image.DecompressionBombError):
+        raise Http404("No such rendition.")
+
+    content_type, _ = mimetypes.guess_type(path)
+    response = FileResponse(open(path, "rb"), content_type=content_type)
+    # Image names are unique, a rendition never changes once generated.
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
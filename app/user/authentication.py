@@ -0,0 +1,127 @@
+"""
+Authentication for the APIs.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.authentication import TokenAuthentication
+
+from core.cache import bump_generation, get_generation
+
+
+class LRUCache:
+    """Thread safe mapping keeping at most `maxsize` recently used items.
+
+    Items are dropped `timeout` seconds after they were set, if given.
+    """
+
+    def __init__(self, maxsize, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._items.move_to_end(key)
+            except KeyError:
+                return default
+            value, expires = self._items[key]
+            if expires is not None and expires <= time.monotonic():
+                del self._items[key]
+                return default
+            return value
+
+    def set(self, key, value):
+        expires = None
+        if self.timeout is not None:
+            expires = time.monotonic() + self.timeout
+        with self._lock:
+            self._items[key] = (value, expires)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_local_tokens = LRUCache(
+    settings.AUTH_TOKEN_LOCAL_CACHE_SIZE,
+    timeout=settings.AUTH_TOKEN_LOCAL_CACHE_TIMEOUT,
+)
+
+
+def _token_key(key):
+    # Never put raw tokens in cache keys.
+    return "auth:token:" + hashlib.sha256(key.encode()).hexdigest()
+
+
+def _generation_key(user_id):
+    return f"auth:generation:{user_id}"
+
+
+def invalidate_user_tokens(user_id):
+    """Drop every cached token lookup of a user, in all processes."""
+
+    bump_generation(
+        _generation_key(user_id), alias=settings.AUTH_TOKEN_CACHE_ALIAS
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication caching the token to user lookup.
+
+    Lookups are kept in a bounded in-process LRU, for a few seconds, backed
+    by the shared cache. Each entry is tagged with the generation of its
+    user, which is bumped whenever the user or the token changes; stale
+    entries are detected with a single cache read and looked up again.
+    Without a cache shared by all workers, which would miss each other's
+    bumps, every token is looked up in the database.
+    """
+
+    def _generation(self, user_id):
+        return get_generation(
+            _generation_key(user_id), alias=settings.AUTH_TOKEN_CACHE_ALIAS
+        )
+
+    def authenticate_credentials(self, key):
+        if not settings.CACHE_SHARED:
+            return super().authenticate_credentials(key)
+
+        cache = caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+        token_key = _token_key(key)
+
+        entry = _local_tokens.get(token_key) or cache.get(token_key)
+        generation = None
+        if entry is not None:
+            user, token, entry_generation = entry
+            generation = self._generation(user.pk)
+            if entry_generation == generation:
+                _local_tokens.set(token_key, entry)
+                # Requests must not share, and mutate, one cached user.
+                return copy.copy(user), copy.copy(token)
+
+        user, token = super().authenticate_credentials(key)
+
+        # Only trust a generation read before the database lookup: one read
+        # after it could already include a change the lookup missed. On
+        # first sight the entry is stored untrusted, to learn the user id.
+        if generation is None or entry[0].pk != user.pk:
+            generation = None
+        entry = (copy.copy(user), copy.copy(token), generation)
+        cache.set(token_key, entry, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        _local_tokens.set(token_key, entry)
+
+        return user, token
@@ -0,0 +1,27 @@
+"""
+Signal handlers invalidating cached token lookups.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from user.authentication import invalidate_user_tokens
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user(sender, instance, **kwargs):
+    """Refresh cached users after deactivation, password changes etc."""
+
+    invalidate_user_tokens(instance.pk)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """Stop accepting deleted or replaced tokens."""
+
+    invalidate_user_tokens(instance.user_id)
@@ -0,0 +1,210 @@
+"""
+Tests for the cached token authentication.
+"""
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.tests.utils import QueryBudgetMixin
+from user.authentication import LRUCache
+
+
+ME_URL = reverse("user:me")
+
+
+def create_user(email="auth@example.com", password="pass123"):
+    """Create and return a new user."""
+
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+@contextmanager
+def other_process(shared):
+    """Run the block as another worker, with its own in-process caches.
+
+    With `shared`, the cache is the one every worker uses; otherwise the
+    worker has a per process cache of its own.
+    """
+
+    caches = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "" if shared else "other-process",
+        }
+    }
+    with override_settings(CACHES=caches), patch(
+        "user.authentication._local_tokens", LRUCache(maxsize=8)
+    ):
+        yield
+
+
+class LRUCacheTests(SimpleTestCase):
+    """Test the in-process LRU."""
+
+    def test_bounded_least_recently_used_evicted(self):
+        """Test the least recently used item is evicted first."""
+
+        lru = LRUCache(maxsize=2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+
+        self.assertEqual(len(lru), 2)
+        self.assertEqual(lru.get("a"), 1)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("c"), 3)
+
+    @patch("user.authentication.time.monotonic")
+    def test_items_expire(self, monotonic):
+        """Test items are dropped once their timeout passed."""
+
+        monotonic.return_value = 100
+        lru = LRUCache(maxsize=2, timeout=10)
+        lru.set("a", 1)
+
+        monotonic.return_value = 109
+        self.assertEqual(lru.get("a"), 1)
+        monotonic.return_value = 110
+        self.assertIsNone(lru.get("a"))
+        self.assertEqual(len(lru), 0)
+
+
+@override_settings(CACHE_SHARED=True)
+class CachedTokenAuthenticationTests(QueryBudgetMixin, TestCase):
+    """Test authenticating with cached tokens."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def _warm_up(self):
+        for _ in range(2):
+            res = self.client.get(ME_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_cached_lookup_runs_no_query(self):
+        """Test a known token is authenticated without the database."""
+
+        self._warm_up()
+
+        with self.assertMaxQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], self.user.email)
+
+    def test_invalid_token_rejected(self):
+        """Test unknown tokens are still rejected."""
+
+        self.client.credentials(HTTP_AUTHORIZATION="Token invalid")
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_rejected(self):
+        """Test deleting a token stops it from authenticating."""
+
+        self._warm_up()
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test deactivating a user stops its token from authenticating."""
+
+        self._warm_up()
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_refreshes_user(self):
+        """Test changing the password drops the cached user."""
+
+        self._warm_up()
+
+        res = self.client.patch(ME_URL, {"password": "newpass123"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertMaxQueries(1):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("newpass123"))
+
+    def test_profile_update_visible(self):
+        """Test updates through the API are seen by the next request."""
+
+        self._warm_up()
+
+        self.client.patch(ME_URL, {"name": "New Name"})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data["name"], "New Name")
+
+    def test_revoked_in_other_process(self):
+        """Test a token revoked by another worker is rejected here."""
+
+        self._warm_up()
+
+        with other_process(shared=True):
+            self._warm_up()
+            self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(CACHE_SHARED=False)
+class ProcessLocalCacheTests(QueryBudgetMixin, TestCase):
+    """Test authenticating when each worker has a cache of its own."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def _warm_up(self):
+        for _ in range(2):
+            res = self.client.get(ME_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_revoked_in_other_process(self):
+        """Test a token revoked by another worker is rejected here."""
+
+        self._warm_up()
+
+        with other_process(shared=False):
+            self._warm_up()
+            self.user.is_active = False
+            self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_tokens_looked_up(self):
+        """Test tokens are looked up in the database every time."""
+
+        self._warm_up()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
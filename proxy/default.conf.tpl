@@ -1,6 +1,19 @@
 server {
   listen ${LISTEN_PORT};
 
+  # Renditions are generated by the app the first time they are requested.
+  location /static/media/renditions/ {
+    root        /vol;
+    add_header  Cache-Control "public, max-age=31536000, immutable";
+    try_files   $uri @app;
+  }
+
+  # Content addressed images never change once stored.
+  location /static/media/uploads/recipe/sha256/ {
+    root        /vol;
+    add_header  Cache-Control "public, max-age=31536000, immutable";
+  }
+
   location /static {
     alias /vol/static;
   }
@@ -10,4 +23,18 @@ server {
     include               /etc/nginx/uwsgi_params;
     client_max_body_size  10M;
   }
+
+  # Recipe archives are passed on to the app as they are uploaded.
+  location /api/recipe/recipes/import/ {
+    uwsgi_pass               ${APP_HOST}:${APP_PORT};
+    include                  /etc/nginx/uwsgi_params;
+    client_max_body_size     1G;
+    uwsgi_request_buffering  off;
+    uwsgi_read_timeout       1h;
+  }
+
+  location @app {
+    uwsgi_pass            ${APP_HOST}:${APP_PORT};
+    include               /etc/nginx/uwsgi_params;
+  }
 }
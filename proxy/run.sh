@@ -2,5 +2,7 @@
 
 set -e
 
-envsubst < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/defaul.conf
+envsubst '${LISTEN_PORT} ${APP_HOST} ${APP_PORT}' \
+  < /etc/nginx/default.conf.tpl \
+  > /etc/nginx/conf.d/defaul.conf
 nginx -g 'daemon off;'
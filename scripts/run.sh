@@ -6,4 +6,10 @@ python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
 
+# Metrics of all uWSGI workers are aggregated through files in this
+# directory, left overs of a previous run would be added up as well.
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/metrics}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi